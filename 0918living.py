@@ -13,19 +13,12 @@
 - /server/{CID}/Kitchen/properties/{co2, temperature, humidity, lux}
 
 CSVは毎秒「その時点の最新値」を1行として記録します。未受信の値は None になります。
+購読と書き出しは elwa_daemon（asyncio 1 本）が行います。
 """
 
 import argparse
-import csv
-import json
-import os
-import signal
-import sys
-import time
-from datetime import datetime
-from threading import Lock, Thread
 
-import paho.mqtt.client as mqtt
+from elwa_daemon import Profile, fieldnames_for, run_profiles
 
 
 # ---------- 引数 ----------
@@ -85,152 +78,34 @@ def build_topic_map(cid: str):
     return m
 
 
-# ---------- 共有状態 ----------
-class State:
-    def __init__(self, fieldnames):
-        self.lock = Lock()
-        self.values = {k: None for k in fieldnames if k != "timestamp"}
-
-    def set_value(self, field, value):
-        with self.lock:
-            self.values[field] = value
-
-    def snapshot_row(self):
-        with self.lock:
-            row = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-            row.update(self.values)
-            return row
-
-
-# ---------- CSV ----------
-def ensure_csv_header(csv_path, fieldnames):
-    need_header = (not os.path.exists(csv_path)) or (os.path.getsize(csv_path) == 0)
-    if need_header:
-        os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
-        with open(csv_path, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-
-
-# ---------- MQTT コールバック ----------
-def make_on_connect(topics, qos):
-    def _on_connect(client, userdata, flags, rc):
-        if rc == 0:
-            print("✅ MQTT connected")
-            for t in topics:
-                client.subscribe(t, qos=qos)
-                print("  subscribed:", t)
-        else:
-            print(f"❌ MQTT connect failed: rc={rc}")
-
-    return _on_connect
-
-
-def make_on_message(topic_to_key_field, state: State):
-    def _on_message(client, userdata, msg):
-        try:
-            payload = msg.payload.decode(errors="ignore")
-            data = json.loads(payload)
-        except Exception as e:
-            print(
-                f"⚠️ JSON parse error on {msg.topic}: {e} / payload={msg.payload[:80]!r}"
-            )
-            return
-
-        tup = topic_to_key_field.get(msg.topic)
-        if not tup:
-            return
-        json_key, field = tup
-
-        val = data.get(json_key, None)
+# ---------- デーモン用プロファイル ----------
+def build_profile(cid="53965d6805152d95", out="elwa_selected.csv", interval=1.0):
+    topic_map = build_topic_map(cid)
+    return Profile(
+        name="0918living",
+        topic_map=topic_map,
+        fieldnames=fieldnames_for(topic_map),  # timestamp + 全列
+        csv_file=out,
+        write_every_sec=interval,
         # 軽い型整形（数値らしきものは数値化、"OPEN"/"CLOSED"はそのまま）
-        if isinstance(val, str):
-            s = val.strip().lower()
-            if s in ("true", "false"):
-                val = s == "true"
-            else:
-                try:
-                    # int/float への変換を試みる（失敗したら文字列のまま）
-                    if "." in s or "e" in s:
-                        val = float(val)
-                    else:
-                        val = int(val)
-                except Exception:
-                    pass
-
-        state.set_value(field, val)
-        print(f"[{field}] <- {val}  ({msg.topic})")
-
-    return _on_message
-
-
-# ---------- ライタースレッド ----------
-def writer_loop(csv_path, fieldnames, state: State, interval_sec: float, stop_flag):
-    ensure_csv_header(csv_path, fieldnames)
-    print(f"📡 集約開始（Ctrl+C で終了） -> CSV: {os.path.abspath(csv_path)}")
-    while not stop_flag["stop"]:
-        row = state.snapshot_row()
-        try:
-            with open(csv_path, "a", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writerow(row)
-            # 進行ログ（うるさい場合はコメントアウト）
-            print("💾 CSV:", row)
-        except Exception as e:
-            print("⚠️ CSV write error:", e)
-        time.sleep(interval_sec)
+        coerce_numeric=True,
+    )
+
+
+PROFILE = build_profile()
 
 
 # ---------- メイン ----------
 def main():
     args = parse_args()
-
-    topic_map = build_topic_map(args.cid)
-    topics = [t for (t, _, _) in topic_map]
-    topic_to_key_field = {t: (k, field) for (t, k, field) in topic_map}
-
-    # CSVヘッダ（timestamp + 全列）
-    fieldnames = ["timestamp"]
-    for _, _, field in topic_map:
-        if field not in fieldnames:
-            fieldnames.append(field)
-
-    state = State(fieldnames)
-
-    client = mqtt.Client(transport=args.transport)
-    client.on_connect = make_on_connect(topics, qos=args.qos)
-    client.on_message = make_on_message(topic_to_key_field, state)
-
-    # 接続
-    client.connect(args.broker, args.port, keepalive=args.keepalive)
-    client.loop_start()
-
-    # Writer thread
-    stop_flag = {"stop": False}
-    wt = Thread(
-        target=writer_loop,
-        args=(args.out, fieldnames, state, args.interval, stop_flag),
-        daemon=True,
+    run_profiles(
+        [build_profile(args.cid, args.out, args.interval)],
+        broker=args.broker,
+        port=args.port,
+        keepalive=args.keepalive,
+        qos=args.qos,
+        transport=args.transport,
     )
-    wt.start()
-
-    # Ctrl+C ハンドリング
-    def handle_sigint(signum, frame):
-        print("\n🛑 終了処理中...")
-        stop_flag["stop"] = True
-        client.loop_stop()
-        client.disconnect()
-        sys.exit(0)
-
-    signal.signal(signal.SIGINT, handle_sigint)
-    signal.signal(signal.SIGTERM, handle_sigint)
-
-    # メインスレッドは待機
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        handle_sigint(None, None)
 
 
 if __name__ == "__main__":
@@ -6,9 +6,10 @@ import time
 import threading
 from datetime import datetime
 
-import requests
 import paho.mqtt.client as mqtt
 
+from elwa_client import ElwaClient, DEFAULT_BASE
+
 # ============================
 # コンフィグ
 # ============================
@@ -19,7 +20,8 @@ CID         = "53965d6805152d95"
 CSV_FILE    = "elwa_all_sensors.csv"
 WRITE_EVERY_SEC = 1.0        # 何秒ごとに1行書くか（スナップショット）
 HTTP_PIR_ENABLED = True      # HTTP PIRも入れるなら True
-PIR_URL = "http://150.65.179.132:7000/elapi/v1/devices/1921682116000702/properties/detection"
+ELWA_BASE = DEFAULT_BASE
+PIR_DEVICE = "1921682116000702"  # detection を読むデバイス
 HTTP_PIR_FIELD = "pir_http"  # CSV列名
 
 # 旧「multi-sensors」群も集約する場合のデバイスID
@@ -85,6 +87,7 @@ for _, _, field in TOPIC_MAP:
 latest_values = {k: None for k in FIELDNAMES if k != "timestamp"}
 latest_values_lock = threading.Lock()
 latest_pir_http = None
+elwa = ElwaClient(ELWA_BASE, timeout=1.5)
 
 # ============================
 # ユーティリティ
@@ -103,10 +106,7 @@ def http_pir_loop():
     global latest_pir_http
     while True:
         try:
-            r = requests.get(PIR_URL, timeout=1.5)
-            r.raise_for_status()
-            js = r.json()
-            latest_pir_http = bool(js.get("detection", False))
+            latest_pir_http = bool(elwa.get(PIR_DEVICE, "detection"))
         except Exception as e:
             # エラー時は None に（前回値を残したいならコメントアウト）
             latest_pir_http = None
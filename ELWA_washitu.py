@@ -1,13 +1,6 @@
 # elwa_aggregate_csv.py (統合版: thermal-1 追加)
-import os
-import csv
-import json
-import time
-import threading
-from datetime import datetime
-
-import requests
-import paho.mqtt.client as mqtt
+# 実行は elwa_daemon（MQTT/HTTP/CSV を 1 つのイベントループで処理）
+from elwa_daemon import Profile, fieldnames_for, run_profiles
 
 # ============================
 # コンフィグ
@@ -72,136 +65,28 @@ for dev_id in MULTI_DEV_IDS:
         TOPIC_MAP.append((topic, key, field))
 
 # ============================
-# CSV ヘッダー
+# デーモン用プロファイル
 # ============================
-FIELDNAMES = ["timestamp"]
-if HTTP_PIR_ENABLED:
-    FIELDNAMES.append(HTTP_PIR_FIELD)
-
-# 宣言した全フィールドを列にする（重複排除）
-for _, _, field in TOPIC_MAP:
-    if field not in FIELDNAMES:
-        FIELDNAMES.append(field)
+HTTP_PIRS = [(PIR_URL, HTTP_PIR_FIELD)] if HTTP_PIR_ENABLED else []
+FIELDNAMES = fieldnames_for(TOPIC_MAP, [f for _, f in HTTP_PIRS], http_first=True)
 
-# ============================
-# 共有状態
-# ============================
-latest_values = {k: None for k in FIELDNAMES if k != "timestamp"}
-latest_values_lock = threading.Lock()
-latest_pir_http = None
-
-# ============================
-# ユーティリティ
-# ============================
-def ensure_csv_header():
-    if not os.path.exists(CSV_FILE) or os.path.getsize(CSV_FILE) == 0:
-        with open(CSV_FILE, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
-            writer.writeheader()
-
-def set_value(field, value):
-    with latest_values_lock:
-        latest_values[field] = value
-
-def http_pir_loop():
-    global latest_pir_http
-    while True:
-        try:
-            r = requests.get(PIR_URL, timeout=1.5)
-            r.raise_for_status()
-            js = r.json()
-            latest_pir_http = bool(js.get("detection", False))
-        except Exception as e:
-            latest_pir_http = None
-            print(f"HTTP PIR error: {e}")
-        time.sleep(1)
-
-# ============================
-# MQTT コールバック
-# ============================
-TOPICS = [t[0] for t in TOPIC_MAP]
-TOPIC_TO_KEY = {t[0]: (t[1], t[2]) for t in TOPIC_MAP}  # topic -> (json_key, field)
-
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
-        print("✅ MQTT connected")
-        for t in TOPICS:
-            client.subscribe(t)
-            print("  subscribed:", t)
-    else:
-        print("❌ MQTT connect failed:", rc)
-
-def on_message(client, userdata, msg):
-    try:
-        payload = msg.payload.decode(errors="ignore")
-        data = json.loads(payload)
-    except Exception as e:
-        print(f"⚠️ JSON parse error on {msg.topic}: {e} / payload={msg.payload[:80]!r}")
-        return
-
-    if msg.topic in TOPIC_TO_KEY:
-        json_key, field = TOPIC_TO_KEY[msg.topic]
-        val = data.get(json_key, None)
-        # true/false/文字列など来てもそのまま格納
-        set_value(field, val)
-        print(f"[{field}] <- {val}  ({msg.topic})")
-
-# ============================
-# ライターループ（毎秒）
-# ============================
-def writer_loop():
-    ensure_csv_header()
-    last_write = 0.0
-    while True:
-        now = time.time()
-        if now - last_write >= WRITE_EVERY_SEC:
-            with latest_values_lock:
-                row = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-                if HTTP_PIR_ENABLED:
-                    row[HTTP_PIR_FIELD] = latest_pir_http
-                for k in FIELDNAMES:
-                    if k in ("timestamp", HTTP_PIR_FIELD):
-                        continue
-                    row[k] = latest_values.get(k, None)
-            try:
-                with open(CSV_FILE, "a", newline="") as f:
-                    writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
-                    writer.writerow(row)
-                print("💾 CSV:", row)
-            except Exception as e:
-                print("⚠️ CSV write error:", e)
-            last_write = now
-        time.sleep(0.05)
+PROFILE = Profile(
+    name="ELWA_washitu",
+    topic_map=TOPIC_MAP,           # true/false/文字列など来てもそのまま格納
+    fieldnames=FIELDNAMES,
+    csv_file=CSV_FILE,
+    http_pirs=HTTP_PIRS,
+    write_every_sec=WRITE_EVERY_SEC,
+    http_every_sec=1.0,
+    http_value="bool",             # detection は True/False
+    http_keep_on_error=False,      # エラー時は None
+)
 
 # ============================
 # メイン
 # ============================
 def main():
-    # HTTP PIR
-    if HTTP_PIR_ENABLED:
-        th = threading.Thread(target=http_pir_loop, daemon=True)
-        th.start()
-
-    # MQTT
-    client = mqtt.Client()
-    client.on_connect = on_connect
-    client.on_message = on_message
-    client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
-    client.loop_start()
-
-    # Writer
-    writer_thread = threading.Thread(target=writer_loop, daemon=True)
-    writer_thread.start()
-
-    print("📡 集約開始（Ctrl+Cで終了） -> CSV:", os.path.abspath(CSV_FILE))
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\n🛑 終了します。")
-    finally:
-        client.loop_stop()
-        client.disconnect()
+    run_profiles([PROFILE], broker=MQTT_BROKER, port=MQTT_PORT, keepalive=60)
 
 if __name__ == "__main__":
     main()
@@ -8,15 +8,12 @@
 #  - thermal_1: lepton_occupied -> CSV列名 "thermal-1"（未受信でも 0 を記録）
 #  - HTTP PIR x6: detection を 0/1 で記録
 
-import os
-import csv
-import json
-import time
-import threading
-from datetime import datetime
+#
+# MQTT 購読・HTTP ポーリング・CSV 書き出しは elwa_daemon が 1 つのイベントループで行う。
+#   python Living_Kitchen0916.py
+#   python elwa_daemon.py --profile Living_Kitchen0916 --profile ELWA_washitu
 
-import requests
-import paho.mqtt.client as mqtt
+from elwa_daemon import Profile, fieldnames_for, run_profiles
 
 # ============================
 # ブローカ設定
@@ -161,187 +158,33 @@ TOPIC_MAP.append(
 )
 
 # ============================
-# CSV ヘッダ構成
+# デーモン用プロファイル
 # ============================
-FIELDNAMES = ["timestamp"]
-# MQTT列
-for _, _, field in TOPIC_MAP:
-    if field not in FIELDNAMES:
-        FIELDNAMES.append(field)
-# HTTP PIR列
-for _, field in HTTP_PIRS:
-    if field not in FIELDNAMES:
-        FIELDNAMES.append(field)
+FIELDNAMES = fieldnames_for(TOPIC_MAP, [f for _, f in HTTP_PIRS], http_first=False)
 
-# ============================
-# 共有状態
-# ============================
-latest_values = {k: None for k in FIELDNAMES if k != "timestamp"}
-latest_lock = threading.Lock()
-
-
-# ============================
-# 補助
-# ============================
-def ensure_csv_header():
-    need = (not os.path.exists(CSV_FILE)) or (os.path.getsize(CSV_FILE) == 0)
-    if need:
-        with open(CSV_FILE, "w", newline="") as f:
-            csv.DictWriter(f, fieldnames=FIELDNAMES).writeheader()
-
-
-def set_value(field, value):
-    with latest_lock:
-        latest_values[field] = value
-
-
-def coerce_bool_like_to_01(v):
-    # bool/“true”/“false” などを 0/1 に
-    if isinstance(v, bool):
-        return 1 if v else 0
-    if isinstance(v, (int, float)) and v in (0, 1):
-        return int(v)
-    if isinstance(v, str):
-        s = v.strip().lower()
-        if s in ("true", "t", "yes", "y", "on"):
-            return 1
-        if s in ("false", "f", "no", "n", "off"):
-            return 0
-    return v  # 変換不可はそのまま
-
-
-# ============================
-# HTTP PIR ポーリング（巡回）
-# ============================
-def http_pir_loop():
-    while True:
-        for url, field in HTTP_PIRS:
-            try:
-                r = requests.get(url, timeout=1.5)
-                r.raise_for_status()
-                js = r.json()
-                det = 1 if bool(js.get("detection", False)) else 0
-                set_value(field, det)
-            except Exception as e:
-                # エラー時は値更新せず（前回値を保持）
-                print(f"HTTP PIR error: {field}: {e}")
-            time.sleep(0.05)  # 叩き過ぎ防止
-        time.sleep(0.5)
-
-
-# ============================
-# MQTT コールバック
-# ============================
-TOPICS = [t[0] for t in TOPIC_MAP]
-TOPIC_TO_KEY = {t[0]: (t[1], t[2]) for t in TOPIC_MAP}  # topic -> (json_key, field)
-
-
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
-        print("✅ MQTT connected")
-        for t in TOPICS:
-            client.subscribe(t)
-            print("  subscribed:", t)
-    else:
-        print("❌ MQTT connect failed:", rc)
-
-
-def on_message(client, userdata, msg):
-    try:
-        payload = msg.payload.decode(errors="ignore")
-        data = json.loads(payload)
-    except Exception as e:
-        print(f"⚠️ JSON parse error on {msg.topic}: {e} / payload={msg.payload[:80]!r}")
-        return
-
-    if msg.topic in TOPIC_TO_KEY:
-        json_key, field = TOPIC_TO_KEY[msg.topic]
-        val = data.get(json_key, None)
-
-        # 可能なら 0/1 に正規化（pir/occupied類）
-        if field in (
-            "pir2",
-            "mic_occupied",
-            "sound_trig_pir",
-            "sound_trig_door",
-            "thermal-1",
-        ):
-            val = coerce_bool_like_to_01(val)
-
-        set_value(field, val)
-        print(f"[{field}] <- {val}  ({msg.topic})")
-
-
-# ============================
-# ライタースレッド（毎秒）
-# ============================
-def writer_loop():
-    ensure_csv_header()
-    last_write = 0.0
-    while True:
-        now = time.time()
-        if now - last_write >= WRITE_EVERY_SEC:
-            with latest_lock:
-                row = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
-                for col in FIELDNAMES:
-                    if col == "timestamp":
-                        continue
-                    v = latest_values.get(col, None)
-
-                    # thermal-1 は未受信の秒でも 0 を強制
-                    if col == "thermal-1" and v is None:
-                        v = 0
-
-                    # HTTP PIR は常に 0/1 で出したい（未受信は None のまま）
-                    if col.startswith("pir_http_") and v is not None:
-                        v = 1 if int(v) == 1 else 0
-
-                    # その他のbooleanっぽい値も 0/1 化（可能なら）
-                    if col in ("pir2", "mic_occupied"):
-                        v = coerce_bool_like_to_01(v)
-
-                    row[col] = v
-
-            try:
-                with open(CSV_FILE, "a", newline="") as f:
-                    csv.DictWriter(f, fieldnames=FIELDNAMES).writerow(row)
-                print("💾 CSV:", row)
-            except Exception as e:
-                print("⚠️ CSV write error:", e)
-
-            last_write = now
-        time.sleep(0.05)
+PROFILE = Profile(
+    name="Living_Kitchen0916",
+    topic_map=TOPIC_MAP,
+    fieldnames=FIELDNAMES,
+    csv_file=CSV_FILE,
+    http_pirs=HTTP_PIRS,
+    write_every_sec=WRITE_EVERY_SEC,
+    http_value="01",  # detection は 0/1
+    http_keep_on_error=True,  # エラー時は前回値を保持
+    # 可能なら 0/1 に正規化（pir/occupied類）
+    bool01_fields=frozenset(
+        ["pir2", "mic_occupied", "sound_trig_pir", "sound_trig_door", "thermal-1"]
+    ),
+    # thermal-1 は未受信の秒でも 0 を強制
+    zero_if_missing=frozenset(["thermal-1"]),
+)
 
 
 # ============================
 # メイン
 # ============================
 def main():
-    # HTTP PIR ポーラ
-    th = threading.Thread(target=http_pir_loop, daemon=True)
-    th.start()
-
-    # MQTT
-    client = mqtt.Client()
-    client.on_connect = on_connect
-    client.on_message = on_message
-    client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
-    client.loop_start()
-
-    # CSVライタ
-    writer_thread = threading.Thread(target=writer_loop, daemon=True)
-    writer_thread.start()
-
-    print("📡 集約開始（Ctrl+Cで終了） -> CSV:", os.path.abspath(CSV_FILE))
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\n🛑 終了します。")
-    finally:
-        client.loop_stop()
-        client.disconnect()
+    run_profiles([PROFILE], broker=MQTT_BROKER, port=MQTT_PORT, keepalive=60)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,16 @@
 import paho.mqtt.client as mqtt
 import json
-import os
-import csv
 import time
 import threading
 from datetime import datetime
-from flask import Flask, request, render_template_string
+from flask import Flask, jsonify, request, render_template_string
 import logging
 
+from device_registry import PIR_PROPERTIES, DeviceRegistry
+from snapshot_state import SnapshotState
+from snapshot_writer import make_writer
+from timeseries_store import TimeSeriesStore
+
 # Flaskのログを抑制
 log = logging.getLogger("werkzeug")
 log.setLevel(logging.ERROR)
@@ -18,8 +21,12 @@ MQTT_PORT = 7883
 MQTT_TOPIC = "/server/#"
 
 CSV_FILE = "./smart-home-dashboard/smart_home_0125.csv"
+# 保存形式: "csv" | "parquet"（日付パーティション）| "both"
+STORAGE_BACKEND = "csv"
+PARQUET_DIR = "./smart-home-dashboard/smart_home_parquet"
 FLUSH_INTERVAL_SEC = 10
 WEB_PORT = 5001
+ACTIVE_WINDOW_SEC = 10  # ラベル画面で「反応中」と表示する PIR の時間窓
 
 # ========= 部屋とラベルの定義 =========
 ROOM_MAPPING = {
@@ -128,6 +135,10 @@ HTML_TEMPLATE = """
 </head>
 <body>
     <form method="POST" class="control-panel">
+        <div class="total-row">
+            <span>📡 反応中の PIR（直近 {{ window }} 秒）</span>
+            <span>{{ active|join(', ') or '-' }}</span>
+        </div>
         <div class="total-row">
             <span>🏠 家全体の人数</span>
             <div class="stepper">
@@ -226,150 +237,85 @@ def build_columns():
 
 
 COLUMNS = build_columns()
-# 初期値を必ず数値の0にする
-state = {col: None for col in COLUMNS if col != "timestamp"}
+# PIR は従来どおりどのプロパティでも受け、値が無いときは直前の値を残す
+REGISTRY = DeviceRegistry(
+    COLUMNS,
+    PIR_DEVICES,
+    M5_DEVICES,
+    AIR_PURIFIERS,
+    AIRCONS,
+    pir_properties=None,
+    pir_keep_last=True,
+)
+
+# 状態は COLUMNS と同じ並びの事前確保配列（ロック無しで書き、フラッシュ時に一括コピー）
+state = SnapshotState(COLUMNS)
+# ラベルの初期値は必ず数値の0
 state["Label_Total_People"] = 0
 for key in ROOM_MAPPING.keys():
     state[f"Label_{key}_Count"] = 0
     state[f"Label_{key}_Action"] = ""
 
-state_lock = threading.Lock()
+# PIR の直近履歴（ラベル付け中に「いまどこが反応しているか」を見る用）
+PIR_HISTORY = TimeSeriesStore(capacity=2048, devices=PIR_DEVICES)
+PIR_SET = frozenset(PIR_DEVICES)
 
 
 # ========= サーバーの通信処理 (★ここを修正しました) =========
 @app.route("/", methods=["GET", "POST"])
 def index():
-    global state
     if request.method == "POST":
-        with state_lock:
-            # ★修正点: データを受け取る際に、強制的に数値(int)に変換する
+        # ★修正点: データを受け取る際に、強制的に数値(int)に変換する
 
-            # 家全体の人数
-            raw_total = request.form.get("Total_People", "0")
-            state["Label_Total_People"] = int(raw_total) if raw_total.isdigit() else 0
+        # 家全体の人数
+        raw_total = request.form.get("Total_People", "0")
+        state["Label_Total_People"] = int(raw_total) if raw_total.isdigit() else 0
 
-            # 各部屋の人数と行動
-            for key in ROOM_MAPPING.keys():
-                # 人数: 空文字なら0、それ以外は数値化
-                raw_count = request.form.get(f"{key}_Count", "0")
-                state[f"Label_{key}_Count"] = (
-                    int(raw_count) if raw_count.isdigit() else 0
-                )
+        # 各部屋の人数と行動
+        for key in ROOM_MAPPING.keys():
+            # 人数: 空文字なら0、それ以外は数値化
+            raw_count = request.form.get(f"{key}_Count", "0")
+            state[f"Label_{key}_Count"] = int(raw_count) if raw_count.isdigit() else 0
 
-                # 行動: そのまま受け取る
-                state[f"Label_{key}_Action"] = request.form.get(f"{key}_Action", "")
+            # 行動: そのまま受け取る
+            state[f"Label_{key}_Action"] = request.form.get(f"{key}_Action", "")
 
         print(f"[UI] ラベル更新: Total={state['Label_Total_People']}")
-    return render_template_string(HTML_TEMPLATE, state=state, rooms=ROOM_MAPPING)
+    active = PIR_HISTORY.active(PIR_DEVICES, ACTIVE_WINDOW_SEC)
+    return render_template_string(
+        HTML_TEMPLATE,
+        state=state.as_dict(),
+        rooms=ROOM_MAPPING,
+        active=[d for d in PIR_DEVICES if d in active],
+        window=ACTIVE_WINDOW_SEC,
+    )
+
+
+@app.route("/activity")
+def activity():
+    # 直近の反応 PIR と、PIR ごとの 1 分あたり反応回数（古い分→新しい分）
+    now = time.time()
+    counts = PIR_HISTORY.counts_per_minute(PIR_DEVICES, minutes=10, now=now)
+    return jsonify(
+        active=sorted(PIR_HISTORY.active(PIR_DEVICES, ACTIVE_WINDOW_SEC, now)),
+        per_minute={d: counts[i].tolist() for i, d in enumerate(PIR_DEVICES)},
+    )
 
 
 def run_web_server():
     app.run(host="0.0.0.0", port=WEB_PORT, debug=False, use_reloader=False)
 
 
-# ========= CSV/MQTT処理 (変更なし) =========
-def init_csv():
-    if not os.path.exists(CSV_FILE):
-        with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(COLUMNS)
-        print(f"[CSV] 新規作成: {CSV_FILE}")
-    else:
-        print(f"[CSV] 既存ファイルに追記: {CSV_FILE}")
-
-
-def flush_state_periodically():
+# ========= CSV/MQTT処理 =========
+def flush_state_periodically(writer):
     while True:
         time.sleep(FLUSH_INTERVAL_SEC)
-        with state_lock:
-            row = [datetime.now().isoformat()]
-            for col in COLUMNS[1:]:
-                # 値がない(None)場合は空文字にするが、stateには0が入っているはず
-                val = state.get(col)
-                row.append(val if val is not None else "")
+        # 値がない(None)場合は空欄（CSV）/ 欠損（Parquet）になる
+        row = state.snapshot().tolist()
+        row[0] = datetime.now()
 
-        with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(row)
-        print(f"[CSV] 記録完了 (Total: {state.get('Label_Total_People')})")
-
-
-def update_pir(d, p, val):
-    v = val.get(p)
-    if v is not None:
-        with state_lock:
-            state[f"{d}_motion"] = bool(v)
-
-
-def update_m5(d, p, val):
-    with state_lock:
-        for k, v in val.items():
-            k = k.lower()
-            if "co2" in k:
-                state[f"{d}_co2"] = v
-            if ("temp" in k) and ("scd40" in k or "sen55" in k):
-                state[f"{d}_temp"] = v
-            if "hum" in k:
-                state[f"{d}_hum"] = v
-            if "pm2_5" in k or "pm2.5" in k:
-                state[f"{d}_pm2_5"] = v
-            if "voc" in k:
-                state[f"{d}_voc"] = v
-
-
-def update_air_purifier(d, p, val):
-    data = val if isinstance(val, dict) else {p: val}
-    with state_lock:
-        for k, v in data.items():
-            if k == "temperature":
-                state[f"{d}_temp"] = v
-            elif k == "humidity":
-                state[f"{d}_hum"] = v
-            elif k == "pm25":
-                state[f"{d}_pm25"] = v
-            elif k == "gasContaminationValue":
-                state[f"{d}_gas"] = v
-            elif k == "illuminanceValue":
-                state[f"{d}_illuminance"] = v
-            elif k == "dustValue":
-                state[f"{d}_dust"] = v
-            elif k == "operationStatus":
-                state[f"{d}_opStatus"] = bool(v)
-            elif k == "instantaneousElectricPowerConsumption":
-                state[f"{d}_power"] = v
-            elif k == "airFlowLevel":
-                state[f"{d}_flow"] = v
-            elif k == "odorStainEvaluationLevel":
-                state[f"{d}_odor"] = v
-            elif k == "overallDirtinessLevel":
-                state[f"{d}_dirt"] = v
-
-
-def update_aircon(d, p, val):
-    with state_lock:
-        for k, v in val.items():
-            if k == "outsideTemperature":
-                state[f"{d}_outsideTemp"] = v
-            elif k == "roomTemperature":
-                state[f"{d}_roomTemp"] = v
-            elif k in ("targetTemperature", "setTemperature"):
-                state[f"{d}_setTemp"] = v
-            elif k == "humanDetected":
-                state[f"{d}_human"] = bool(v)
-            elif k == "sunshineSensorData":
-                state[f"{d}_sunshine"] = v
-            elif k == "blowingOutAirTemperature":
-                state[f"{d}_blowTemp"] = v
-            elif k == "co2Concentration":
-                state[f"{d}_co2"] = v
-            elif k == "operationStatus":
-                state[f"{d}_opStatus"] = bool(v)
-            elif k == "instantaneousElectricPowerConsumption":
-                state[f"{d}_power"] = v
-            elif k == "consumedCumulativeElectricEnergy":
-                state[f"{d}_totalPower"] = v
-            elif k == "airFlowLevel":
-                state[f"{d}_flow"] = v
-            elif k == "humidity":
-                state[f"{d}_hum"] = v
+        writer.write(row)
+        print(f"[CSV] 記録完了 (Total: {row[state.slot['Label_Total_People']]})")
 
 
 def on_connect(c, u, f, rc):
@@ -377,28 +323,29 @@ def on_connect(c, u, f, rc):
     c.subscribe(MQTT_TOPIC)
 
 
+def record_pir(topic, payload):
+    hit = REGISTRY.resolve(topic)
+    if hit is None or hit[1] not in PIR_SET or hit[2] not in PIR_PROPERTIES:
+        return
+    v = payload.get(hit[2]) if isinstance(payload, dict) else None
+    if v is not None:
+        PIR_HISTORY.append(hit[1], bool(v))
+
+
 def on_message(c, u, msg):
     try:
-        topic = msg.topic
         payload = json.loads(msg.payload.decode("utf-8"))
-        parts = topic.split("/")
-        if len(parts) >= 6 and parts[1] == "server":
-            d, p = parts[3], parts[5]
-            if d in PIR_DEVICES:
-                update_pir(d, p, payload)
-            elif d in M5_DEVICES:
-                update_m5(d, p, payload)
-            elif d in AIR_PURIFIERS:
-                update_air_purifier(d, p, payload)
-            elif d in AIRCONS:
-                update_aircon(d, p, payload)
+        REGISTRY.apply(msg.topic, payload, state.values)
+        record_pir(msg.topic, payload)
     except:
         pass
 
 
 def main():
-    init_csv()
-    threading.Thread(target=flush_state_periodically, daemon=True).start()
+    writer = make_writer(STORAGE_BACKEND, CSV_FILE, PARQUET_DIR, COLUMNS)
+    threading.Thread(
+        target=flush_state_periodically, args=(writer,), daemon=True
+    ).start()
     threading.Thread(target=run_web_server, daemon=True).start()
     client = mqtt.Client()
     client.on_connect = on_connect
@@ -411,6 +358,8 @@ def main():
         client.loop_forever()
     except KeyboardInterrupt:
         print("終了")
+    finally:
+        writer.close()
 
 
 if __name__ == "__main__":
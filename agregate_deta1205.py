@@ -6,6 +6,9 @@ import time
 import threading
 from datetime import datetime
 
+from device_registry import DeviceRegistry
+from snapshot_state import SnapshotState
+
 # ========= 設定 =========
 MQTT_BROKER = "150.65.179.132"
 MQTT_PORT = 7883
@@ -115,10 +118,10 @@ def build_columns():
 
 
 COLUMNS = build_columns()
+REGISTRY = DeviceRegistry(COLUMNS, PIR_DEVICES, M5_DEVICES, AIR_PURIFIERS, AIRCONS)
 
-# 状態を保持する辞書（列名 -> 値）
-state = {col: None for col in COLUMNS if col != "timestamp"}
-state_lock = threading.Lock()
+# 状態は COLUMNS と同じ並びの事前確保配列（ロック無しで書き、フラッシュ時に一括コピー）
+state = SnapshotState(COLUMNS)
 
 
 # ========= CSV ヘッダー作成 =========
@@ -137,12 +140,8 @@ def init_csv():
 def flush_state_periodically():
     while True:
         time.sleep(FLUSH_INTERVAL_SEC)
-        with state_lock:
-            # 現在時刻
-            row = [datetime.now().isoformat()]
-            # 各カラムの最新値を取得
-            for col in COLUMNS[1:]:
-                row.append(state.get(col))
+        row = state.snapshot().tolist()
+        row[0] = datetime.now().isoformat()
 
         # ファイル書き込み
         with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
@@ -151,99 +150,6 @@ def flush_state_periodically():
         print(f"[CSV] snapshot written at {row[0]}")
 
 
-# ========= MQTT メッセージ処理 =========
-
-
-def update_pir(device_id, property_name, payload):
-    # motion / motion_raw
-    if property_name in ("motion", "motion_raw"):
-        val = payload.get(property_name)
-        col = f"{device_id}_motion"
-        with state_lock:
-            state[col] = bool(val) if val is not None else None
-
-
-def update_m5(device_id, property_name, payload):
-    # payload は {propertyName: value}
-    items = payload.items()
-    with state_lock:
-        for key, val in items:
-            k = key.lower()
-            if "co2" in k:
-                state[f"{device_id}_co2"] = val
-            if ("temp" in k) and ("scd40" in k or "sen55" in k):
-                state[f"{device_id}_temp"] = val
-            if "hum" in k:
-                state[f"{device_id}_hum"] = val
-            if "pm2_5" in k or "pm2.5" in k:
-                state[f"{device_id}_pm2_5"] = val
-            if "voc" in k:
-                state[f"{device_id}_voc"] = val
-
-
-def update_air_purifier(device_id, property_name, payload):
-    # customF1 に各種データ
-    items = payload.items()
-    with state_lock:
-        for key, val in items:
-            if key == "temperature":
-                state[f"{device_id}_temp"] = val
-            elif key == "humidity":
-                state[f"{device_id}_hum"] = val
-            elif key == "pm25":
-                state[f"{device_id}_pm25"] = val
-            elif key == "gasContaminationValue":
-                state[f"{device_id}_gas"] = val
-            elif key == "illuminanceValue":
-                state[f"{device_id}_illuminance"] = val
-
-
-def update_aircon(device_id, property_name, payload):
-    # 頂いたJSONプロパティに基づきマッピング
-    with state_lock:
-        for key, val in payload.items():
-            # 電源
-            if key == "operationStatus":
-                state[f"{device_id}_opStatus"] = bool(val)
-            # 運転モード
-            elif key == "operationMode":
-                state[f"{device_id}_mode"] = val
-            # 設定温度 (setTemperature or targetTemperature)
-            elif key in ("setTemperature", "targetTemperature"):
-                state[f"{device_id}_setTemp"] = val
-            # 室温
-            elif key == "roomTemperature":
-                state[f"{device_id}_roomTemp"] = val
-            # 湿度
-            elif key == "humidity":
-                state[f"{device_id}_hum"] = val
-            # 外気温 (outsideTemperature or outdoorTemperature)
-            elif key in ("outsideTemperature", "outdoorTemperature"):
-                # "unmeasurable" などの文字列が来ることがあるのでそのまま保存
-                state[f"{device_id}_outsideTemp"] = val
-            # 吹出温度
-            elif key == "blowingOutAirTemperature":
-                state[f"{device_id}_blowTemp"] = val
-            # 消費電力
-            elif key == "instantaneousElectricPowerConsumption":
-                state[f"{device_id}_power"] = val
-            # 積算電力量
-            elif key == "consumedCumulativeElectricEnergy":
-                state[f"{device_id}_totalPower"] = val
-            # 風量
-            elif key == "airFlowLevel":
-                state[f"{device_id}_flow"] = val
-            # 人検知
-            elif key == "humanDetected":
-                state[f"{device_id}_human"] = bool(val)
-            # 日射
-            elif key == "sunshineSensorData":
-                state[f"{device_id}_sunshine"] = val
-            # CO2
-            elif key == "co2Concentration":
-                state[f"{device_id}_co2"] = val
-
-
 # ========= MQTT コールバック =========
 
 
@@ -261,28 +167,8 @@ def on_message(client, userdata, msg):
     except Exception as e:
         return
 
-    parts = topic.split("/")
-    # /server/{CID}/{deviceId}/properties/{property}
-    if len(parts) < 6 or parts[1] != "server":
-        return
-
-    device_id = parts[3]
-    property_name = parts[5]
-
-    # デバイスID判定
-    if device_id in PIR_DEVICES:
-        update_pir(device_id, property_name, payload)
-
-    elif device_id in M5_DEVICES:
-        update_m5(device_id, property_name, payload)
-
-    elif device_id in AIR_PURIFIERS:
-        # customF1 の中身を展開
-        update_air_purifier(device_id, property_name, payload)
-
-    elif device_id in AIRCONS:
-        # customF6, customFA, その他のプロパティを展開
-        update_aircon(device_id, property_name, payload)
+    # /server/{CID}/{deviceId}/properties/{property} → REGISTRY のディスパッチ表で反映
+    REGISTRY.apply(topic, payload, state.values)
 
 
 # ========= メイン =========
@@ -1,17 +1,22 @@
 import paho.mqtt.client as mqtt
 import json
-import os
-import csv
 import time
 import threading
 from datetime import datetime
 
+from device_registry import DeviceRegistry
+from snapshot_state import SnapshotState
+from snapshot_writer import make_writer
+
 # ========= 設定 =========
 MQTT_BROKER = "150.65.179.132"
 MQTT_PORT = 7883
 MQTT_TOPIC = "/server/#"
 
 CSV_FILE = "smart_home_snapshot.csv"
+# 保存形式: "csv" | "parquet"（日付パーティション）| "both"
+STORAGE_BACKEND = "csv"
+PARQUET_DIR = "smart_home_snapshot_parquet"
 FLUSH_INTERVAL_SEC = 10
 
 
@@ -126,134 +131,21 @@ def build_columns():
 
 
 COLUMNS = build_columns()
-state = {col: None for col in COLUMNS if col != "timestamp"}
-state_lock = threading.Lock()
-
+REGISTRY = DeviceRegistry(COLUMNS, PIR_DEVICES, M5_DEVICES, AIR_PURIFIERS, AIRCONS)
 
-# ========= CSV ヘッダー作成 =========
-def init_csv():
-    # カラムが変わったので、既存ファイルがある場合は別名にするか削除推奨
-    if not os.path.exists(CSV_FILE):
-        with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(COLUMNS)
-        print(f"[CSV] 新規作成: {CSV_FILE}")
-    else:
-        print(f"[CSV] 既存ファイルに追記します: {CSV_FILE}")
+# 状態は COLUMNS と同じ並びの事前確保配列（ロック無しで書き、フラッシュ時に一括コピー）
+state = SnapshotState(COLUMNS)
 
 
 # ========= 定期フラッシュ =========
-def flush_state_periodically():
+def flush_state_periodically(writer):
     while True:
         time.sleep(FLUSH_INTERVAL_SEC)
-        with state_lock:
-            row = [datetime.now().isoformat()]
-            for col in COLUMNS[1:]:
-                row.append(state.get(col))
-
-        with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
-        print(f"[CSV] snapshot written at {row[0]}")
-
-
-# ========= MQTT メッセージ処理 =========
-
-
-def update_pir(device_id, property_name, payload):
-    if property_name in ("motion", "motion_raw"):
-        val = payload.get(property_name)
-        col = f"{device_id}_motion"
-        with state_lock:
-            state[col] = bool(val) if val is not None else None
-
-
-def update_m5(device_id, property_name, payload):
-    items = payload.items()
-    with state_lock:
-        for key, val in items:
-            k = key.lower()
-            if "co2" in k:
-                state[f"{device_id}_co2"] = val
-            if ("temp" in k) and ("scd40" in k or "sen55" in k):
-                state[f"{device_id}_temp"] = val
-            if "hum" in k:
-                state[f"{device_id}_hum"] = val
-            if "pm2_5" in k or "pm2.5" in k:
-                state[f"{device_id}_pm2_5"] = val
-            if "voc" in k:
-                state[f"{device_id}_voc"] = val
-
-
-def update_air_purifier(device_id, property_name, payload):
-    # payloadは customF1 (dict) または 個別のプロパティ (value)
-    # customF1の場合: {"temperature": 18, ...}
-    # 個別の場合: {"operationStatus": true} など
-
-    # データを統合して処理しやすくする
-    data_map = {}
-    if isinstance(payload, dict):
-        data_map = payload
-    else:
-        # 単一の値が来た場合 (property_name がキーになる)
-        data_map = {property_name: payload}
-
-    with state_lock:
-        for key, val in data_map.items():
-            # customF1 の中身
-            if key == "temperature":
-                state[f"{device_id}_temp"] = val
-            elif key == "humidity":
-                state[f"{device_id}_hum"] = val
-            elif key == "pm25":
-                state[f"{device_id}_pm25"] = val
-            elif key == "gasContaminationValue":
-                state[f"{device_id}_gas"] = val
-            elif key == "illuminanceValue":
-                state[f"{device_id}_illuminance"] = val
-            elif key == "dustValue":
-                state[f"{device_id}_dust"] = val
-
-            # 通常プロパティ
-            elif key == "operationStatus":
-                state[f"{device_id}_opStatus"] = bool(val)
-            elif key == "instantaneousElectricPowerConsumption":
-                state[f"{device_id}_power"] = val
-            elif key == "airFlowLevel":
-                state[f"{device_id}_flow"] = val
-            elif key == "odorStainEvaluationLevel":
-                state[f"{device_id}_odor"] = val
-            elif key == "overallDirtinessLevel":
-                state[f"{device_id}_dirt"] = val
-
-
-def update_aircon(device_id, property_name, payload):
-    with state_lock:
-        for key, val in payload.items():
-            if key == "outsideTemperature":
-                state[f"{device_id}_outsideTemp"] = val
-            elif key == "roomTemperature":
-                state[f"{device_id}_roomTemp"] = val
-            elif key in ("targetTemperature", "setTemperature"):
-                state[f"{device_id}_setTemp"] = val
-            elif key == "humanDetected":
-                state[f"{device_id}_human"] = bool(val)
-            elif key == "sunshineSensorData":
-                state[f"{device_id}_sunshine"] = val
-            elif key == "blowingOutAirTemperature":
-                state[f"{device_id}_blowTemp"] = val
-            elif key == "co2Concentration":
-                state[f"{device_id}_co2"] = val
-            elif key == "operationStatus":
-                state[f"{device_id}_opStatus"] = bool(val)
-            elif key == "instantaneousElectricPowerConsumption":
-                state[f"{device_id}_power"] = val
-            elif key == "consumedCumulativeElectricEnergy":
-                state[f"{device_id}_totalPower"] = val
-            elif key == "airFlowLevel":
-                state[f"{device_id}_flow"] = val
-            elif key == "humidity":
-                state[f"{device_id}_hum"] = val
+        row = state.snapshot().tolist()
+        row[0] = datetime.now()
+
+        writer.write(row)
+        print(f"[CSV] snapshot written at {row[0].isoformat()}")
 
 
 # ========= MQTT コールバック =========
@@ -273,29 +165,16 @@ def on_message(client, userdata, msg):
     except Exception:
         return
 
-    parts = topic.split("/")
-    if len(parts) < 6 or parts[1] != "server":
-        return
-
-    device_id = parts[3]
-    property_name = parts[5]
-
-    if device_id in PIR_DEVICES:
-        update_pir(device_id, property_name, payload)
-    elif device_id in M5_DEVICES:
-        update_m5(device_id, property_name, payload)
-    elif device_id in AIR_PURIFIERS:
-        update_air_purifier(device_id, property_name, payload)
-    elif device_id in AIRCONS:
-        update_aircon(device_id, property_name, payload)
+    # /server/{CID}/{deviceId}/properties/{property} → REGISTRY のディスパッチ表で反映
+    REGISTRY.apply(topic, payload, state.values)
 
 
 # ========= メイン =========
 
 
 def main():
-    init_csv()
-    t = threading.Thread(target=flush_state_periodically, daemon=True)
+    writer = make_writer(STORAGE_BACKEND, CSV_FILE, PARQUET_DIR, COLUMNS)
+    t = threading.Thread(target=flush_state_periodically, args=(writer,), daemon=True)
     t.start()
 
     client = mqtt.Client()
@@ -309,6 +188,8 @@ def main():
         client.loop_forever()
     except KeyboardInterrupt:
         print("\n[END] 終了します")
+    finally:
+        writer.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+build_labels のベンチマーク。
+  - ラベル解決（行ループ版 vs 行列版）
+  - PIR 集計（部屋ごとの rolling max/mean vs 累積和の一括集計）
+
+Usage:
+  python benchmarks/bench_build_labels.py --rows 3000000
+  python benchmarks/bench_build_labels.py --rows 500000 --resolve priority
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import train_room_model as trm  # noqa: E402
+
+ROOMS = {
+    "sleeping_room": ["sleeping_room__pir2", "sleeping_room__pir_http_0701"],
+    "washitsu": ["washitsu__pir2", "washitsu__pir_http_0701"],
+    "living": ["living__pir2", "living__pir_http_0701", "living__pir_http_0702"],
+}
+
+
+def make_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """1Hz の統合CSVを模した合成データ（PIRはまばらな 0/1）。"""
+    rng = np.random.default_rng(seed)
+    data = {
+        "timestamp": pd.date_range("2025-01-01", periods=n_rows, freq="1s"),
+    }
+    for cols in ROOMS.values():
+        for c in cols:
+            data[c] = (rng.random(n_rows) < 0.02).astype(float)
+    return pd.DataFrame(data)
+
+
+def legacy_pir(df, cols, window_sec, sticky_after_sec):
+    """変更前の _pir_any_true / _pir_score（列ごとの rolling max / mean）。"""
+    maxes, means = [], []
+    for c in cols:
+        s = (df[c].fillna(0) != 0).astype(float)
+        roll = s.rolling(window=window_sec, min_periods=1)
+        maxes.append(roll.max())
+        means.append(roll.mean())
+    any_true = pd.concat(maxes, axis=1).max(axis=1) > 0.0
+    flag = trm._sticky_from_bool(any_true, sticky_after_sec)
+    return flag, pd.concat(means, axis=1).max(axis=1).fillna(0.0)
+
+
+def bench_pir(df):
+    # 部屋間で共有する列がある設定（廊下の PIR を両隣の部屋が参照する想定）
+    rooms = {r: cols + ["living__pir2"] for r, cols in ROOMS.items()}
+    all_cols = [c for cols in rooms.values() for c in cols]
+
+    t0 = time.perf_counter()
+    old = {r: legacy_pir(df, cols, 10, 30) for r, cols in rooms.items()}
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pir = trm._PirWindows(df, all_cols, 10)
+    new = {
+        r: (
+            trm._sticky_from_bool(pd.Series(pir.any_true(cols), index=df.index), 30),
+            pir.score(cols),
+        )
+        for r, cols in rooms.items()
+    }
+    t_new = time.perf_counter() - t0
+    print(f"pir rolling : {t_old:8.3f} s")
+    print(f"pir cumsum  : {t_new:8.3f} s  (x{t_old / t_new:.1f})")
+    for r in rooms:
+        assert (old[r][0] == new[r][0]).all()
+        np.testing.assert_allclose(old[r][1].to_numpy(), new[r][1], atol=1e-12)
+    print("✓ identical flags / scores")
+
+
+def legacy_resolve(room_flags, room_scores, priority, resolve_multi, none_label, index):
+    """変更前の build_labels の行ループをそのまま移植したもの。"""
+    labels = []
+    rooms_order = list(room_flags.keys())
+    for i in index:
+        true_rooms = [r for r in rooms_order if bool(room_flags[r].loc[i])]
+        if len(true_rooms) == 1:
+            labels.append(true_rooms[0])
+        elif len(true_rooms) == 0:
+            labels.append(none_label)
+        else:
+            if resolve_multi == "drop":
+                labels.append(None)
+            elif resolve_multi == "priority":
+                ordered = [r for r in priority if r in true_rooms]
+                labels.append(ordered[0] if ordered else true_rooms[0])
+            elif resolve_multi == "score":
+                best = max(true_rooms, key=lambda r: room_scores[r].loc[i])
+                labels.append(best)
+            else:
+                labels.append(true_rooms[0])
+    return pd.Series(labels, index=index, name="__label")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument(
+        "--resolve", default="score", choices=["score", "priority", "drop", "first"]
+    )
+    ap.add_argument(
+        "--skip-legacy", action="store_true", help="行ループ版の計測を省略する"
+    )
+    args = ap.parse_args()
+
+    df = make_frame(args.rows)
+    bench_pir(df)
+    room_flags, room_scores = {}, {}
+    for room, cols in ROOMS.items():
+        room_flags[room] = trm._pir_any_true(df, cols, 10, 30)
+        room_scores[room] = trm._pir_score(df, cols, 10)
+    priority = ["living", "washitsu", "sleeping_room"]
+    print(f"rows={args.rows:,}  rooms={len(ROOMS)}  resolve_multi={args.resolve}")
+
+    t0 = time.perf_counter()
+    labels = trm._resolve_labels(
+        room_flags, room_scores, priority, args.resolve, "unknown", len(df)
+    )
+    new = pd.Series(labels.tolist(), index=df.index, name="__label")
+    t_new = time.perf_counter() - t0
+    print(f"matrix  : {t_new:8.3f} s")
+
+    if args.skip_legacy:
+        return
+
+    t0 = time.perf_counter()
+    old = legacy_resolve(
+        room_flags, room_scores, priority, args.resolve, "unknown", df.index
+    )
+    t_old = time.perf_counter() - t0
+    print(f"row loop: {t_old:8.3f} s  (x{t_old / t_new:.0f})")
+
+    pd.testing.assert_series_equal(new, old)
+    print("✓ identical output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+/server/# メッセージ処理のマイクロベンチマーク:
+従来の split + リスト走査 + if/elif（キーごとにロック）と device_registry.DeviceRegistry の比較。
+
+Usage:
+  python benchmarks/bench_dispatch.py --messages 200000
+  python benchmarks/bench_dispatch.py --replay server_stream.jsonl   # {"topic":..., "payload":...} 1 行 1 件
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import agregator1207 as agg  # noqa: E402
+from device_registry import DeviceRegistry  # noqa: E402
+from snapshot_state import SnapshotState  # noqa: E402
+
+
+def synthetic_stream(n: int, seed: int = 0):
+    """家の /server/# を模した (topic, payload_bytes) 列。"""
+    rng = random.Random(seed)
+    cid = "53965d6805152d95"
+    kinds = []
+    for d in agg.PIR_DEVICES:
+        kinds.append((d, "motion", lambda: {"motion": rng.random() < 0.3}))
+        kinds.append((d, "motion_raw", lambda: {"motion_raw": rng.random() < 0.3}))
+    for d in agg.M5_DEVICES:
+        kinds.append(
+            (
+                d,
+                "customF1",
+                lambda: {
+                    "scd40_co2": rng.randint(400, 1500),
+                    "scd40_temp": round(rng.uniform(15, 30), 1),
+                    "scd40_hum": round(rng.uniform(30, 70), 1),
+                    "sen55_pm2_5": round(rng.uniform(0, 30), 1),
+                    "sen55_voc": rng.randint(0, 300),
+                },
+            )
+        )
+    for d in agg.AIR_PURIFIERS:
+        kinds.append(
+            (
+                d,
+                "customF1",
+                lambda: {
+                    "temperature": rng.randint(15, 30),
+                    "humidity": rng.randint(30, 70),
+                    "pm25": rng.randint(0, 50),
+                    "gasContaminationValue": rng.randint(0, 100),
+                    "illuminanceValue": rng.randint(0, 800),
+                    "dustValue": rng.randint(0, 10),
+                },
+            )
+        )
+        kinds.append((d, "operationStatus", lambda: True))
+    for d in agg.AIRCONS:
+        kinds.append(
+            (
+                d,
+                "customF6",
+                lambda: {
+                    "outsideTemperature": rng.randint(0, 35),
+                    "humanDetected": rng.random() < 0.5,
+                    "sunshineSensorData": rng.randint(0, 100),
+                    "blowingOutAirTemperature": rng.randint(15, 45),
+                },
+            )
+        )
+        kinds.append(
+            (d, "customFA", lambda: {"co2Concentration": rng.randint(400, 1500)})
+        )
+    # 対象外デバイス（分電盤など）も混ぜる
+    kinds.append(("C0A80301-028701", "instantaneousElectricPower", lambda: {"v": 1}))
+
+    out = []
+    for _ in range(n):
+        d, p, make = rng.choice(kinds)
+        topic = f"/server/{cid}/{d}/properties/{p}"
+        out.append((topic, json.dumps(make()).encode("utf-8")))
+    return out
+
+
+def load_replay(path: str):
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            out.append((rec["topic"], json.dumps(rec["payload"]).encode("utf-8")))
+    return out
+
+
+# ---- 変更前の agregator1207.on_message 相当 ----
+def make_legacy():
+    state = {c: None for c in agg.COLUMNS if c != "timestamp"}
+    lock = threading.Lock()
+
+    def update_pir(d, p, payload):
+        if p in ("motion", "motion_raw"):
+            val = payload.get(p)
+            with lock:
+                state[f"{d}_motion"] = bool(val) if val is not None else None
+
+    def update_m5(d, p, payload):
+        with lock:
+            for key, val in payload.items():
+                k = key.lower()
+                if "co2" in k:
+                    state[f"{d}_co2"] = val
+                if ("temp" in k) and ("scd40" in k or "sen55" in k):
+                    state[f"{d}_temp"] = val
+                if "hum" in k:
+                    state[f"{d}_hum"] = val
+                if "pm2_5" in k or "pm2.5" in k:
+                    state[f"{d}_pm2_5"] = val
+                if "voc" in k:
+                    state[f"{d}_voc"] = val
+
+    purifier = {
+        "temperature": "temp",
+        "humidity": "hum",
+        "pm25": "pm25",
+        "gasContaminationValue": "gas",
+        "illuminanceValue": "illuminance",
+        "dustValue": "dust",
+    }
+    aircon = {
+        "outsideTemperature": "outsideTemp",
+        "humanDetected": "human",
+        "sunshineSensorData": "sunshine",
+        "blowingOutAirTemperature": "blowTemp",
+        "co2Concentration": "co2",
+    }
+
+    def update_keyed(d, p, payload, table):
+        data = payload if isinstance(payload, dict) else {p: payload}
+        with lock:
+            for key, val in data.items():
+                # if/elif 連鎖の平均的な比較回数を再現するため順に照合する
+                for k, m in table.items():
+                    if key == k:
+                        state[f"{d}_{m}"] = val
+                        break
+
+    def dispatch(topic, payload):
+        parts = topic.split("/")
+        if len(parts) < 6 or parts[1] != "server":
+            return
+        d, p = parts[3], parts[5]
+        if d in agg.PIR_DEVICES:
+            update_pir(d, p, payload)
+        elif d in agg.M5_DEVICES:
+            update_m5(d, p, payload)
+        elif d in agg.AIR_PURIFIERS:
+            update_keyed(d, p, payload, purifier)
+        elif d in agg.AIRCONS:
+            update_keyed(d, p, payload, aircon)
+
+    return dispatch
+
+
+def make_registry():
+    reg = DeviceRegistry(
+        agg.COLUMNS, agg.PIR_DEVICES, agg.M5_DEVICES, agg.AIR_PURIFIERS, agg.AIRCONS
+    )
+    values = reg.new_values()
+    lock = threading.Lock()
+
+    def dispatch(topic, payload):
+        with lock:
+            reg.apply(topic, payload, values)
+
+    return dispatch
+
+
+def make_registry_lockfree():
+    reg = DeviceRegistry(
+        agg.COLUMNS, agg.PIR_DEVICES, agg.M5_DEVICES, agg.AIR_PURIFIERS, agg.AIRCONS
+    )
+    state = SnapshotState(agg.COLUMNS)
+
+    def dispatch(topic, payload):
+        reg.apply(topic, payload, state.values)
+
+    return dispatch
+
+
+def run(name, dispatch, stream, decoded):
+    t0 = time.perf_counter()
+    for topic, raw in stream:
+        dispatch(topic, json.loads(raw.decode("utf-8")))
+    with_json = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for topic, payload in decoded:
+        dispatch(topic, payload)
+    only = time.perf_counter() - t0
+    print(
+        f"{name:9s}: {len(stream) / with_json:12,.0f} msg/s (json.loads 込み)"
+        f"  {len(stream) / only:12,.0f} msg/s (ディスパッチのみ)"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200_000)
+    ap.add_argument(
+        "--replay", default=None, help="記録済み /server/# ストリーム (jsonl)"
+    )
+    args = ap.parse_args()
+
+    stream = (
+        load_replay(args.replay) if args.replay else synthetic_stream(args.messages)
+    )
+    decoded = [(t, json.loads(r)) for t, r in stream]
+    print(f"messages={len(stream):,}")
+    run("legacy", make_legacy(), stream, decoded)
+    run("registry", make_registry(), stream, decoded)
+    run("lockfree", make_registry_lockfree(), stream, decoded)
+
+
+if __name__ == "__main__":
+    main()
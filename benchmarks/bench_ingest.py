@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+アグリゲータ群の取り込みスループット計測:
+ECHONET 形式の合成 payload を各スクリプトの on_message に直接流し、
+msg/s・ハンドラ遅延 p50/p99・フラッシュ（1 行書き出し）遅延 p50/p99 をデバイス数ごとに出す。
+フラッシュは書き込み先のバッファ 1 回ぶん（WRITER_BUFFER_ROWS 行）以上回して最後に close() し、
+close() を含めた 1 行あたりの平均（flush amort）も出す（溜めて書く書き込み先とも比べられるように）。
+
+対象:
+  agregate_data1212 / agregate_deta1205 / agregator1207 / smart-home-dashboard/mqtt_to_csv
+      … DeviceRegistry 系。デバイス一覧を差し替えて COLUMNS / REGISTRY / state を作り直す
+  ELWA_aggregator
+      … TOPIC_MAP 系。multi-sensors 形式の合成デバイスを TOPIC_TO_KEY に足して規模を変える
+  0918living
+      … elwa_daemon のプロファイル（旧 State クラスの置き換え）を IngestionDaemon 経由で
+
+payload は PIR motion / M5Stack 複数キー dict / 空気清浄機 customF1 / エアコン customF6・customFA
+（TOPIC_MAP 系は購読しているプロパティ単位のトピック）。
+
+Usage:
+  python benchmarks/bench_ingest.py
+  python benchmarks/bench_ingest.py --devices 8 40 400 --messages 50000 --only agregate_data1212
+"""
+
+import argparse
+import contextlib
+import csv
+import importlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "smart-home-dashboard"))
+from device_registry import AIRCON_KEYS, DeviceRegistry  # noqa: E402
+from mqtt_replay import ReplayMessage  # noqa: E402
+from snapshot_state import SnapshotState  # noqa: E402
+from snapshot_writer import CsvSnapshotWriter  # noqa: E402
+
+CID = "53965d6805152d95"
+REGISTRY_TARGETS = [
+    "agregate_data1212",
+    "agregate_deta1205",
+    "agregator1207",
+    "mqtt_to_csv",
+]
+TOPIC_MAP_TARGETS = ["ELWA_aggregator", "0918living"]
+# 書き込み先が溜める最大行数（ParquetSnapshotWriter の row_group_rows 既定値）
+WRITER_BUFFER_ROWS = 360
+
+
+# ============================
+# 合成デバイス / メッセージ
+# ============================
+def make_devices(n: int):
+    """n 台を PIR 50% / M5Stack 20% / 空気清浄機 15% / エアコン 15% に割り振る。"""
+    n_m5 = max(1, n * 20 // 100)
+    n_ap = max(1, n * 15 // 100)
+    n_ac = max(1, n * 15 // 100)
+    n_pir = max(1, n - n_m5 - n_ap - n_ac)
+    return (
+        [f"PIR{i + 1}" for i in range(n_pir)],
+        [f"M5Stack{i + 1}" for i in range(n_m5)],
+        [f"C0A8{i:04X}-013501" for i in range(n_ap)],
+        [f"C0A8{0x8000 + i:04X}-013001" for i in range(n_ac)],
+    )
+
+
+def registry_stream(devices, n: int, seed: int = 0):
+    pirs, m5s, aps, acs = devices
+    rng = random.Random(seed)
+
+    def pir(d):
+        p = rng.choice(("motion", "motion_raw"))
+        return d, p, {p: rng.random() < 0.3}
+
+    def m5(d):
+        return (
+            d,
+            "customF1",
+            {
+                "scd40_co2": rng.randint(400, 1500),
+                "scd40_temp": round(rng.uniform(15, 30), 1),
+                "scd40_hum": round(rng.uniform(30, 70), 1),
+                "sen55_pm2_5": round(rng.uniform(0, 30), 1),
+                "sen55_voc": rng.randint(0, 300),
+            },
+        )
+
+    def ap(d):
+        return (
+            d,
+            "customF1",
+            {
+                "temperature": rng.randint(15, 30),
+                "humidity": rng.randint(30, 70),
+                "pm25": rng.randint(0, 50),
+                "gasContaminationValue": rng.randint(0, 100),
+                "illuminanceValue": rng.randint(0, 800),
+                "dustValue": rng.randint(0, 10),
+                "operationStatus": True,
+            },
+        )
+
+    def ac(d):
+        if rng.random() < 0.5:
+            return (
+                d,
+                "customF6",
+                {
+                    "outsideTemperature": rng.randint(0, 35),
+                    "humanDetected": rng.random() < 0.5,
+                    "sunshineSensorData": rng.randint(0, 100),
+                    "blowingOutAirTemperature": rng.randint(15, 45),
+                },
+            )
+        return d, "customFA", {"co2Concentration": rng.randint(400, 1500)}
+
+    kinds = (
+        [(pir, d) for d in pirs]
+        + [(m5, d) for d in m5s]
+        + [(ap, d) for d in aps]
+        + [(ac, d) for d in acs]
+    )
+    out = []
+    for _ in range(n):
+        make, d = rng.choice(kinds)
+        d, p, payload = make(d)
+        out.append((f"/server/{CID}/{d}/properties/{p}", json.dumps(payload).encode()))
+    return out
+
+
+def extra_sensor_topics(n_extra: int):
+    """multi-sensors 形式の合成デバイス (topic, json_key, 列名)。"""
+    out = []
+    for i in range(n_extra):
+        for k in ("co2", "temperature", "humidity", "lux"):
+            out.append(
+                (f"/server/{CID}/bench-sensors{i}/properties/{k}", k, f"{k}(bench_{i})")
+            )
+    return out
+
+
+def topic_map_stream(topic_map, n: int, seed: int = 0):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        topic, key, _ = rng.choice(topic_map)
+        if key in ("pir2", "mic_occupied", "sound_trig", "lepton_occupied"):
+            v = rng.random() < 0.3
+        elif key == "door":
+            v = rng.choice(("OPEN", "CLOSED"))
+        else:
+            v = round(rng.uniform(0, 1500), 1)
+        out.append((topic, json.dumps({key: v}).encode()))
+    return out
+
+
+def n_topic_devices(topic_map) -> int:
+    return len({t.split("/")[3] for t, _, _ in topic_map})
+
+
+# ============================
+# 対象ごとの準備（on_message, flush, メッセージ列）
+# ============================
+def setup_registry_target(name: str, n_devices: int, n_msgs: int, tmpdir: str):
+    mod = importlib.import_module(name)
+    devices = make_devices(n_devices)
+    mod.PIR_DEVICES, mod.M5_DEVICES, mod.AIR_PURIFIERS, mod.AIRCONS = devices
+    mod.COLUMNS = mod.build_columns()
+    kw = {}
+    if any(c.endswith("_humanDetected") for c in mod.COLUMNS):
+        kw["aircon_keys"] = {**AIRCON_KEYS, "humanDetected": "humanDetected"}
+    mod.REGISTRY = DeviceRegistry(mod.COLUMNS, *devices, **kw)
+    mod.state = SnapshotState(mod.COLUMNS)
+
+    path = os.path.join(tmpdir, f"{name}_{n_devices}.csv")
+    if name == "agregate_deta1205":
+        # 生の csv.writer で追記する版
+        def flush():
+            row = mod.state.snapshot().tolist()
+            row[0] = datetime.now().isoformat()
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(row)
+
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            writer = CsvSnapshotWriter(path, mod.COLUMNS)
+
+        def flush():
+            row = mod.state.snapshot().tolist()
+            row[0] = datetime.now()
+            writer.write(row)
+
+        return (
+            mod.on_message,
+            flush,
+            registry_stream(devices, n_msgs),
+            len(mod.COLUMNS),
+            writer.close,
+        )
+
+    return (
+        mod.on_message,
+        flush,
+        registry_stream(devices, n_msgs),
+        len(mod.COLUMNS),
+        _no_close,
+    )
+
+
+def setup_elwa_aggregator(n_devices: int, n_msgs: int, tmpdir: str):
+    mod = importlib.import_module("ELWA_aggregator")
+    base = list(mod.TOPIC_MAP)
+    topic_map = base + extra_sensor_topics(max(0, n_devices - n_topic_devices(base)))
+    mod.TOPIC_TO_KEY = {t: (k, f) for t, k, f in topic_map}
+    mod.FIELDNAMES = ["timestamp"]
+    if mod.HTTP_PIR_ENABLED:
+        mod.FIELDNAMES.append(mod.HTTP_PIR_FIELD)
+    for _, _, f in topic_map:
+        if f not in mod.FIELDNAMES:
+            mod.FIELDNAMES.append(f)
+    mod.latest_values = {k: None for k in mod.FIELDNAMES if k != "timestamp"}
+    path = os.path.join(tmpdir, f"ELWA_aggregator_{n_devices}.csv")
+
+    # writer_loop の 1 回分
+    def flush():
+        with mod.latest_values_lock:
+            row = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            if mod.HTTP_PIR_ENABLED:
+                row[mod.HTTP_PIR_FIELD] = mod.latest_pir_http
+            for k in mod.FIELDNAMES:
+                if k in ("timestamp", mod.HTTP_PIR_FIELD):
+                    continue
+                row[k] = mod.latest_values.get(k, None)
+        with open(path, "a", newline="") as f:
+            csv.DictWriter(f, fieldnames=mod.FIELDNAMES).writerow(row)
+
+    return (
+        mod.on_message,
+        flush,
+        topic_map_stream(topic_map, n_msgs),
+        len(mod.FIELDNAMES),
+        _no_close,
+    )
+
+
+def setup_profile(name: str, n_devices: int, n_msgs: int, tmpdir: str):
+    from elwa_daemon import CsvSink, IngestionDaemon, load_profile
+
+    prof = load_profile(name)
+    base = list(prof.topic_map)
+    topic_map = base + extra_sensor_topics(max(0, n_devices - n_topic_devices(base)))
+    path = os.path.join(tmpdir, f"{name}_{n_devices}.csv")
+    fields = prof.fieldnames + [f for _, _, f in topic_map[len(base) :]]
+    prof = replace(prof, topic_map=topic_map, fieldnames=fields, verbose=False)
+    sink = CsvSink(path, fields)
+    daemon = IngestionDaemon([prof], sinks={prof.name: [sink]})
+    st = daemon.states[0]
+    return (
+        daemon._on_message,
+        st.emit,
+        topic_map_stream(topic_map, n_msgs),
+        len(fields),
+        sink.close,
+    )
+
+
+def _no_close():
+    pass
+
+
+def setup(name, n_devices, n_msgs, tmpdir):
+    if name in REGISTRY_TARGETS:
+        return setup_registry_target(name, n_devices, n_msgs, tmpdir)
+    if name == "ELWA_aggregator":
+        return setup_elwa_aggregator(n_devices, n_msgs, tmpdir)
+    return setup_profile(name, n_devices, n_msgs, tmpdir)
+
+
+# ============================
+# 計測
+# ============================
+def measure(on_message, flush, close, stream, n_flush: int):
+    msgs = [ReplayMessage(t, p) for t, p in stream]
+    lat = np.empty(len(msgs), dtype=np.int64)
+    clock = time.perf_counter_ns
+    # ログ出力（print）もハンドラのコストに含めるが、端末には出さない
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        t0 = clock()
+        for i, m in enumerate(msgs):
+            a = clock()
+            on_message(None, None, m)
+            lat[i] = clock() - a
+        total = clock() - t0
+        fl = np.empty(n_flush, dtype=np.int64)
+        for i in range(n_flush):
+            a = clock()
+            flush()
+            fl[i] = clock() - a
+        a = clock()
+        close()  # 溜まっている行の書き出し
+        t_close = clock() - a
+    return {
+        "msg_s": len(msgs) / (total / 1e9),
+        "p50_us": np.percentile(lat, 50) / 1e3,
+        "p99_us": np.percentile(lat, 99) / 1e3,
+        "flush_p50_ms": np.percentile(fl, 50) / 1e6,
+        "flush_p99_ms": np.percentile(fl, 99) / 1e6,
+        "flush_amort_ms": (fl.sum() + t_close) / n_flush / 1e6,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, nargs="+", default=[8, 40, 400])
+    ap.add_argument("--messages", type=int, default=50_000)
+    ap.add_argument(
+        "--flushes",
+        type=int,
+        default=WRITER_BUFFER_ROWS,
+        help=f"フラッシュ回数（{WRITER_BUFFER_ROWS} 未満を指定しても {WRITER_BUFFER_ROWS} 回）",
+    )
+    ap.add_argument(
+        "--only", nargs="+", default=None, help="対象を絞る（モジュール名）"
+    )
+    args = ap.parse_args()
+
+    targets = args.only or REGISTRY_TARGETS + TOPIC_MAP_TARGETS
+    n_flush = max(args.flushes, WRITER_BUFFER_ROWS)
+    print(
+        f"{'target':18s} {'dev':>4s} {'cols':>5s} {'msg/s':>10s} {'p50 µs':>7s}"
+        f" {'p99 µs':>7s} {'flush p50 ms':>12s} {'flush p99 ms':>12s}"
+        f" {'flush amort ms':>14s}"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in targets:
+            for n in args.devices:
+                on_message, flush, stream, n_cols, close = setup(
+                    name, n, args.messages, tmpdir
+                )
+                r = measure(on_message, flush, close, stream, n_flush)
+                print(
+                    f"{name:18s} {n:4d} {n_cols:5d} {r['msg_s']:10,.0f}"
+                    f" {r['p50_us']:7.1f} {r['p99_us']:7.1f}"
+                    f" {r['flush_p50_ms']:12.3f} {r['flush_p99_ms']:12.3f}"
+                    f" {r['flush_amort_ms']:14.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+combined.StreamingWindowFeatures（1 行ずつ更新）と
+combined.add_time_window_features（全履歴から再計算）の比較。
+
+Usage:
+  python benchmarks/bench_stream_features.py --rows 3600 --cols 150
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from combined import StreamingWindowFeatures, add_time_window_features  # noqa: E402
+
+
+def make_frame(n_rows: int, n_cols: int, seed: int = 0) -> pd.DataFrame:
+    """欠損と時刻の飛びを含む 1Hz の合成データ。"""
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2025-01-01", periods=n_rows, freq="1s")
+    idx = idx.delete(rng.choice(n_rows, n_rows // 10, replace=False))
+    df = pd.DataFrame(
+        rng.normal(600.0, 20.0, (len(idx), n_cols)),
+        index=idx,
+        columns=[f"room__s{i}" for i in range(n_cols)],
+    )
+    df.iloc[:, 0] = (rng.random(len(idx)) < 0.1).astype(float)
+    df = df.mask(rng.random(df.shape) < 0.05)
+    return df
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=3600)
+    ap.add_argument("--cols", type=int, default=150)
+    args = ap.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    print(f"rows={len(df):,}  cols={args.cols}")
+
+    t0 = time.perf_counter()
+    ref = add_time_window_features(df)
+    t_batch = time.perf_counter() - t0
+    print(f"batch recompute (全履歴): {t_batch * 1e3:9.1f} ms")
+
+    eng = StreamingWindowFeatures(list(df.columns))
+    out = np.empty((len(df), len(eng.feature_names)))
+    t0 = time.perf_counter()
+    for i, (ts, row) in enumerate(zip(df.index, df.to_numpy())):
+        out[i] = eng.update(ts, row)
+    t_stream = time.perf_counter() - t0
+    print(f"streaming update (1 行) : {t_stream / len(df) * 1e6:9.1f} us/tick")
+
+    exp = ref[eng.feature_names].to_numpy()
+    assert (np.isnan(out) == np.isnan(exp)).all()
+    err = np.nanmax(np.abs(out - exp) / np.maximum(1.0, np.abs(exp)))
+    print(f"max rel. error vs batch : {err:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# bool_coerce.py
+# センサー状態（True/False, "on"/"off", "OPEN"/"CLOSED", 0/1 ...）→ 1.0 / 0.0 / NaN の一括変換
+#
+#   - 値の種類ごとに 1 回だけ判定し（factorize / Categorical のコード）、
+#     参照テーブルを codes で引いて列全体を変換する（セルごとの lambda を呼ばない）
+#   - 判定は従来の _to_bool と同じ:
+#       NaN / None            -> NaN
+#       bool                  -> 1 / 0
+#       数値                  -> 0 なら 0、それ以外 1
+#       文字列（大小無視）    -> true,t,yes,y,on,1,closed = 1 / false,f,no,n,off,0,open = 0
+#       上記以外              -> NaN
+#   - train_room_model / predict_batch_from_integrated / snapshot_loader で共用し、
+#     学習と推論で同じ変換になるようにする
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+TRUE_WORDS = ("true", "t", "yes", "y", "on", "1", "closed")  # door closed -> 在
+FALSE_WORDS = ("false", "f", "no", "n", "off", "0", "open")  # door open -> 無人
+VOCAB = {**{w: 1.0 for w in TRUE_WORDS}, **{w: 0.0 for w in FALSE_WORDS}}
+
+
+def bool_value(x, numeric_strings: bool = False) -> float:
+    """値 1 つ → 1.0 / 0.0 / NaN。numeric_strings=True なら "2.5" なども数値として扱う。"""
+    if x is None:
+        return np.nan
+    if isinstance(x, (bool, np.bool_)):
+        return float(x)
+    if isinstance(x, (int, float, np.integer, np.floating)):
+        return np.nan if x != x else float(x != 0)
+    if isinstance(x, str):
+        s = x.strip().lower()
+        v = VOCAB.get(s)
+        if v is not None:
+            return v
+        if numeric_strings:
+            try:
+                f = float(s)
+            except ValueError:
+                return np.nan
+            return np.nan if f != f else float(f != 0)
+    return np.nan
+
+
+def _lookup(uniques, numeric_strings: bool) -> np.ndarray:
+    # 末尾の NaN はコード -1（欠損）用
+    return np.array(
+        [bool_value(u, numeric_strings) for u in uniques] + [np.nan], dtype=np.float64
+    )
+
+
+def bool_array(series: pd.Series, numeric_strings: bool = False) -> np.ndarray:
+    """列 → float64 の 1 / 0 / NaN 配列。"""
+    if pd.api.types.is_bool_dtype(series) and not series.hasnans:
+        return series.to_numpy(dtype=np.float64)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        return _lookup(series.cat.categories, numeric_strings)[codes]
+    if pd.api.types.is_numeric_dtype(series):
+        a = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return np.where(np.isnan(a), np.nan, (a != 0).astype(np.float64))
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return _lookup(uniques, numeric_strings)[codes]
+
+
+def to_bool01(series: pd.Series, numeric_strings: bool = False) -> pd.Series:
+    """列 → 1.0 / 0.0 / NaN の float Series（index はそのまま）。"""
+    return pd.Series(
+        bool_array(series, numeric_strings), index=series.index, name=series.name
+    )
+
+
+def to_flag(series: pd.Series) -> np.ndarray:
+    """PIR 列など: 真なら 1.0、偽・判定不能・欠損は 0.0。"""
+    a = bool_array(series)
+    a[np.isnan(a)] = 0.0
+    return a
+
+
+def is_textual(series: pd.Series) -> bool:
+    """object / str / category の列か（数値・bool 以外）。"""
+    dt = series.dtype
+    return (
+        dt == object
+        or isinstance(dt, pd.CategoricalDtype)
+        or pd.api.types.is_string_dtype(dt)
+    )
+
+
+def object_to_numeric(series: pd.Series) -> pd.Series:
+    """文字列・bool の状態列を 1 / 0 / NaN に、数値列はそのまま返す。"""
+    if is_textual(series):
+        return to_bool01(series)
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype(float)
+    return series
+
+
+def coerce_frame(df: pd.DataFrame, skip: Optional[list] = None) -> pd.DataFrame:
+    """object_to_numeric を全列に（skip の列は触らない）。列をまとめて組み直す。"""
+    skip = set(skip or ())
+    cols = {c: (df[c] if c in skip else object_to_numeric(df[c])) for c in df.columns}
+    return pd.DataFrame(cols, index=df.index)
@@ -4,7 +4,10 @@
 import argparse
 import json
 import os
-from typing import List, Tuple, Dict
+import shutil
+import tempfile
+import warnings
+from typing import Iterable, Iterator, List, Optional, Tuple, Dict
 
 import numpy as np
 import pandas as pd
@@ -29,6 +32,35 @@ TIME_COL_CANDIDATES = [
 BOOL_PATTERNS_TRUE = {"true", "1", "on", "yes"}
 BOOL_PATTERNS_FALSE = {"false", "0", "off", "no"}
 DOOR_MAP = {"open": 0, "closed": 1}
+BOOLISH_KEYS = [
+    "pir",
+    "occupied",
+    "door",
+    "thermal",
+    "detection",
+    "sound_trig",
+    "mic_occupied",
+]
+CSV_ENCODINGS = ["utf-8", "cp932", "shift-jis"]
+FEATURE_WINDOWS = (5, 10, 30, 60)
+# 集計スクリプトが書く時刻の書式（strftime / isoformat）。先頭から順に試す
+TS_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "ISO8601",  # isoformat() は端数秒の有無が行ごとに変わる
+]
+# 数字だけの日付（20250101 / 20250101123000）。epoch として読むと範囲外になるときに試す
+TS_DIGIT_FORMATS = ["%Y%m%d%H%M%S", "%Y%m%d"]
+# epoch の単位は大きさで決める（中央値 < 上限 の最初の単位）
+TS_EPOCH_UNITS = [("s", 1e11), ("ms", 1e14), ("us", 1e17), ("ns", float("inf"))]
+TS_PLAUSIBLE = (pd.Timestamp("2000-01-01"), pd.Timestamp("2100-01-01"))
+TS_SNIFF_ROWS = 200
+TS_CACHE_SUFFIX = ".tscache.npz"
+TS_CACHE_VERSION = 2  # パース方法を変えたら上げる（古いキャッシュは読まない）
+FFILL_LIMIT = 30  # clean_dataframe の前方埋め（行数）
+BFILL_LIMIT = 2  # clean_dataframe の後方埋め（行数）
 
 
 def guess_room_from_filename(path: str) -> str:
@@ -43,7 +75,7 @@ def guess_room_from_filename(path: str) -> str:
 
 
 def read_csv_any(path: str) -> pd.DataFrame:
-    for enc in ["utf-8", "cp932", "shift-jis"]:
+    for enc in CSV_ENCODINGS:
         try:
             return pd.read_csv(path, encoding=enc, low_memory=False)
         except Exception:
@@ -55,9 +87,14 @@ def find_timestamp_col(df: pd.DataFrame) -> str:
     for c in TIME_COL_CANDIDATES:
         if c in df.columns:
             return c
-    # 最初に日時化できる列を探す
+    # 最初に日時化できる列を探す（先頭 TS_SNIFF_ROWS 行だけで判定）
     for c in df.columns:
-        s = pd.to_datetime(df[c], errors="coerce")
+        sample = df[c].dropna().head(TS_SNIFF_ROWS)
+        if sample.empty:
+            continue
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # 日時でない列の推論失敗
+            s = pd.to_datetime(sample, errors="coerce")
         if s.notna().mean() > 0.8:
             return c
     raise ValueError(
@@ -65,7 +102,58 @@ def find_timestamp_col(df: pd.DataFrame) -> str:
     )
 
 
-def parse_timestamp(s: pd.Series) -> pd.Series:
+def _parse_epoch(num: pd.Series, unit: str) -> pd.Series:
+    """epoch 数値 → 日時。TS_PLAUSIBLE の範囲外は NaT。"""
+    dt = pd.to_datetime(num, unit=unit, errors="coerce")
+    return dt.where((dt >= TS_PLAUSIBLE[0]) & (dt < TS_PLAUSIBLE[1]))
+
+
+def _as_digits(s: pd.Series) -> pd.Series:
+    """数値として読まれた 20250101 などを "20250101" の文字列に戻す。"""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.round().astype("Int64").astype(str).where(s.notna())
+    return s
+
+
+def sniff_timestamp_format(s: pd.Series) -> Optional[str]:
+    """
+    先頭の非欠損 TS_SNIFF_ROWS 件をすべて解釈できる固定フォーマットを返す。
+    数値（epoch）なら大きさで "s" / "ms" / "us" / "ns"（日時が TS_PLAUSIBLE の範囲に
+    入るときだけ）、どれにも合わなければ None（汎用パース）。
+    """
+    sample = s.dropna().head(TS_SNIFF_ROWS)
+    if sample.empty:
+        return None
+    num = pd.to_numeric(sample, errors="coerce")
+    if num.notna().all():
+        med = num.abs().median()
+        unit = next(u for u, limit in TS_EPOCH_UNITS if med < limit)
+        if _parse_epoch(num, unit).notna().all():
+            return unit
+        digits = _as_digits(num)
+        for fmt in TS_DIGIT_FORMATS:
+            if pd.to_datetime(digits, format=fmt, errors="coerce").notna().all():
+                return fmt
+        return None
+    sample = sample.astype(str)
+    for fmt in TS_FORMATS + TS_DIGIT_FORMATS:
+        if pd.to_datetime(sample, format=fmt, errors="coerce").notna().all():
+            return fmt
+    return None
+
+
+def parse_timestamp(s: pd.Series, fmt: Optional[str] = None) -> pd.Series:
+    if fmt in dict(TS_EPOCH_UNITS):
+        dt = _parse_epoch(pd.to_numeric(s, errors="coerce"), fmt)
+        # 範囲外・欠損が半分を超えるなら汎用パースに戻す
+        if dt.notna().sum() * 2 >= s.notna().sum():
+            return dt
+    elif fmt is not None:
+        src = _as_digits(s) if fmt in TS_DIGIT_FORMATS else s
+        dt = pd.to_datetime(src, format=fmt, errors="coerce")
+        # 途中から書式が変わっている等で半分以上落ちるなら汎用パースに戻す
+        if dt.notna().sum() * 2 >= s.notna().sum():
+            return dt
     dt = pd.to_datetime(s, errors="coerce")
     if dt.isna().mean() > 0.5:
         num = pd.to_numeric(s, errors="coerce")
@@ -77,6 +165,66 @@ def parse_timestamp(s: pd.Series) -> pd.Series:
     return dt
 
 
+# パース済み時刻のキャッシュ（<csv>.tscache.npz）。CSV のサイズと更新時刻が同じ間だけ使う
+def _ts_to_ns(dt: pd.Series) -> Tuple[np.ndarray, str]:
+    tz = ""
+    if isinstance(dt.dtype, pd.DatetimeTZDtype):
+        tz = str(dt.dt.tz)
+        dt = dt.dt.tz_convert("UTC").dt.tz_localize(None)
+    return dt.to_numpy(dtype="datetime64[ns]").view(np.int64), tz
+
+
+def _ts_from_ns(ns: np.ndarray, tz: str, index, name) -> pd.Series:
+    dt = pd.Series(ns.view("datetime64[ns]"), index=index, name=name)
+    if tz:
+        dt = dt.dt.tz_localize("UTC").dt.tz_convert(tz)
+    return dt
+
+
+def load_cached_timestamps(path: str) -> Optional[Tuple[str, np.ndarray, str]]:
+    """(時刻列名, 時刻[ns, NaT 含む], tz) または None。"""
+    try:
+        st = os.stat(path)
+        with np.load(path + TS_CACHE_SUFFIX) as z:
+            if (int(z["size"]), int(z["mtime_ns"])) != (st.st_size, st.st_mtime_ns):
+                return None
+            if "version" not in z or int(z["version"]) != TS_CACHE_VERSION:
+                return None
+            return str(z["ts_col"]), z["ts"], str(z["tz"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_cached_timestamps(path: str, ts_col: str, ns: np.ndarray, tz: str):
+    try:
+        st = os.stat(path)
+        tmp = f"{path}.tscache-{os.getpid()}.npz"
+        np.savez(
+            tmp,
+            ts=ns,
+            ts_col=np.array(ts_col),
+            tz=np.array(tz),
+            size=np.int64(st.st_size),
+            mtime_ns=np.int64(st.st_mtime_ns),
+            version=np.int64(TS_CACHE_VERSION),
+        )
+        os.replace(tmp, path + TS_CACHE_SUFFIX)
+    except OSError:
+        pass  # 書けない場所ならキャッシュしないだけ
+
+
+def read_timestamps(path: str, raw: pd.DataFrame) -> Tuple[str, pd.Series]:
+    """(時刻列名, パース済みの時刻 Series)。未変更の CSV ならキャッシュから返す。"""
+    hit = load_cached_timestamps(path)
+    if hit is not None and hit[0] in raw.columns and len(hit[1]) == len(raw):
+        ts_col, ns, tz = hit
+        return ts_col, _ts_from_ns(ns, tz, raw.index, ts_col)
+    ts_col = find_timestamp_col(raw)
+    dt = parse_timestamp(raw[ts_col], sniff_timestamp_format(raw[ts_col]))
+    save_cached_timestamps(path, ts_col, *_ts_to_ns(dt))
+    return ts_col, dt
+
+
 def normalize_boolish_series(col: pd.Series) -> pd.Series:
     """Seriesを0/1のInt64へ（open/closed, true/false 等にも対応）"""
     if pd.api.types.is_bool_dtype(col):
@@ -125,36 +273,62 @@ def resample_df(df: pd.DataFrame, freq: str = "1s") -> pd.DataFrame:
     return out
 
 
+def _rowwise_last_valid(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """(行, 列) の 2 次元配列から、各行で一番右の非欠損値を取る（無ければ None）。"""
+    k = values.shape[1]
+    last = k - 1 - mask[:, ::-1].argmax(axis=1)
+    out = values[np.arange(len(values)), last]
+    out[~mask.any(axis=1)] = None
+    return out
+
+
 def collapse_duplicate_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     同名列を安全に折り畳む：
       - 全列が数値/ブール ⇒ 行方向 max（ORに相当）
-      - それ以外混在 ⇒ 行方向で「最後に観測された値」（bfill→1列目）
-    返り値は列名が一意なDataFrame
+      - それ以外混在 ⇒ 行方向で「最後に観測された値」（右優先で非欠損を採用）
+    返り値は列名が一意なDataFrame（一意な列は元の順、畳んだ列は末尾）
+    同名列の位置をまとめてから、2 次元ブロック単位で NumPy 集計し、出力は 1 回だけ組み立てる。
     """
     cols = df.columns
-    dup_names = cols[cols.duplicated()].unique()
-    if len(dup_names) == 0:
+    dup = cols.duplicated(keep=False)
+    if not dup.any():
         return df
 
-    out = df.copy()
-    for name in dup_names:
-        same = out.loc[:, out.columns == name]
-        # dtypeがすべて数値/ブール？
+    # 名前 -> 列位置（重複の 2 回目が現れた順 = 従来の処理順）
+    positions: Dict[str, List[int]] = {}
+    for i in np.flatnonzero(dup):
+        positions.setdefault(cols[i], []).append(i)
+    order = cols[cols.duplicated()].unique()
+
+    collapsed = {}
+    for name in order:
+        block = df.iloc[:, positions[name]]
+        dtypes = list(block.dtypes)
+        same_dtype = all(d == dtypes[0] for d in dtypes)
         all_numeric = all(
-            pd.api.types.is_numeric_dtype(same[c])
-            or pd.api.types.is_bool_dtype(same[c])
-            for c in same.columns
+            pd.api.types.is_numeric_dtype(d) or pd.api.types.is_bool_dtype(d)
+            for d in dtypes
         )
         if all_numeric:
-            agg = same.apply(pd.to_numeric, errors="coerce").max(axis=1)
+            vals = block.to_numpy(dtype=np.float64, na_value=np.nan)
+            agg = pd.Series(np.fmax.reduce(vals, axis=1), index=df.index)
+            if same_dtype:
+                try:
+                    agg = agg.astype(dtypes[0])
+                except (TypeError, ValueError):
+                    pass  # 欠損があって int / bool に戻せない列は float のまま
         else:
-            # 右優先で非欠損を採用（各時刻で「最後に観測された値」）
-            agg = same.bfill(axis=1).iloc[:, 0]
-        out = out.drop(columns=same.columns).assign(**{name: agg})
-    # 念のため一度並べ替え（元の順序は大事ではない）
-    out = out.loc[:, ~out.columns.duplicated()]
-    return out
+            vals = block.to_numpy(dtype=object)
+            agg = pd.Series(
+                _rowwise_last_valid(vals, block.notna().to_numpy()),
+                index=df.index,
+                dtype=dtypes[0] if same_dtype else object,
+            )
+        collapsed[name] = agg
+
+    keep = df.iloc[:, np.flatnonzero(~dup)]
+    return pd.concat([keep, pd.DataFrame(collapsed, index=df.index)], axis=1)
 
 
 def add_time_window_features(
@@ -173,6 +347,128 @@ def add_time_window_features(
     return pd.concat(frames, axis=1)
 
 
+class _WindowRing:
+    """1 つの時間窓 (t - w, t] 分の行を保持するリングバッファ（和は呼び出し側が持つ）。"""
+
+    def __init__(self, window_sec: float, width: int):
+        self.window_ns = int(round(window_sec * 1e9))
+        cap = max(int(window_sec) + 2, 8)
+        self.ts = np.empty(cap, dtype=np.int64)
+        self.rows = np.empty((cap, width))
+        self.head = 0
+        self.size = 0
+
+    def push(self, t_ns: int, row: np.ndarray, acc: np.ndarray) -> bool:
+        """窓外の行を acc から引いて捨て、row を足して積む。何か捨てたら True。"""
+        cap = len(self.ts)
+        cutoff = t_ns - self.window_ns
+        evicted = False
+        while self.size and self.ts[self.head] <= cutoff:
+            acc -= self.rows[self.head]
+            self.head = (self.head + 1) % cap
+            self.size -= 1
+            evicted = True
+
+        if self.size == cap:
+            order = (self.head + np.arange(self.size)) % cap
+            self.ts = np.concatenate([self.ts[order], np.empty_like(self.ts)])
+            self.rows = np.concatenate([self.rows[order], np.empty_like(self.rows)])
+            self.head = 0
+            cap *= 2
+        tail = (self.head + self.size) % cap
+        self.ts[tail] = t_ns
+        self.rows[tail] = row
+        self.size += 1
+        acc += row
+        return evicted
+
+
+class StreamingWindowFeatures:
+    """
+    add_time_window_features のストリーミング版。
+
+    スナップショット 1 行ごとに update() を呼ぶと、窓ごとのリングバッファと
+    累積和・二乗和を O(1) で更新し、同じ定義の `{c}__mean{w}s` /
+    `{c}__std{w}s` / `{c}__diff{w}s` を feature_names の順で返す。
+    窓は rolling(f"{w}s") と同じ (t - w, t] の時間窓で、欠損値は数えない。
+
+    例:
+        eng = StreamingWindowFeatures(["living__co2", "living__pir"])
+        feats = eng.row(ts, {"living__co2": 612.0, "living__pir": 1})
+    """
+
+    def __init__(self, columns: List[str], windows=(5, 10, 30, 60)):
+        self.columns = list(columns)
+        self.windows = tuple(windows)
+        self.feature_names = []
+        for w in self.windows:
+            for kind in ("mean", "std", "diff"):
+                self.feature_names += [f"{c}__{kind}{w}s" for c in self.columns]
+        n = len(self.columns)
+        self._col_idx = {c: i for i, c in enumerate(self.columns)}
+        # 1 行を [値, 値^2, 観測数, diff, diff観測数] の 5n 要素にして窓ごとに足し引きする
+        self._rings = [_WindowRing(w, 5 * n) for w in self.windows]
+        self._acc = np.zeros((len(self.windows), 5, n))
+        self._prev = np.full(n, np.nan)
+        # 分散の桁落ち対策: 列ごとに最初の観測値を原点として集計する
+        self._origin = np.full(n, np.nan)
+
+    def _as_array(self, values) -> np.ndarray:
+        if isinstance(values, dict):
+            x = np.full(len(self.columns), np.nan)
+            for k, v in values.items():
+                i = self._col_idx.get(k)
+                if i is not None and v is not None:
+                    x[i] = v
+            return x
+        if isinstance(values, pd.Series):
+            values = values.reindex(self.columns)
+        return np.asarray(values, dtype=float)
+
+    def update(self, ts, values) -> np.ndarray:
+        """
+        1 行追加して特徴量配列を返す。
+        ts は datetime 系か epoch 秒（昇順）、values は dict / Series / columns 順の配列。
+        """
+        if isinstance(ts, (int, float, np.integer, np.floating)):
+            t_ns = int(round(float(ts) * 1e9))
+        else:
+            t_ns = pd.Timestamp(ts).value
+        x = self._as_array(values)
+        mx = ~np.isnan(x)
+        unset = mx & np.isnan(self._origin)
+        if unset.any():
+            self._origin[unset] = x[unset]
+        d = x - self._prev
+        md = ~np.isnan(d)
+        self._prev = x
+
+        xv = np.where(mx, x - self._origin, 0.0)
+        row = np.concatenate([xv, xv * xv, mx, np.where(md, d, 0.0), md])
+        for k, ring in enumerate(self._rings):
+            acc = self._acc[k]
+            if ring.push(t_ns, row, acc.reshape(-1)):
+                # 浮動小数の誤差が残らないよう、空になった列の和は 0 に戻す
+                empty = acc[2] == 0
+                acc[0][empty] = 0.0
+                acc[1][empty] = 0.0
+                acc[3][acc[4] == 0] = 0.0
+
+        sx, sxx, nx, sd, nd = np.moveaxis(self._acc, 1, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = sx / nx
+            var = (sxx - sx * mean) / (nx - 1)
+            std = np.where(nx > 1, np.sqrt(np.maximum(var, 0.0)), np.nan)
+            dmean = sd / nd
+        mean = np.where(nx > 0, mean + self._origin, np.nan)
+        dmean = np.where(nd > 0, dmean, np.nan)
+        return np.stack([mean, std, dmean], axis=1).reshape(-1)
+
+    def row(self, ts, values) -> dict:
+        """update() の結果を {特徴量名: 値} の dict で返す。"""
+        return dict(zip(self.feature_names, self.update(ts, values)))
+
+
 def build_room_labels(
     df: pd.DataFrame,
     room_keys=("washitsu", "sleeping_room", "living"),
@@ -245,7 +541,7 @@ def build_room_labels(
 
 def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     df = df.sort_index()
-    df = df.ffill(limit=30).bfill(limit=2)
+    df = df.ffill(limit=FFILL_LIMIT).bfill(limit=BFILL_LIMIT)
     # 数値の欠損は中央値で埋める
     for c in df.columns:
         if pd.api.types.is_numeric_dtype(df[c]) and df[c].isna().any():
@@ -256,11 +552,35 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 # --------------------------
 # メインフロー
 # --------------------------
-def load_one(path: str, resample: str) -> Tuple[str, pd.DataFrame]:
+def _with_timestamp_column(feature_base: pd.DataFrame) -> pd.DataFrame:
+    feature_base = feature_base.reset_index().rename(columns={"index": "timestamp"})
+    if "timestamp" not in feature_base.columns:
+        feature_base.rename(
+            columns={feature_base.columns[0]: "timestamp"}, inplace=True
+        )
+    return feature_base
+
+
+def _source_prefix(path: str) -> str:
     room_key = guess_room_from_filename(path)
-    raw = read_csv_any(path)
-    ts_col = find_timestamp_col(raw)
-    dt = parse_timestamp(raw[ts_col])
+    if room_key != "unknown":
+        return room_key
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _prepare_raw(
+    raw: pd.DataFrame,
+    ts_col: str,
+    boolish: Optional[set] = None,
+    dt: Optional[pd.Series] = None,
+) -> pd.DataFrame:
+    """
+    時刻を index にして欠損・重複時刻を落とし、0/1 化できそうな列を寄せる。
+    boolish を渡すと、一度 object だった列は以降のチャンクでも 0/1 化する（ストリーミング用）。
+    dt にパース済みの時刻（read_timestamps など）を渡すとそれを使う。
+    """
+    if dt is None:
+        dt = parse_timestamp(raw[ts_col], sniff_timestamp_format(raw[ts_col]))
 
     raw = raw.copy()
     raw.index = dt
@@ -270,25 +590,24 @@ def load_one(path: str, resample: str) -> Tuple[str, pd.DataFrame]:
 
     # 0/1 化できそうな列は事前に寄せる
     for c in list(raw.columns):
-        if (
-            any(
-                k in str(c).lower()
-                for k in [
-                    "pir",
-                    "occupied",
-                    "door",
-                    "thermal",
-                    "detection",
-                    "sound_trig",
-                    "mic_occupied",
-                ]
-            )
-            or raw[c].dtype == object
-        ):
+        is_object = raw[c].dtype == object
+        if boolish is not None:
+            if is_object:
+                boolish.add(c)
+            is_object = is_object or c in boolish
+        if any(k in str(c).lower() for k in BOOLISH_KEYS) or is_object:
             try:
                 raw[c] = normalize_boolish_column(raw[c])
             except Exception:
                 pass
+    return raw
+
+
+def load_one(path: str, resample: str) -> Tuple[str, pd.DataFrame]:
+    room_key = guess_room_from_filename(path)
+    raw = read_csv_any(path)
+    ts_col, dt = read_timestamps(path, raw)
+    raw = _prepare_raw(raw, ts_col, dt=dt)
 
     # リサンプル
     rs = resample_df(raw, resample)
@@ -297,12 +616,7 @@ def load_one(path: str, resample: str) -> Tuple[str, pd.DataFrame]:
     rs = collapse_duplicate_columns(rs)
 
     # プレフィックス付与
-    prefix = (
-        room_key
-        if room_key != "unknown"
-        else os.path.splitext(os.path.basename(path))[0]
-    )
-    pref = prefixed_columns(rs, prefix, exclude=[])
+    pref = prefixed_columns(rs, _source_prefix(path), exclude=[])
     return room_key, pref
 
 
@@ -343,14 +657,10 @@ def run(
     combined["target_room"] = target.astype("object")
 
     # 特徴量（断片化回避）
-    feature_base = add_time_window_features(combined, windows=(5, 10, 30, 60)).copy()
+    feature_base = add_time_window_features(combined, windows=FEATURE_WINDOWS).copy()
 
     # timestamp列を戻す
-    feature_base = feature_base.reset_index().rename(columns={"index": "timestamp"})
-    if "timestamp" not in feature_base.columns:
-        feature_base.rename(
-            columns={feature_base.columns[0]: "timestamp"}, inplace=True
-        )
+    feature_base = _with_timestamp_column(feature_base)
 
     # 特徴量リスト
     drop_cols = {"timestamp", "target_room"}
@@ -367,6 +677,325 @@ def run(
     print(feature_base["target_room"].value_counts(dropna=False))
 
 
+# --------------------------
+# ストリーミング結合（--stream）
+# --------------------------
+# 全 CSV を一度に読んで横結合する代わりに、各 CSV を時刻順のチャンク列として読み、
+# 1 秒グリッド上で k-way マージして特徴量をチャンクごとに書き出す。
+#   pass 1: マージ → ffill/bfill（直前 FFILL_LIMIT + BFILL_LIMIT 行を持ち越し）→ 一時ファイル
+#   pass 2: 列の中央値で穴埋め → 在室フラグ → 窓特徴量（直前 max(窓) 秒を持ち越し）→ CSV 追記
+# 使用メモリはチャンクサイズ（と、中央値を取るときの 1 列ぶん）で決まり、期間の長さには比例しない。
+def _sniff_source(path: str, chunksize: int) -> Tuple[str, str, bool, np.ndarray, str]:
+    """
+    (encoding, 時刻列, 時刻順に並んでいるか, 時刻[ns], tz) を、時刻列だけ読んで調べる。
+    パースした時刻は load_one と同じキャッシュに保存し、未変更ならパースし直さない。
+    """
+    for enc in CSV_ENCODINGS:
+        try:
+            head = pd.read_csv(path, encoding=enc, nrows=1000, low_memory=False)
+            hit = load_cached_timestamps(path)
+            if hit is not None and hit[0] in head.columns:
+                ts_col, ns, tz = hit
+            else:
+                ts_col = find_timestamp_col(head)
+                fmt = sniff_timestamp_format(head[ts_col])
+                parts, tz = [], ""
+                for ch in pd.read_csv(
+                    path, encoding=enc, usecols=[ts_col], chunksize=chunksize
+                ):
+                    a, tz = _ts_to_ns(parse_timestamp(ch[ts_col], fmt))
+                    parts.append(a)
+                ns = np.concatenate(parts) if parts else np.empty(0, np.int64)
+                save_cached_timestamps(path, ts_col, ns, tz)
+            valid = ns[ns != np.iinfo(np.int64).min]  # NaT を除く
+            ordered = bool((np.diff(valid) >= 0).all())
+            return enc, ts_col, ordered, ns, tz
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"文字コードを判別できません: {path}")
+
+
+def _resample_chunk(
+    raw: pd.DataFrame, resample: str, prefix: str, end=None
+) -> pd.DataFrame:
+    rs = resample_df(raw, resample)
+    if end is not None and rs.index[-1] < end:
+        # 次のチャンクの先頭 bin まで空の行を埋めて、グリッドを途切れさせない
+        rs = rs.reindex(
+            pd.date_range(rs.index[0], end, freq=resample, name=rs.index.name)
+        )
+    rs = collapse_duplicate_columns(rs)
+    return prefixed_columns(rs, prefix, exclude=[])
+
+
+def iter_source(
+    path: str, resample: str, chunksize: int = 50_000
+) -> Iterator[pd.DataFrame]:
+    """
+    load_one のチャンク版。リサンプル済み・プレフィックス付きの DataFrame を時刻順に返す。
+    最後の bin は次のチャンクに続くかもしれないので持ち越してからリサンプルする。
+    時刻順に並んでいない CSV は、そのファイルだけ load_one で読んで並べ替える。
+    """
+    enc, ts_col, ordered, ns, tz = _sniff_source(path, chunksize)
+    if not ordered:
+        print(f"⚠️  時刻順でないため全体を読み込みます: {path}")
+        _, df = load_one(path, resample)
+        for i in range(0, len(df), chunksize):
+            yield df.iloc[i : i + chunksize]
+        return
+
+    prefix = _source_prefix(path)
+    boolish = set()
+    carry = None
+    pos = 0
+    for ch in pd.read_csv(path, encoding=enc, chunksize=chunksize, low_memory=False):
+        dt = _ts_from_ns(ns[pos : pos + len(ch)], tz, ch.index, ts_col)
+        pos += len(ch)
+        raw = _prepare_raw(ch, ts_col, boolish, dt=dt)
+        if carry is not None:
+            raw = pd.concat([carry, raw])
+            raw = raw[~raw.index.duplicated(keep="last")]
+        if raw.empty:
+            continue
+        cut = raw.index[-1].floor(resample)
+        carry = raw[raw.index >= cut]
+        body = raw[raw.index < cut]
+        if not body.empty:
+            end = cut - pd.tseries.frequencies.to_offset(resample)
+            yield _resample_chunk(body, resample, prefix, end=end)
+    if carry is not None:
+        yield _resample_chunk(carry, resample, prefix)
+    else:
+        # 有効な行が無い CSV も、run() と同じく列だけは結合結果に残す
+        yield load_one(path, resample)[1]
+
+
+def merge_sources(sources: Iterable[Iterator[pd.DataFrame]]) -> Iterator[pd.DataFrame]:
+    """
+    時刻順のチャンク列を k-way マージする（pd.concat(frames, axis=1) のチャンク版）。
+    全入力が読み終えた時刻（各バッファ末尾の最小値）までを外部結合して重複列を畳み、
+    最初のチャンクで決めた列順に揃えて返す。
+    """
+    its = list(sources)
+    bufs: List[Optional[pd.DataFrame]] = [next(it, None) for it in its]
+    done = [b is None for b in bufs]
+    # 列順は各入力の最初のチャンク（空でも列はある）を入力順に並べて決める
+    names = [c for b in bufs if b is not None for c in b.columns]
+    columns = collapse_duplicate_columns(pd.DataFrame(columns=names)).columns
+    while True:
+        for i, it in enumerate(its):
+            while not done[i] and (bufs[i] is None or bufs[i].empty):
+                nxt = next(it, None)
+                if nxt is None:
+                    done[i] = True
+                else:
+                    bufs[i] = nxt
+        live = [b for b in bufs if b is not None and not b.empty]
+        if not live:
+            return
+        pending = [b.index[-1] for i, b in enumerate(bufs) if not done[i]]
+        horizon = min(pending) if pending else max(b.index[-1] for b in live)
+
+        parts = []
+        for i, b in enumerate(bufs):
+            if b is None or b.empty:
+                continue
+            k = b.index.searchsorted(horizon, side="right")
+            if k:
+                parts.append(b.iloc[:k])
+                bufs[i] = b.iloc[k:]
+        merged = pd.concat(parts, axis=1).sort_index()
+        yield collapse_duplicate_columns(merged).reindex(columns=columns)
+
+
+def _encode_text(col: pd.Series, vocab: dict) -> np.ndarray:
+    """文字列列を通し番号（float, 欠損は NaN）にする。vocab は値 -> 番号（追記される）。"""
+    codes, uniques = pd.factorize(col, use_na_sentinel=True)
+    remap = np.array(
+        [vocab.setdefault(u, len(vocab)) for u in uniques] + [np.nan], dtype=np.float64
+    )
+    return remap[codes]
+
+
+def _decode_text(codes: np.ndarray, vocab: dict) -> np.ndarray:
+    names = np.array(list(vocab) + [None], dtype=object)
+    return names[np.where(np.isnan(codes), -1, codes).astype(np.intp)]
+
+
+def _spool_grid(
+    merged_chunks: Iterator[pd.DataFrame], grid_path: str, ts_path: str
+) -> dict:
+    """
+    pass 1: マージ結果を ffill/bfill してから float64 の行列として一時ファイルに追記する。
+    文字列列は vocab の通し番号で持つ（最後まで値が無い列は数値列扱い）。
+    """
+    meta = None
+    tail = None  # 直近 FFILL_LIMIT + BFILL_LIMIT 行（埋める前の値）
+    pending = 0  # tail の末尾のうち、まだ書き出していない行数
+    leftover = None
+    with open(grid_path, "wb") as fg, open(ts_path, "wb") as ft:
+
+        def write(block: pd.DataFrame):
+            vals = np.ascontiguousarray(block.to_numpy(dtype=np.float64))
+            vals.tofile(fg)
+            block.index.as_unit("ns").asi8.tofile(ft)
+            meta["has_nan"] |= np.isnan(vals).any(axis=0)
+            meta["n_rows"] += len(block)
+
+        for merged in merged_chunks:
+            if meta is None:
+                cols = list(merged.columns)
+                meta = {
+                    "columns": cols,
+                    "index_name": merged.index.name,
+                    "vocab": {},
+                    "numeric": set(),
+                    "has_nan": np.zeros(len(cols), dtype=bool),
+                    "n_rows": 0,
+                }
+            enc = {}
+            for c in meta["columns"]:
+                # 文字列か数値かは、その列に初めて値が入ったチャンクで決める
+                # （後から始まる入力の列は、それまで reindex された全欠損の float 列）
+                undecided = c not in meta["vocab"] and c not in meta["numeric"]
+                if undecided and merged[c].notna().any():
+                    if pd.api.types.is_numeric_dtype(merged[c]):
+                        meta["numeric"].add(c)
+                    else:
+                        meta["vocab"][c] = {}
+                if c in meta["vocab"]:
+                    enc[c] = _encode_text(merged[c], meta["vocab"][c])
+                else:
+                    enc[c] = pd.to_numeric(merged[c], errors="coerce").to_numpy(
+                        dtype=np.float64, na_value=np.nan
+                    )
+            enc = pd.DataFrame(enc, index=merged.index)
+
+            buf = enc if tail is None else pd.concat([tail, enc])
+            filled = buf.ffill(limit=FFILL_LIMIT).bfill(limit=BFILL_LIMIT)
+            start = len(buf) - len(enc) - pending
+            stop = max(start, len(buf) - BFILL_LIMIT)
+            write(filled.iloc[start:stop])
+            leftover = filled.iloc[stop:]
+            pending = len(buf) - stop
+            tail = buf.iloc[-(FFILL_LIMIT + BFILL_LIMIT) :]
+        if leftover is not None and len(leftover):
+            write(leftover)  # 末尾は後ろが無いのでこのままで確定
+    return meta
+
+
+def _column_medians(grid: np.ndarray, cols: List[int], budget_rows: int) -> dict:
+    """memmap の列中央値（一度に読むのは budget_rows 行ぶんの要素数まで）。"""
+    n = len(grid)
+    per_pass = max(1, budget_rows * grid.shape[1] // max(n, 1))
+    out = {}
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for i in range(0, len(cols), per_pass):
+            block = cols[i : i + per_pass]
+            med = np.nanmedian(np.asarray(grid[:, block]), axis=0)
+            out.update(zip(block, med))
+    return out
+
+
+def _window_tail(base: pd.DataFrame, max_window: int) -> pd.DataFrame:
+    """次のチャンクの窓計算に必要な直前の行（max_window 秒ぶん + diff 用に 1 行）。"""
+    if base.empty:
+        return base
+    since = base.index[-1] - pd.Timedelta(seconds=max_window)
+    k = max(int(base.index.searchsorted(since, side="right")) - 1, 0)
+    return base.iloc[k:]
+
+
+def run_stream(
+    inputs: List[str],
+    out_path: str,
+    feat_json: str,
+    resample: str,
+    single_person_only: bool,
+    chunksize: int = 50_000,
+):
+    """run() のアウトオブコア版（出力は同じ形式の CSV / 特徴量 JSON）。"""
+    paths = []
+    for p in inputs:
+        if not os.path.exists(p):
+            print(f"⚠️  not found: {p}")
+            continue
+        paths.append(p)
+    if not paths:
+        raise SystemExit("読み込めるCSVがありませんでした。")
+
+    tmp = tempfile.mkdtemp(
+        prefix=".combined-", dir=os.path.dirname(os.path.abspath(out_path))
+    )
+    try:
+        grid_path = os.path.join(tmp, "grid.f8")
+        ts_path = os.path.join(tmp, "ts.i8")
+        meta = _spool_grid(
+            merge_sources(iter_source(p, resample, chunksize) for p in paths),
+            grid_path,
+            ts_path,
+        )
+        if meta is None or meta["n_rows"] == 0:
+            raise SystemExit("読み込めるCSVがありませんでした。")
+        columns, vocab, n = meta["columns"], meta["vocab"], meta["n_rows"]
+        grid = np.memmap(grid_path, dtype=np.float64, mode="r", shape=(n, len(columns)))
+        ts = np.memmap(ts_path, dtype=np.int64, mode="r", shape=(n,))
+
+        # clean_dataframe と同じく、数値列の残った欠損は列全体の中央値で埋める
+        need = [
+            j for j, c in enumerate(columns) if meta["has_nan"][j] and c not in vocab
+        ]
+        medians = _column_medians(grid, need, chunksize)
+
+        room_keys = ["washitsu", "sleeping_room", "living"]
+        max_window = max(FEATURE_WINDOWS)
+        prev = None
+        counts = None
+        feature_cols = None
+        for i in range(0, n, chunksize):
+            vals = np.array(grid[i : i + chunksize])
+            for j, m in medians.items():
+                col = vals[:, j]
+                col[np.isnan(col)] = m
+            idx = pd.DatetimeIndex(ts[i : i + chunksize], name=meta["index_name"])
+            chunk = pd.DataFrame(vals, index=idx, columns=columns)
+            for c in vocab:
+                chunk[c] = _decode_text(chunk[c].to_numpy(), vocab[c])
+
+            occ_df, target = build_room_labels(
+                chunk, room_keys=room_keys, single_person_only=single_person_only
+            )
+            base = pd.concat([chunk, occ_df], axis=1)
+            base["target_room"] = target.astype("object")
+
+            ext = base if prev is None else pd.concat([prev, base])
+            feats = add_time_window_features(ext, windows=FEATURE_WINDOWS)
+            feats = _with_timestamp_column(feats.iloc[len(ext) - len(base) :])
+            prev = _window_tail(ext, max_window)
+
+            first = feature_cols is None
+            if first:
+                drop_cols = {"timestamp", "target_room"}
+                feature_cols = [c for c in feats.columns if c not in drop_cols]
+            feats.to_csv(
+                out_path, mode="w" if first else "a", header=first, index=False
+            )
+            vc = feats["target_room"].value_counts(dropna=False)
+            counts = vc if counts is None else counts.add(vc, fill_value=0)
+        del grid, ts
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    with open(feat_json, "w", encoding="utf-8") as f:
+        json.dump(feature_cols, f, ensure_ascii=False, indent=2)
+
+    print(f"✓ wrote CSV: {out_path}  shape=({n}, {len(feature_cols) + 2})")
+    print(f"✓ wrote feature list JSON: {feat_json}  (n_features={len(feature_cols)})")
+    print("target_room counts:")
+    print(counts.astype(int).sort_values(ascending=False))
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Merge CSVs → resample → features → labels (single-person)."
@@ -384,10 +1013,30 @@ def main():
         action="store_true",
         help="同時複数在室は unknown に落とす",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="CSV をチャンクで読み、時刻順にマージしながら書き出す（長期間のログ向け）",
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=50_000, help="--stream 時の 1 チャンクの行数"
+    )
     args = parser.parse_args()
 
     resample = str(args.resample).lower()
-    run(args.inputs, args.out, args.features_json, resample, args.single_person_only)
+    if args.stream:
+        run_stream(
+            args.inputs,
+            args.out,
+            args.features_json,
+            resample,
+            args.single_person_only,
+            chunksize=args.chunksize,
+        )
+    else:
+        run(
+            args.inputs, args.out, args.features_json, resample, args.single_person_only
+        )
 
 
 if __name__ == "__main__":
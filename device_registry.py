@@ -0,0 +1,200 @@
+# device_registry.py
+# /server/# の MQTT メッセージを「列スロット番号 → 値」に変換する共通ディスパッチ表
+#
+#   topic: /server/{CID}/{deviceId}/properties/{property}
+#
+# 各アグリゲータは build_columns() の列と自分のデバイス一覧から DeviceRegistry を作り、
+# on_message では registry.apply(topic, payload, values) を呼ぶだけにする。
+#   - topic → (ハンドラ, deviceId, property) は dict キャッシュ（split は初回のみ）
+#   - (deviceId, payload key) → (スロット番号, 変換関数) は事前計算済み
+#   - 値は COLUMNS と同じ並びの事前確保配列 values[slot] に書く（SnapshotState.values など）
+
+from typing import Dict, List, Optional, Tuple
+
+# 空気清浄機 customF1 / 個別プロパティ: payload key → 列サフィックス
+PURIFIER_KEYS = {
+    "temperature": "temp",
+    "humidity": "hum",
+    "pm25": "pm25",
+    "gasContaminationValue": "gas",
+    "illuminanceValue": "illuminance",
+    "dustValue": "dust",
+    "operationStatus": "opStatus",
+    "instantaneousElectricPowerConsumption": "power",
+    "airFlowLevel": "flow",
+    "odorStainEvaluationLevel": "odor",
+    "overallDirtinessLevel": "dirt",
+}
+
+# エアコン customF6 / customFA / 通常プロパティ: payload key → 列サフィックス
+AIRCON_KEYS = {
+    "operationStatus": "opStatus",
+    "operationMode": "mode",
+    "setTemperature": "setTemp",
+    "targetTemperature": "setTemp",
+    "roomTemperature": "roomTemp",
+    "humidity": "hum",
+    "outsideTemperature": "outsideTemp",
+    "outdoorTemperature": "outsideTemp",
+    "blowingOutAirTemperature": "blowTemp",
+    "instantaneousElectricPowerConsumption": "power",
+    "consumedCumulativeElectricEnergy": "totalPower",
+    "airFlowLevel": "flow",
+    "humanDetected": "human",
+    "sunshineSensorData": "sunshine",
+    "co2Concentration": "co2",
+}
+
+# bool で保存する列サフィックス
+BOOL_METRICS = {"opStatus", "human", "humanDetected"}
+
+PIR_PROPERTIES = ("motion", "motion_raw")
+
+# topic キャッシュの上限（未知デバイスが大量に来ても膨らまないように）
+MAX_CACHED_TOPICS = 4096
+
+
+def _m5_metrics(key: str) -> Tuple[str, ...]:
+    """M5Stack の payload key（例: scd40_co2, sen55_temp）から該当する列サフィックスを返す。"""
+    k = key.lower()
+    out = []
+    if "co2" in k:
+        out.append("co2")
+    if ("temp" in k) and ("scd40" in k or "sen55" in k):
+        out.append("temp")
+    if "hum" in k:
+        out.append("hum")
+    if "pm2_5" in k or "pm2.5" in k:
+        out.append("pm2_5")
+    if "voc" in k:
+        out.append("voc")
+    return tuple(out)
+
+
+def _identity(v):
+    return v
+
+
+class DeviceRegistry:
+    def __init__(
+        self,
+        columns: List[str],
+        pir_devices=(),
+        m5_devices=(),
+        air_purifiers=(),
+        aircons=(),
+        purifier_keys: Optional[Dict[str, str]] = None,
+        aircon_keys: Optional[Dict[str, str]] = None,
+        pir_properties: Optional[Tuple[str, ...]] = PIR_PROPERTIES,
+        pir_keep_last: bool = False,
+    ):
+        """
+        pir_properties: motion 列に反映する PIR のプロパティ（None ならどのプロパティでも）
+        pir_keep_last : 値が無い / null のとき None で上書きせず直前の値を残す
+        """
+        self.columns = list(columns)
+        self._pir_props = None if pir_properties is None else frozenset(pir_properties)
+        self._pir_keep_last = pir_keep_last
+        self.slot = {c: i for i, c in enumerate(self.columns)}
+
+        self._handlers = {}
+        for d in pir_devices:
+            self._handlers[d] = self._pir
+        for d in m5_devices:
+            self._handlers[d] = self._m5
+        for d in air_purifiers:
+            self._handlers[d] = self._keyed
+        for d in aircons:
+            self._handlers[d] = self._keyed
+
+        # PIR: deviceId → motion 列
+        self._pir_slot = {
+            d: self.slot[f"{d}_motion"]
+            for d in pir_devices
+            if f"{d}_motion" in self.slot
+        }
+
+        # 空気清浄機/エアコン: (deviceId, key) → (slot, 変換)。列が無いキーは登録しない
+        self._key_slots = {}
+        for devices, keys in (
+            (air_purifiers, purifier_keys or PURIFIER_KEYS),
+            (aircons, aircon_keys or AIRCON_KEYS),
+        ):
+            for d in devices:
+                for key, metric in keys.items():
+                    col = f"{d}_{metric}"
+                    if col in self.slot:
+                        conv = bool if metric in BOOL_METRICS else _identity
+                        self._key_slots[(d, key)] = (self.slot[col], conv)
+
+        # M5Stack: key の種類は少ないので初見で解決してキャッシュ
+        self._m5_slots = {}
+
+        self._topics = {}
+
+    # ---------- topic ----------
+    def resolve(self, topic: str):
+        """topic → (handler, deviceId, property)。対象外なら None。"""
+        hit = self._topics.get(topic)
+        if hit is not None or topic in self._topics:
+            return hit
+        parts = topic.split("/")
+        hit = None
+        if len(parts) >= 6 and parts[1] == "server":
+            d = parts[3]
+            handler = self._handlers.get(d)
+            if handler is not None:
+                hit = (handler, d, parts[5])
+        if len(self._topics) < MAX_CACHED_TOPICS:
+            self._topics[topic] = hit
+        return hit
+
+    # ---------- handlers: (slot, value) を values に書く ----------
+    def _pir(self, d, p, payload, values):
+        if self._pir_props is not None and p not in self._pir_props:
+            return
+        if d in self._pir_slot and isinstance(payload, dict):
+            v = payload.get(p)
+            if v is None and self._pir_keep_last:
+                return
+            values[self._pir_slot[d]] = bool(v) if v is not None else None
+
+    def _m5(self, d, p, payload, values):
+        if not isinstance(payload, dict):
+            return
+        cache = self._m5_slots
+        for key, v in payload.items():
+            slots = cache.get((d, key))
+            if slots is None:
+                slots = tuple(
+                    self.slot[f"{d}_{m}"]
+                    for m in _m5_metrics(key)
+                    if f"{d}_{m}" in self.slot
+                )
+                cache[(d, key)] = slots
+            for s in slots:
+                values[s] = v
+
+    def _keyed(self, d, p, payload, values):
+        # customF1 / customF6 は dict、個別プロパティは値そのものが来る
+        data = payload if isinstance(payload, dict) else {p: payload}
+        key_slots = self._key_slots
+        for key, v in data.items():
+            hit = key_slots.get((d, key))
+            if hit is not None:
+                s, conv = hit
+                values[s] = conv(v)
+
+    # ---------- entry point ----------
+    def apply(self, topic: str, payload, values) -> bool:
+        """メッセージを values（COLUMNS と同じ並び）に反映。対象デバイスなら True。"""
+        hit = self.resolve(topic)
+        if hit is None:
+            return False
+        handler, d, p = hit
+        handler(d, p, payload, values)
+        return True
+
+    def new_values(self) -> list:
+        """COLUMNS と同じ長さの事前確保リスト（timestamp 列のスロットも含む）。"""
+        return [None] * len(self.columns)
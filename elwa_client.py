@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ELWA HTTP API のプロパティ読み出しをまとめるクライアント
+
+  GET {base}/elapi/v1/devices/{id}/properties          … 全プロパティを 1 回で取得（まとめ読み）
+  GET {base}/elapi/v1/devices/{id}/properties/{prop}   … まとめ読み非対応デバイス用のフォールバック
+
+  - 同じデバイスの読み出しは max_age 秒以内なら 1 回の取得結果を共有（同時呼び出しも 1 回に集約）
+  - デバイスごとのプロパティ一覧（まとめ読みで返ってきたキー）をキャッシュ
+  - subscribe() した複数の購読者（CO2 / 室温 / detection など）に、周期ごとに 1 回の取得で配る
+
+Usage:
+  client = ElwaClient()
+  client.get("1921682116000702", "detection")
+  client.subscribe("1921682116000702", ["detection"], callback, every=1.0)
+  client.run_forever()
+
+  # 複数スクリプトの購読を 1 つのクライアントで（register(client) を持つモジュール）
+  python elwa_client.py --with human_detection --with sensor_data_logger
+"""
+
+import argparse
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+DEFAULT_BASE = "http://150.65.179.132:7000"
+
+
+class ElwaAuthError(Exception):
+    """401 が返ったとき（トークン切れなど）。run_forever() はこれで停止する。"""
+
+
+@dataclass
+class _Subscription:
+    device: str
+    props: Optional[List[str]]  # None なら全プロパティ
+    callback: Callable[[dict], None]
+    every: float
+    next_at: float = 0.0
+
+
+class _DeviceCache:
+    def __init__(self):
+        self.lock = threading.Lock()  # 同時呼び出しを 1 回の取得にまとめる
+        self.values: Dict[str, object] = {}
+        self.fetched_at = -float("inf")  # monotonic
+        self.bulk_ok: Optional[bool] = None  # None=未判定
+        self.names: Optional[List[str]] = None  # プロパティ一覧
+
+
+class ElwaClient:
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE,
+        headers: Optional[dict] = None,
+        verify: bool = True,
+        timeout: float = 3.0,
+        max_age: float = 1.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_age = max_age
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        self.session.verify = verify
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._devices: Dict[str, _DeviceCache] = {}
+        self._devices_lock = threading.Lock()
+        self._subs: List[_Subscription] = []
+        self.upstream_requests = 0
+        self.reads = 0
+
+    # ---------- HTTP ----------
+    def _url(self, device: str, prop: Optional[str] = None) -> str:
+        url = f"{self.base_url}/elapi/v1/devices/{device}/properties"
+        return f"{url}/{prop}" if prop else url
+
+    def _get(self, url: str) -> requests.Response:
+        self.upstream_requests += 1
+        r = self.session.get(url, timeout=self.timeout)
+        if r.status_code == 401:
+            raise ElwaAuthError(f"401 Unauthorized: {url}")
+        return r
+
+    def _cache(self, device: str) -> _DeviceCache:
+        with self._devices_lock:
+            c = self._devices.get(device)
+            if c is None:
+                c = self._devices[device] = _DeviceCache()
+            return c
+
+    def _fetch(self, device: str, c: _DeviceCache, props: Optional[List[str]]):
+        # まとめ読み（未判定 or 対応済み）
+        if c.bulk_ok is not False:
+            r = self._get(self._url(device))
+            if r.status_code in (404, 405, 501) and c.bulk_ok is None and props:
+                c.bulk_ok = False  # 以後は個別 GET
+            else:
+                r.raise_for_status()
+                js = r.json()
+                c.bulk_ok = True
+                c.values = dict(js)
+                c.names = list(js.keys())
+                c.fetched_at = time.monotonic()
+                return
+        # 個別 GET（要求されたプロパティだけ）
+        if not props:
+            raise ValueError(f"{device}: まとめ読み非対応のためプロパティ名が必要です")
+        vals = {}
+        for p in props:
+            r = self._get(self._url(device, p))
+            r.raise_for_status()
+            vals.update(r.json())
+        c.values = vals
+        c.names = sorted(set(c.names or []) | set(vals))
+        c.fetched_at = time.monotonic()
+
+    # ---------- 読み出し ----------
+    def get_many(
+        self, device: str, props: Optional[List[str]] = None, max_age: float = None
+    ) -> dict:
+        """props（None なら全部）を返す。max_age 秒以内の取得結果があれば再取得しない。"""
+        max_age = self.max_age if max_age is None else max_age
+        c = self._cache(device)
+        self.reads += 1
+        with c.lock:
+            fresh = time.monotonic() - c.fetched_at < max_age
+            missing = props is not None and any(p not in c.values for p in props)
+            # 個別 GET モードでは、前回取得していないプロパティがあれば取り直す
+            if not fresh or (missing and c.bulk_ok is False):
+                want = props
+                if c.bulk_ok is False and props is not None:
+                    want = sorted(set(props) | set(c.values))
+                self._fetch(device, c, want)
+            if props is None:
+                return dict(c.values)
+            return {p: c.values.get(p) for p in props}
+
+    def get(self, device: str, prop: str, max_age: float = None):
+        return self.get_many(device, [prop], max_age).get(prop)
+
+    def property_names(self, device: str) -> List[str]:
+        """デバイスのプロパティ一覧（初回だけ取得してキャッシュ）。"""
+        c = self._cache(device)
+        if c.names is None:
+            self.get_many(device, None, max_age=float("inf"))
+        return list(c.names or [])
+
+    # ---------- 購読 ----------
+    def subscribe(
+        self,
+        device: str,
+        props: Optional[List[str]],
+        callback: Callable[[dict], None],
+        every: float = 1.0,
+    ) -> _Subscription:
+        sub = _Subscription(device, list(props) if props else None, callback, every)
+        self._subs.append(sub)
+        return sub
+
+    def poll_once(self):
+        """期限の来た購読者について、デバイスごとに 1 回だけ取得して配る。"""
+        now = time.monotonic()
+        due: Dict[str, List[_Subscription]] = {}
+        for s in self._subs:
+            if now >= s.next_at:
+                due.setdefault(s.device, []).append(s)
+                # 遅れたとき（初回・取得が詰まったあと）は now から 1 周期あける
+                nxt = s.next_at + s.every
+                s.next_at = nxt if nxt > now else now + s.every
+
+        def one(device, subs):
+            props = None
+            if all(s.props for s in subs):
+                props = sorted({p for s in subs for p in s.props})
+            try:
+                # 周期ちょうどの購読者が取りこぼさないよう、max_age は最短周期の半分
+                vals = self.get_many(
+                    device, props, max_age=min(s.every for s in subs) / 2
+                )
+            except ElwaAuthError:
+                raise
+            except Exception as e:
+                print(f"エラー: データ取得に失敗 - {device}: {e}")
+                return
+            for s in subs:
+                data = vals if s.props is None else {p: vals.get(p) for p in s.props}
+                try:
+                    s.callback(data)
+                except Exception as e:
+                    print(f"エラー: 購読処理で例外 - {device}: {e}")
+
+        if len(due) <= 1:
+            for device, subs in due.items():
+                one(device, subs)
+            return
+        with ThreadPoolExecutor(max_workers=len(due)) as ex:
+            for f in [ex.submit(one, d, s) for d, s in due.items()]:
+                f.result()
+
+    def run_forever(self, tick: float = 0.1):
+        try:
+            while True:
+                self.poll_once()
+                nxt = min((s.next_at for s in self._subs), default=time.monotonic() + 1)
+                time.sleep(max(tick, nxt - time.monotonic()))
+        except ElwaAuthError as e:
+            print(f"認証エラー (401): トークンを確認してください。停止します。 {e}")
+        except KeyboardInterrupt:
+            print("\n停止しました。")
+        finally:
+            print(f"upstream requests={self.upstream_requests} / reads={self.reads}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ELWA property client (shared polling)")
+    ap.add_argument(
+        "--with",
+        dest="modules",
+        action="append",
+        required=True,
+        help="register(client) を持つスクリプト名（複数指定可）",
+    )
+    ap.add_argument("--base", default=DEFAULT_BASE)
+    args = ap.parse_args()
+
+    client = ElwaClient(args.base)
+    for name in args.modules:
+        importlib.import_module(name).register(client)
+    client.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ELWA / MQTT 集約デーモン（asyncio 1 本で動かす版）
+
+1 つのイベントループ上で
+  - MQTT 購読（全プロファイルの topic をまとめて 1 接続で購読）
+  - HTTP PIR ポーリング（http_pir_poller.PirPoller で全 URL を並行取得）
+  - 毎秒スナップショットの書き出し（プロファイルごとのシンク）
+を実行します。部屋ごとのスクリプト（Living_Kitchen0916.py / ELWA_washitu.py /
+0918living.py）は Profile を定義して run_profiles() を呼ぶだけになっています。
+
+Usage:
+  # 単体（従来どおり）
+  python Living_Kitchen0916.py
+  # 複数プロファイルを 1 プロセス・1 MQTT 接続で
+  python elwa_daemon.py --profile Living_Kitchen0916 --profile ELWA_washitu
+  # ローカルのスタンドイン相手に動作確認
+  python elwa_daemon.py --profile ELWA_washitu --broker 127.0.0.1 --port 1883 \\
+      --http-base http://127.0.0.1:7000
+"""
+
+import argparse
+import asyncio
+import csv
+import importlib
+import json
+import os
+import socket
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from http_pir_poller import PirPoller, PollResult
+
+DEFAULT_BROKER = "150.65.179.132"
+DEFAULT_PORT = 7883
+
+
+# ============================
+# 値の正規化
+# ============================
+def coerce_bool_like_to_01(v):
+    # bool/“true”/“false” などを 0/1 に（変換不可はそのまま）
+    if isinstance(v, bool):
+        return 1 if v else 0
+    if isinstance(v, (int, float)) and v in (0, 1):
+        return int(v)
+    if isinstance(v, str):
+        s = v.strip().lower()
+        if s in ("true", "t", "yes", "y", "on"):
+            return 1
+        if s in ("false", "f", "no", "n", "off"):
+            return 0
+    return v
+
+
+def coerce_numeric_str(v):
+    # "true"/"false" は bool、数値らしき文字列は int/float に（"OPEN" 等はそのまま）
+    if not isinstance(v, str):
+        return v
+    s = v.strip().lower()
+    if s in ("true", "false"):
+        return s == "true"
+    try:
+        if "." in s or "e" in s:
+            return float(v)
+        return int(v)
+    except Exception:
+        return v
+
+
+# ============================
+# プロファイル
+# ============================
+@dataclass
+class Profile:
+    """1 つの CSV（部屋）分の設定。"""
+
+    name: str
+    topic_map: List[Tuple[str, str, str]]  # (topic, payload の JSON キー, 列名)
+    fieldnames: List[str]  # "timestamp" + 列（CSV の並び）
+    csv_file: Optional[str] = None
+    http_pirs: List[Tuple[str, str]] = field(default_factory=list)  # (URL, 列名)
+    write_every_sec: float = 1.0
+    http_every_sec: float = 1.0
+    http_timeout: float = 1.5
+    http_value: str = "01"  # "01" → 0/1, "bool" → True/False
+    http_keep_on_error: bool = True  # False なら失敗時 None
+    bool01_fields: frozenset = frozenset()  # 受信時・書き出し時に 0/1 化する列
+    zero_if_missing: frozenset = frozenset()  # 未受信でも 0 を書く列
+    coerce_numeric: bool = False  # 文字列の数値/真偽値を変換する
+    ts_format: str = "%Y-%m-%d %H:%M:%S"
+    verbose: bool = True
+
+    def with_http_base(self, base: str) -> "Profile":
+        """HTTP PIR の URL のホスト部分を差し替えたコピー（スタンドイン用）。"""
+        pirs = []
+        for url, col in self.http_pirs:
+            path = url.split("/elapi/", 1)[1]
+            pirs.append((f"{base.rstrip('/')}/elapi/{path}", col))
+        return replace(self, http_pirs=pirs)
+
+
+def fieldnames_for(topic_map, http_fields=(), http_first=False) -> List[str]:
+    """timestamp + (HTTP 列) + MQTT 列（重複排除、宣言順）"""
+    names = ["timestamp"]
+    groups = [list(http_fields), [f for _, _, f in topic_map]]
+    if not http_first:
+        groups.reverse()
+    for group in groups:
+        for f in group:
+            if f not in names:
+                names.append(f)
+    return names
+
+
+# ============================
+# シンク
+# ============================
+class CsvSink:
+    """DictWriter で 1 行ずつ追記（ファイルが空ならヘッダー）。"""
+
+    def __init__(self, path: str, fieldnames: List[str]):
+        self.path = path
+        self.fieldnames = fieldnames
+        need = (not os.path.exists(path)) or (os.path.getsize(path) == 0)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a", newline="")
+        self._w = csv.DictWriter(self._f, fieldnames=fieldnames)
+        if need:
+            self._w.writeheader()
+            self._f.flush()
+
+    def write(self, row: dict):
+        self._w.writerow(row)
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class CallbackSink:
+    """行を任意の関数に渡す（テストや別プロセスへの転送用）。"""
+
+    def __init__(self, fn: Callable[[dict], None]):
+        self.fn = fn
+
+    def write(self, row: dict):
+        self.fn(row)
+
+    def close(self):
+        pass
+
+
+# ============================
+# プロファイルごとの状態
+# ============================
+class ProfileState:
+    def __init__(self, profile: Profile, sinks):
+        self.profile = profile
+        self.sinks = sinks
+        self.values = {k: None for k in profile.fieldnames if k != "timestamp"}
+        self.poller = (
+            PirPoller(profile.http_pirs, timeout=profile.http_timeout)
+            if profile.http_pirs
+            else None
+        )
+
+    def on_mqtt(self, topic: str, json_key: str, col: str, data):
+        p = self.profile
+        val = data.get(json_key, None) if isinstance(data, dict) else None
+        if p.coerce_numeric:
+            val = coerce_numeric_str(val)
+        if col in p.bool01_fields:
+            val = coerce_bool_like_to_01(val)
+        self.values[col] = val
+        if p.verbose:
+            print(f"[{col}] <- {val}  ({topic})")
+
+    def on_http(self, r: PollResult):
+        p = self.profile
+        if r.error is not None or r.skipped:
+            # バックオフ中（skipped）は失敗扱い。ログはエラー時だけ
+            if r.error is not None:
+                print(f"HTTP PIR error: {r.field}: {r.error}")
+            if not p.http_keep_on_error:
+                self.values[r.field] = None
+            return
+        det = bool(r.data.get("detection", False))
+        self.values[r.field] = (1 if det else 0) if p.http_value == "01" else det
+
+    def row(self) -> dict:
+        p = self.profile
+        row = {"timestamp": datetime.now().strftime(p.ts_format)}
+        for col, v in self.values.items():
+            if col in p.zero_if_missing and v is None:
+                v = 0
+            elif col in p.bool01_fields:
+                v = coerce_bool_like_to_01(v)
+            row[col] = v
+        return row
+
+    def emit(self):
+        row = self.row()
+        for s in self.sinks:
+            try:
+                s.write(row)
+            except Exception as e:
+                print("⚠️ CSV write error:", e)
+        if self.profile.verbose:
+            print("💾 CSV:", row)
+
+
+# ============================
+# paho を asyncio のループに載せる（loop_forever / loop_start の代わり）
+# ============================
+class _PahoOnLoop:
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client):
+        self.loop = loop
+        self.client = client
+        self._misc = None
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_register_write
+        client.on_socket_unregister_write = self._on_unregister_write
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self._misc is not None:
+            self._misc.cancel()
+
+    def _on_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def _misc_loop(self):
+        # keepalive の PING などは loop_misc が 1 秒おきに面倒を見る
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+
+
+def make_mqtt_client(transport: str) -> mqtt.Client:
+    if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt >= 2.0
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, transport=transport)
+    return mqtt.Client(transport=transport)
+
+
+# ============================
+# デーモン本体
+# ============================
+class IngestionDaemon:
+    def __init__(
+        self,
+        profiles: List[Profile],
+        broker: str = DEFAULT_BROKER,
+        port: int = DEFAULT_PORT,
+        keepalive: int = 60,
+        qos: int = 0,
+        transport: str = "tcp",
+        sinks: Optional[Dict[str, list]] = None,
+        stats_every_sec: float = 300.0,
+    ):
+        self.broker = broker
+        self.stats_every_sec = stats_every_sec
+        self.port = port
+        self.keepalive = keepalive
+        self.qos = qos
+        self.transport = transport
+        self.states = []
+        for p in profiles:
+            ps = (sinks or {}).get(p.name)
+            if ps is None:
+                ps = [CsvSink(p.csv_file, p.fieldnames)] if p.csv_file else []
+            self.states.append(ProfileState(p, ps))
+
+        # topic → [(状態, JSON キー, 列名)]（同じ topic を複数プロファイルが使える）
+        self.routes: Dict[str, list] = {}
+        for st in self.states:
+            for topic, key, col in st.profile.topic_map:
+                self.routes.setdefault(topic, []).append((st, key, col))
+
+        self._stop: Optional[asyncio.Event] = None
+        self._lost: Optional[asyncio.Event] = None
+
+    # ---------- MQTT ----------
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            print("✅ MQTT connected")
+            topics = [(t, self.qos) for t in self.routes]
+            if topics:
+                client.subscribe(topics)
+            for t, _ in topics:
+                print("  subscribed:", t)
+        else:
+            print("❌ MQTT connect failed:", rc)
+
+    def _on_disconnect(self, client, userdata, rc, properties=None):
+        print("⚠️ MQTT disconnected:", rc)
+        self._lost.set()
+
+    def _on_message(self, client, userdata, msg):
+        targets = self.routes.get(msg.topic)
+        if not targets:
+            return
+        try:
+            data = json.loads(msg.payload.decode(errors="ignore"))
+        except Exception as e:
+            print(
+                f"⚠️ JSON parse error on {msg.topic}: {e} / payload={msg.payload[:80]!r}"
+            )
+            return
+        for st, key, col in targets:
+            st.on_mqtt(msg.topic, key, col, data)
+
+    async def _mqtt_task(self):
+        loop = asyncio.get_running_loop()
+        client = make_mqtt_client(self.transport)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        _PahoOnLoop(loop, client)
+        self.client = client
+
+        backoff = 1.0
+        first = True
+        while not self._stop.is_set():
+            try:
+                self._lost.clear()
+                # paho の例と同じくループ上で直接 connect（ソケット登録をループスレッドで行う）
+                if first:
+                    client.connect(self.broker, self.port, self.keepalive)
+                    first = False
+                else:
+                    client.reconnect()
+                client.socket().setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048)
+                backoff = 1.0
+                await self._lost.wait()
+            except Exception as e:
+                print(f"❌ MQTT connect error: {e}")
+            print(f"… MQTT reconnect in {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    # ---------- HTTP PIR ----------
+    async def _http_task(self, st: ProfileState):
+        loop = asyncio.get_running_loop()
+        p = st.profile
+        next_stats = loop.time() + self.stats_every_sec
+        while not self._stop.is_set():
+            t0 = loop.time()
+            # 全 PIR を 1 つのコネクションプールで並行取得（同じ 1 秒窓に収める）
+            for r in await loop.run_in_executor(None, st.poller.poll_once):
+                st.on_http(r)
+            if loop.time() >= next_stats:
+                print(f"[{p.name}] " + st.poller.format_stats())
+                next_stats += self.stats_every_sec
+            await asyncio.sleep(max(0.0, p.http_every_sec - (loop.time() - t0)))
+
+    # ---------- スナップショット ----------
+    async def _emit_task(self, st: ProfileState):
+        loop = asyncio.get_running_loop()
+        interval = st.profile.write_every_sec
+        next_t = loop.time() + interval
+        while not self._stop.is_set():
+            await asyncio.sleep(max(0.0, next_t - loop.time()))
+            st.emit()
+            next_t += interval
+            if next_t < loop.time():  # 大きく遅れたら追いかけずに詰める
+                next_t = loop.time() + interval
+
+    # ---------- 起動 ----------
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        self._stop = stop or asyncio.Event()
+        self._lost = asyncio.Event()
+        tasks = [asyncio.create_task(self._mqtt_task())]
+        for st in self.states:
+            if st.profile.http_pirs:
+                tasks.append(asyncio.create_task(self._http_task(st)))
+            tasks.append(asyncio.create_task(self._emit_task(st)))
+        for st in self.states:
+            if st.profile.csv_file:
+                print(
+                    f"📡 集約開始 [{st.profile.name}] -> CSV:",
+                    os.path.abspath(st.profile.csv_file),
+                )
+        try:
+            await self._stop.wait()
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            client = getattr(self, "client", None)
+            if client is not None:
+                client.disconnect()
+            for st in self.states:
+                for s in st.sinks:
+                    s.close()
+                if st.poller is not None:
+                    st.poller.close()
+
+
+def run_profiles(profiles: List[Profile], **kwargs):
+    """スクリプトの main() から呼ぶ入口（Ctrl+C で終了）。"""
+    daemon = IngestionDaemon(profiles, **kwargs)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        print("\n🛑 終了します。")
+
+
+def load_profile(module_name: str) -> Profile:
+    """スクリプト名（例: Living_Kitchen0916）から PROFILE を読み込む。"""
+    mod = importlib.import_module(module_name)
+    return mod.PROFILE
+
+
+def main():
+    ap = argparse.ArgumentParser(description="asyncio ELWA/MQTT ingestion daemon")
+    ap.add_argument(
+        "--profile",
+        action="append",
+        required=True,
+        help="PROFILE を持つスクリプト名（複数指定可）",
+    )
+    ap.add_argument("--broker", default=DEFAULT_BROKER)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--keepalive", type=int, default=60)
+    ap.add_argument("--qos", type=int, default=0, choices=[0, 1, 2])
+    ap.add_argument("--transport", choices=["tcp", "websockets"], default="tcp")
+    ap.add_argument(
+        "--http-base",
+        default=None,
+        help="ELWA HTTP の差し替え先（例: http://127.0.0.1:7000）",
+    )
+    ap.add_argument(
+        "--stats-every", type=float, default=300.0, help="HTTP PIR 統計の表示間隔(秒)"
+    )
+    ap.add_argument("--quiet", action="store_true", help="受信/書き込みログを出さない")
+    args = ap.parse_args()
+
+    profiles = []
+    for name in args.profile:
+        p = load_profile(name)
+        if args.http_base:
+            p = p.with_http_base(args.http_base)
+        if args.quiet:
+            p = replace(p, verbose=False)
+        profiles.append(p)
+
+    run_profiles(
+        profiles,
+        broker=args.broker,
+        port=args.port,
+        keepalive=args.keepalive,
+        qos=args.qos,
+        transport=args.transport,
+        stats_every_sec=args.stats_every,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# feature_cache.py
+# 特徴量テーブルのキャッシュ（入力ファイルの中身と作り方のパラメータから決まるキーで引く）
+#
+#   - キー = sha256(入力ファイルの中身のハッシュ + リサンプル周期・窓・使った列などのパラメータ)
+#     ファイルのハッシュは (パス, サイズ, 更新時刻) ごとに digests.json に覚えておく
+#   - 1 エントリ = <root>/<key>/ に dtype ごとの (列数, 行数) の .npy と meta.json
+#     読むときは mmap で開き、コピーせずに DataFrame にする（書き込みは copy-on-write）
+#   - 置くたびに古いエントリを掃除する（max_age_days より前に使われたもの → 合計 max_bytes 超過ぶん）
+#     pin() したキーは掃除しない（スイープなど、あとで読むエントリを守る）
+#
+# 使い方:
+#   cache = FeatureCache(".feature_cache")
+#   key = cache.key(inputs=[file_digest(p, cache.root) for p in paths], windows=[5, 10])
+#   hit = cache.get(key)
+#   if hit is None:
+#       df = build_features(...)
+#       cache.put(key, df)
+#   else:
+#       df, meta = hit
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 4 << 30  # 4 GiB
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def feature_hash(columns: List[str]) -> str:
+    """特徴量列のリストのハッシュ（train_room_model の Meta.feature_hash と同じ定義）。"""
+    return hashlib.sha256((",".join(columns)).encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str, memo_dir: Optional[str] = None) -> str:
+    """ファイルの中身の sha256。memo_dir があれば (パス, サイズ, 更新時刻) ごとに覚えておく。"""
+    st = os.stat(path)
+    ident = [st.st_size, st.st_mtime_ns]
+    memo_path = os.path.join(memo_dir, "digests.json") if memo_dir else None
+    memo = {}
+    if memo_path:
+        try:
+            with open(memo_path, encoding="utf-8") as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            memo = {}
+        hit = memo.get(os.path.abspath(path))
+        if hit and hit[:2] == ident:
+            return hit[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(1 << 22), b""):
+            h.update(buf)
+    digest = h.hexdigest()
+
+    if memo_path:
+        memo[os.path.abspath(path)] = ident + [digest]
+        try:
+            os.makedirs(memo_dir, exist_ok=True)
+            tmp = f"{memo_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(memo, f)
+            os.replace(tmp, memo_path)
+        except OSError:
+            pass
+    return digest
+
+
+# --------------------------
+# 列 <-> 保存形式
+# --------------------------
+def _storage(col: pd.Series) -> Tuple[str, str]:
+    """(保存する npy の dtype, 読み戻すときの dtype)。"""
+    dt = col.dtype
+    if pd.api.types.is_datetime64_dtype(dt):
+        return "i8", "datetime64[ns]"
+    if isinstance(dt, np.dtype) and dt.kind in "biuf":
+        return dt.str.lstrip("<>|="), ""
+    if pd.api.types.is_numeric_dtype(dt) or pd.api.types.is_bool_dtype(dt):
+        return "f8", str(dt)  # Int64 / Float64 / boolean は NaN 付き float で持つ
+    return "text", ""
+
+
+def _encode(col: pd.Series, store: str, categories: dict, name: str) -> np.ndarray:
+    if store == "text":
+        codes, uniques = pd.factorize(col, use_na_sentinel=True)
+        categories[name] = [str(u) for u in uniques]
+        return codes.astype(np.int32)
+    if col.dtype.kind == "M":
+        return col.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    if not isinstance(col.dtype, np.dtype):
+        return col.to_numpy(dtype=np.float64, na_value=np.nan)
+    return col.to_numpy()
+
+
+class FeatureCache:
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.pinned = set()
+
+    def pin(self, key: str):
+        """key を evict() の対象から外す（unpin_all() まで）。"""
+        self.pinned.add(key)
+
+    def unpin_all(self):
+        self.pinned.clear()
+
+    def key(self, **parts) -> str:
+        """パラメータ（JSON にできる値）から決まるキー。"""
+        blob = json.dumps(
+            {"version": CACHE_VERSION, **parts}, sort_keys=True, default=str
+        )
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    # ---------- 読み出し ----------
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, dict]]:
+        d = self._dir(key)
+        try:
+            with open(os.path.join(d, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            groups = {
+                store: np.load(os.path.join(d, f"{store}.npy"), mmap_mode="c")
+                for store in meta["groups"]
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(os.path.join(d, "meta.json"))  # 最終使用時刻（掃除の順番に使う）
+
+        n = meta["n_rows"]
+        index = pd.RangeIndex(n)
+        parts = []
+        for store, cols in meta["groups"].items():
+            arr = groups[store][:, :n]
+            if store == "text":
+                parts.append(
+                    pd.DataFrame(
+                        {
+                            c: pd.Series(
+                                np.array(
+                                    meta["categories"][c] + [np.nan], dtype=object
+                                )[arr[i]],
+                                index=index,
+                                dtype=object,
+                            )
+                            for i, c in enumerate(cols)
+                        },
+                        index=index,
+                    )
+                )
+            else:
+                parts.append(pd.DataFrame(arr.T, columns=cols, index=index, copy=False))
+        df = pd.concat(parts, axis=1) if parts else pd.DataFrame(index=index)
+        df = df[meta["columns"]]
+        for c, restore in meta["restore"].items():
+            df[c] = df[c].astype(restore)
+        if meta.get("index_name") is not None or meta.get("index_kind") == "datetime":
+            df.index = _restore_index(meta, d)
+        return df, meta
+
+    # ---------- 書き込み ----------
+    def put(self, key: str, df: pd.DataFrame, **extra) -> dict:
+        """df（列名は一意）を保存して meta を返す。書けなければ保存せずに meta だけ返す。"""
+        columns = [str(c) for c in df.columns]
+        groups, restore, categories = {}, {}, {}
+        for c in df.columns:
+            store, back = _storage(df[c])
+            groups.setdefault(store, []).append(str(c))
+            if back:
+                restore[str(c)] = back
+        meta = {
+            "version": CACHE_VERSION,
+            "n_rows": len(df),
+            "columns": columns,
+            "groups": groups,
+            "restore": restore,
+            "categories": categories,
+            "feature_hash": feature_hash(columns),
+            "index_name": df.index.name,
+            "index_kind": (
+                "datetime" if isinstance(df.index, pd.DatetimeIndex) else "range"
+            ),
+            "created": time.time(),
+            **extra,
+        }
+        final = self._dir(key)
+        tmp = f"{final}.tmp-{os.getpid()}"
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            for store, cols in groups.items():
+                dtype = "i4" if store == "text" else store
+                out = np.lib.format.open_memmap(
+                    os.path.join(tmp, f"{store}.npy"),
+                    mode="w+",
+                    dtype=dtype,
+                    shape=(len(cols), len(df)),
+                )
+                for i, c in enumerate(cols):
+                    out[i] = _encode(df[c], store, categories, c)
+                out.flush()
+                del out
+            if meta["index_kind"] == "datetime":
+                np.save(
+                    os.path.join(tmp, "index.npy"),
+                    df.index.as_unit("ns").asi8,
+                )
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            shutil.rmtree(final, ignore_errors=True)
+            os.replace(tmp, final)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            print(f"[feature-cache] 保存できません（{e}）")
+            return meta
+        self.evict(keep=key)
+        return meta
+
+    # ---------- 掃除 ----------
+    def entries(self) -> List[Tuple[str, float, int]]:
+        """[(key, 最終使用時刻, バイト数)]（古い順）。"""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for key in os.listdir(self.root):
+            d = self._dir(key)
+            m = os.path.join(d, "meta.json")
+            if not os.path.isfile(m):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(d, f))
+                for f in os.listdir(d)
+                if os.path.isfile(os.path.join(d, f))
+            )
+            out.append((key, os.path.getmtime(m), size))
+        out.sort(key=lambda e: e[1])
+        return out
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        max_age_days より古いもの、次に合計が max_bytes を超えるぶんを古い順に消す。
+        keep と pin() したキーは消さない。
+        """
+        entries = self.entries()
+        cutoff = time.time() - self.max_age_days * 86400
+        total = sum(e[2] for e in entries)
+        removed = []
+        for key, used, size in entries:
+            if key == keep or key in self.pinned:
+                continue
+            if used < cutoff or total > self.max_bytes:
+                shutil.rmtree(self._dir(key), ignore_errors=True)
+                total -= size
+                removed.append(key)
+        return removed
+
+
+def _restore_index(meta: dict, d: str) -> pd.Index:
+    if meta["index_kind"] == "datetime":
+        ns = np.load(os.path.join(d, "index.npy"))
+        return pd.DatetimeIndex(ns.view("datetime64[ns]"), name=meta["index_name"])
+    return pd.RangeIndex(meta["n_rows"], name=meta["index_name"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="特徴量キャッシュの確認・掃除")
+    ap.add_argument("root", nargs="?", default=".feature_cache")
+    ap.add_argument("--evict", action="store_true", help="古いエントリを掃除する")
+    ap.add_argument("--max-gb", type=float, default=DEFAULT_MAX_BYTES / (1 << 30))
+    ap.add_argument("--max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS)
+    args = ap.parse_args()
+
+    cache = FeatureCache(args.root, int(args.max_gb * (1 << 30)), args.max_age_days)
+    if args.evict:
+        for key in cache.evict():
+            print(f"removed {key}")
+    total = 0
+    for key, used, size in cache.entries():
+        total += size
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(used))
+        print(f"{key}  {size / 1e6:9.1f} MB  last used {when}")
+    print(f"total {total / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
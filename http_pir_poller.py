@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ELWA HTTP PIR（/elapi/v1/devices/{id}/properties/detection）の並行ポーラ
+
+  - 1 つの requests.Session（keep-alive のコネクションプール）を全デバイスで共有
+  - 1 サイクルで全 URL を並行に取得（同じ 1 秒窓にそろえる）
+  - ETag が返ってくるサーバには If-None-Match を付けて 304 なら前回値を使う
+  - エラーが続くデバイスは個別に指数バックオフ（他のデバイスは普段どおり）
+  - デバイスごとのレイテンシ p50/p90/p99 を stats() で返す
+
+Usage:
+  poller = PirPoller(HTTP_PIRS)           # [(url, 列名), ...]
+  for r in poller.poll_once():            # 1 サイクル（ブロッキング）
+      ...r.field, r.data, r.error, r.skipped
+  print(poller.format_stats())
+
+  # 単体で動かしてレイテンシを見る
+  python http_pir_poller.py --profile Living_Kitchen0916 --cycles 30
+"""
+
+import argparse
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+
+@dataclass
+class PollResult:
+    field: str
+    data: Optional[dict] = None  # 取得した JSON（304 のときは前回の JSON）
+    error: Optional[Exception] = None
+    skipped: bool = False  # バックオフ中で今回は取得しなかった
+    not_modified: bool = False
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    i = min(len(sorted_vals) - 1, int(round(q / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+class _Device:
+    def __init__(self, url: str, field: str, window: int):
+        self.url = url
+        self.field = field
+        self.etag: Optional[str] = None
+        self.last: Optional[dict] = None
+        self.latency = deque(maxlen=window)  # 秒
+        self.ok = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.fail_streak = 0
+        self.retry_at = 0.0  # monotonic。これより前はスキップ
+
+
+class PirPoller:
+    def __init__(
+        self,
+        pirs: List[Tuple[str, str]],
+        timeout: float = 1.5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        latency_window: int = 600,
+        session: Optional[requests.Session] = None,
+    ):
+        self.devices = [_Device(u, f, latency_window) for u, f in pirs]
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = session or requests.Session()
+        n = max(1, len(self.devices))
+        adapter = requests.adapters.HTTPAdapter(pool_connections=n, pool_maxsize=n)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="pir")
+        self._lock = threading.Lock()
+        self.cycles = 0
+        self.last_cycle_sec = 0.0
+        self.last_spread_sec = 0.0  # 1 サイクル内の最初と最後の応答時刻の差
+
+    # ---------- 1 デバイス ----------
+    def _fetch(self, dev: _Device, now: float) -> Tuple[PollResult, float]:
+        if now < dev.retry_at:
+            return PollResult(dev.field, skipped=True), now
+        headers = {"If-None-Match": dev.etag} if dev.etag else None
+        t0 = time.monotonic()
+        try:
+            r = self.session.get(dev.url, timeout=self.timeout, headers=headers)
+            if r.status_code == 304 and dev.last is not None:
+                res = PollResult(dev.field, data=dev.last, not_modified=True)
+            else:
+                r.raise_for_status()
+                js = r.json()
+                dev.etag = r.headers.get("ETag")
+                dev.last = js
+                res = PollResult(dev.field, data=js)
+            t1 = time.monotonic()
+            with self._lock:
+                dev.latency.append(t1 - t0)
+                dev.ok += 1
+                dev.not_modified += res.not_modified
+                dev.fail_streak = 0
+                dev.retry_at = 0.0
+            return res, t1
+        except Exception as e:
+            t1 = time.monotonic()
+            with self._lock:
+                dev.errors += 1
+                dev.fail_streak += 1
+                dev.etag = None
+                # 2 回目の失敗からバックオフ（1 回の取りこぼしでは間引かない）
+                if dev.fail_streak >= 2:
+                    wait = min(
+                        self.backoff_max,
+                        self.backoff_base * 2 ** (dev.fail_streak - 2),
+                    )
+                    dev.retry_at = t1 + wait * random.uniform(0.8, 1.2)
+            return PollResult(dev.field, error=e), t1
+
+    # ---------- 1 サイクル ----------
+    def poll_once(self) -> List[PollResult]:
+        """全デバイスを並行に 1 回ずつ取得（バックオフ中のものは skipped）。"""
+        t0 = time.monotonic()
+        futs = [self._pool.submit(self._fetch, d, t0) for d in self.devices]
+        out, done_at = [], []
+        for f in futs:
+            res, t = f.result()
+            out.append(res)
+            if not res.skipped:
+                done_at.append(t)
+        self.cycles += 1
+        self.last_cycle_sec = time.monotonic() - t0
+        self.last_spread_sec = (max(done_at) - min(done_at)) if done_at else 0.0
+        return out
+
+    # ---------- 統計 ----------
+    def stats(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        out = {}
+        with self._lock:
+            for d in self.devices:
+                lat = sorted(d.latency)
+                out[d.field] = {
+                    "n": d.ok,
+                    "errors": d.errors,
+                    "not_modified": d.not_modified,
+                    "p50_ms": _percentile(lat, 50) * 1e3,
+                    "p90_ms": _percentile(lat, 90) * 1e3,
+                    "p99_ms": _percentile(lat, 99) * 1e3,
+                    "backoff_sec": max(0.0, d.retry_at - now),
+                }
+        return out
+
+    def format_stats(self) -> str:
+        lines = [
+            f"HTTP PIR: cycles={self.cycles} last_cycle={self.last_cycle_sec*1e3:.0f}ms"
+            f" spread={self.last_spread_sec*1e3:.0f}ms"
+        ]
+        for field, s in self.stats().items():
+            lines.append(
+                f"  {field:<28} n={s['n']:<5} err={s['errors']:<4} 304={s['not_modified']:<5}"
+                f" p50={s['p50_ms']:.1f} p90={s['p90_ms']:.1f} p99={s['p99_ms']:.1f} ms"
+                + (f"  backoff {s['backoff_sec']:.0f}s" if s["backoff_sec"] else "")
+            )
+        return "\n".join(lines)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.session.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ELWA HTTP PIR concurrent poller")
+    ap.add_argument("--profile", default="Living_Kitchen0916")
+    ap.add_argument("--http-base", default=None)
+    ap.add_argument("--cycles", type=int, default=30)
+    ap.add_argument("--interval", type=float, default=1.0)
+    args = ap.parse_args()
+
+    from elwa_daemon import load_profile
+
+    prof = load_profile(args.profile)
+    if args.http_base:
+        prof = prof.with_http_base(args.http_base)
+    poller = PirPoller(prof.http_pirs, timeout=prof.http_timeout)
+    try:
+        for _ in range(args.cycles):
+            t0 = time.monotonic()
+            res = poller.poll_once()
+            print(
+                " ".join(
+                    f"{r.field}="
+                    + ("skip" if r.skipped else "err" if r.error else str(r.data))
+                    for r in res
+                )
+            )
+            time.sleep(max(0.0, args.interval - (time.monotonic() - t0)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(poller.format_stats())
+        poller.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,18 @@
-import requests
-import json
 import csv
 import datetime
 import os
-import time
+
+from elwa_client import ElwaClient, DEFAULT_BASE
 #一階和室手前の人感センサー
-# ★変更点1: PIRセンサーのURLに変更
-URL = "http://150.65.179.132:7000/elapi/v1/devices/1921682116000702/properties/detection"
+# ★変更点1: PIRセンサーのデバイスIDとプロパティ（取得は elwa_client がまとめて行う）
+ELWA_BASE = DEFAULT_BASE
+DEVICE_ID = "1921682116000702"
+PROPERTY = "detection"
+INTERVAL_SECONDS = 1.0
 
 # ★変更点2: 保存するCSVファイル名を変更
 CSV_FILE = "pir_sensor_log.csv"
 
-def get_sensor_data():
-    """
-    センサーのデータをURLから取得してJSONとして返す
-    """
-    try:
-        response = requests.get(URL)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"エラー: データ取得に失敗 - {e}")
-        return None
-
 def append_to_csv(data):
     """
     取得したデータをCSVファイルに追記する
@@ -51,17 +41,21 @@ def append_to_csv(data):
         print("エラー: JSONデータの形式が不正です。")
 
 
+def register(client):
+    """
+    クライアントに購読を登録する（他スクリプトと同じクライアントを共有できる）
+    """
+    client.subscribe(DEVICE_ID, [PROPERTY], append_to_csv, every=INTERVAL_SECONDS)
+
+
 def main():
     """
-    メインの処理。無限ループで1秒ごとにデータを取得・記録する。
+    メインの処理。1秒ごとにデータを取得・記録する。
     """
     print(f"{CSV_FILE} へのデータ記録を開始します。停止するには Ctrl+C を押してください。")
-    while True:
-        sensor_data = get_sensor_data()
-        if sensor_data:
-            append_to_csv(sensor_data)
-        
-        time.sleep(1)
+    client = ElwaClient(ELWA_BASE)
+    register(client)
+    client.run_forever()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
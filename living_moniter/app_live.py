@@ -1,5 +1,5 @@
 # app_live.py  —— set_page_config を最初に呼ぶ版
-import time, json, threading
+import os, sys, time, json, threading
 from pathlib import Path
 import paho.mqtt.client as mqtt
 import streamlit as st
@@ -40,6 +40,12 @@ COMBO_TO_SECTION = {
 }
 
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timeseries_store import TimeSeriesStore
+from floor_layers import get_layers
+from section_resolver import SectionResolver
+
+
 # ====== shared state (thread-safe) ======
 @st.cache_resource
 def get_shared():
@@ -47,7 +53,10 @@ def get_shared():
         "lock": threading.Lock(),
         "connected": False,
         "rc": None,
-        "last_on": {p: 0.0 for p in PIRS},
+        # motion_raw の直近履歴（MQTT スレッドだけが append する）
+        "store": TimeSeriesStore(capacity=4096, devices=PIRS),
+        # 全組合せ → セクションの前計算表（規則にない組合せは exact=False）
+        "resolver": SectionResolver(PIRS, SECTIONS, None, COMBO_TO_SECTION),
     }
 
 
@@ -77,15 +86,10 @@ def on_message(c, u, msg):
     except Exception:
         s = msg.payload.decode("utf-8", errors="ignore").strip().lower()
         val = s in ("1", "true", "on")
-    if not val:
-        return
     parts = msg.topic.split("/")
     dev = parts[3] if len(parts) > 3 else None
     if dev in PIRS:
-        import time as _t
-
-        with shared["lock"]:
-            shared["last_on"][dev] = _t.time()
+        shared["store"].append(dev, val)
 
 
 @st.cache_resource
@@ -105,59 +109,67 @@ start_mqtt()
 # ====== UI ======
 st.title("Living presence monitor (PIR × 4)")
 
-if "last_on" not in st.session_state:
-    st.session_state.last_on = {p: 0.0 for p in PIRS}
+store = shared["store"]
+resolver = shared["resolver"]
 if "mqtt_ok" not in st.session_state:
     st.session_state.mqtt_ok = False
 if "mqtt_rc" not in st.session_state:
     st.session_state.mqtt_rc = None
 
 with shared["lock"]:
-    st.session_state.last_on.update(shared["last_on"])
     st.session_state.mqtt_ok = shared["connected"]
     st.session_state.mqtt_rc = shared["rc"]
 
 now = time.time()
-active = {
-    p for p, t in st.session_state.last_on.items() if (now - t) <= ACTIVE_WINDOW_SEC
-}
-sec_name = COMBO_TO_SECTION.get(frozenset(active))
+mask = resolver.mask_from_last_true(store.last_true_array(PIRS), now, ACTIVE_WINDOW_SEC)
+active = set(resolver.pirs_of(mask))
+sec_name, exact = resolver.resolve_mask(mask)
+if not exact:
+    sec_name = None
 
 from PIL import Image, ImageDraw
 from pathlib import Path
 
-if not Path(BG_PATH).exists():
-    st.error(f"背景画像が見つかりません: {BG_PATH}")
-else:
-    bg = Image.open(BG_PATH).convert("RGBA")
-    w, h = bg.size
-    overlay = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay, "RGBA")
-
-    def rect_from_norm(box):
-        x0, y0, x1, y1 = box
-        return (int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h))
-
-    if sec_name:
-        box = SECTIONS[sec_name]
-        draw.rectangle(
-            rect_from_norm(box), fill=(255, 0, 0, 80), outline=(255, 0, 0, 180), width=3
-        )
-    else:
-        combos = []
-        for k, box in SECTIONS.items():
-            need = set(k.split("&"))
-            if need.issubset(active):
-                combos.append(k)
-        for k in combos:
+
+def rect_from_norm(box, size):
+    x0, y0, x1, y1 = box
+    w, h = size
+    return (int(x0 * w), int(y0 * h), int(x1 * w), int(y1 * h))
+
+
+def paint_active(sec_name, active):
+    def paint(draw, size):
+        if sec_name:
+            box = SECTIONS[sec_name]
             draw.rectangle(
-                rect_from_norm(SECTIONS[k]),
-                fill=(255, 0, 0, 60),
-                outline=(255, 0, 0, 160),
-                width=2,
+                rect_from_norm(box, size),
+                fill=(255, 0, 0, 80),
+                outline=(255, 0, 0, 180),
+                width=3,
             )
+        else:
+            combos = []
+            for k, box in SECTIONS.items():
+                need = set(k.split("&"))
+                if need.issubset(active):
+                    combos.append(k)
+            for k in combos:
+                draw.rectangle(
+                    rect_from_norm(SECTIONS[k], size),
+                    fill=(255, 0, 0, 60),
+                    outline=(255, 0, 0, 160),
+                    width=2,
+                )
+
+    return paint
+
 
-    composed = Image.alpha_composite(bg, overlay)
+if not Path(BG_PATH).exists():
+    st.error(f"背景画像が見つかりません: {BG_PATH}")
+else:
+    # 背景は 1 回だけ読み込み、活動セットごとの合成結果（PNG）も使い回す
+    layers = get_layers(BG_PATH, config=(SECTIONS,))
+    composed = layers.png(mask, paint_active(sec_name, active))
     st.image(composed, use_column_width=True)
 
 # ====== 表示部分までそのまま ======
@@ -168,7 +180,7 @@ st.write(
     "✅ connected" if st.session_state.mqtt_ok else "❌ disconnected",
     f"(rc={st.session_state.mqtt_rc})",
 )
-st.json({p: round(now - t, 2) for p, t in st.session_state.last_on.items()})
+st.json({p: round(now - store.last_true(p), 2) for p in PIRS})
 
 # ====== ↓ここを置き換える=====
 # st.autorefresh(interval=1000, key="refresh") は削除して、
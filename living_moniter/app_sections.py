@@ -1,7 +1,5 @@
 # -*- coding: utf-8 -*-
-import json, time, threading
-from datetime import datetime
-from typing import Dict, Tuple, Optional
+import json, os, sys, time, threading
 
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
@@ -21,22 +19,34 @@ from config_sections import (
     COMBO_TO_SECTION,
 )
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timeseries_store import TimeSeriesStore
+from floor_layers import get_layers
+from section_resolver import SectionResolver
+
 TOPIC = f"/server/{CID}/+/properties/motion_raw"
 
 st.set_page_config(page_title="Living-Dining PIR Map", layout="wide")
 st_autorefresh(interval=1000, key="auto-refresh-1s")  # ★ 1秒ごと自動更新
 
+
 # ------- 状態共有 -------
-if "last_true_ts" not in st.session_state:
-    st.session_state.last_true_ts: Dict[str, float] = {pid: 0.0 for pid in PIRS}
-if "last_val" not in st.session_state:
-    st.session_state.last_val: Dict[str, int] = {pid: 0 for pid in PIRS}
-if "logs" not in st.session_state:
-    st.session_state.logs = []  # (ts, dev, val)
-if "started" not in st.session_state:
-    st.session_state.started = False
+# MQTT スレッドが書き、各セッションの描画が読む（セッション間で 1 つ）
+@st.cache_resource
+def get_store() -> TimeSeriesStore:
+    return TimeSeriesStore(capacity=4096, devices=PIRS)
+
+
+store = get_store()
+
 
-_lock = threading.Lock()
+# 全 2^N 通りの活動セット → セクションを前計算（COMBO_TO_SECTION は優先する上書き）
+@st.cache_resource
+def get_resolver() -> SectionResolver:
+    return SectionResolver(PIRS, SECTIONS, PIR_POS, COMBO_TO_SECTION)
+
+
+resolver = get_resolver()
 
 
 # ------- MQTT -------
@@ -64,14 +74,7 @@ def on_message(client, userdata, msg):
     except Exception:
         return
     val = 1 if bool(data.get("motion_raw", False)) else 0
-    ts = data.get("timestamp", datetime.now().strftime("%H:%M:%S"))
-    now = time.time()
-    with _lock:
-        st.session_state.last_val[dev] = val
-        if val == 1:
-            st.session_state.last_true_ts[dev] = now
-        st.session_state.logs.append((ts, dev, val))
-        st.session_state.logs = st.session_state.logs[-300:]
+    store.append(dev, val)
 
 
 def mqtt_worker():
@@ -87,9 +90,13 @@ def mqtt_worker():
             time.sleep(1.5)
 
 
-if not st.session_state.started:
+@st.cache_resource
+def start_mqtt():
     threading.Thread(target=mqtt_worker, daemon=True).start()
-    st.session_state.started = True
+    return True
+
+
+start_mqtt()
 
 
 # ------- 描画ユーティリティ -------
@@ -133,75 +140,72 @@ def draw_base(bg: Image.Image) -> Image.Image:
     return img
 
 
-def overlay_section(
-    img: Image.Image, section: str, color=(255, 60, 60, 110)
-) -> Image.Image:
-    if section not in SECTIONS:
-        return img
-    over = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(over, "RGBA")
-    box = _scale_rect(SECTIONS[section], img.size)
-    draw.rectangle(box, fill=color, outline=(120, 20, 20, 220), width=3)
-    return Image.alpha_composite(img, over)
+def paint_section(section: str, color=(255, 60, 60, 110)):
+    def paint(draw, size):
+        if section not in SECTIONS:
+            return
+        box = _scale_rect(SECTIONS[section], size)
+        draw.rectangle(box, fill=color, outline=(120, 20, 20, 220), width=3)
 
+    return paint
 
-def overlay_union(img: Image.Image, act: set) -> Image.Image:
+
+def paint_union(act):
     """規則にない組合せ（0/3/4台）→ 単独セルを重ね塗り表示"""
     singles = {"PIR1", "PIR2", "PIR3", "PIR4"}
-    over = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(over, "RGBA")
-    for pid in act & singles:
-        if pid in SECTIONS:
-            box = _scale_rect(SECTIONS[pid], img.size)
-            draw.rectangle(
-                box, fill=(255, 170, 0, 90), outline=(120, 90, 0, 220), width=2
-            )
-    return Image.alpha_composite(img, over)
-
-
-def active_set(now: float) -> frozenset:
-    with _lock:
-        A = {
-            pid
-            for pid in PIRS
-            if (now - st.session_state.last_true_ts.get(pid, 0.0)) <= ACTIVE_WINDOW_SEC
-        }
-    return frozenset(A)
+
+    def paint(draw, size):
+        for pid in sorted(set(act) & singles):
+            if pid in SECTIONS:
+                box = _scale_rect(SECTIONS[pid], size)
+                draw.rectangle(
+                    box, fill=(255, 170, 0, 90), outline=(120, 90, 0, 220), width=2
+                )
+
+    return paint
+
+
+def active_mask(now: float) -> int:
+    return resolver.mask_from_last_true(
+        store.last_true_array(PIRS), now, ACTIVE_WINDOW_SEC
+    )
 
 
 # ------- UI -------
 colL, colR = st.columns([3, 1])
 
 with colL:
-    # 背景の読み込み＆スケール
-    base_img = Image.open(FLOOR_IMAGE).convert("RGBA")
-    W0, H0 = base_img.size
-    scale = CANVAS_WIDTH / float(W0)
-    base_img = base_img.resize((int(W0 * scale), int(H0 * scale)))
-    base_img = draw_base(base_img)  # セクション枠 + PIR位置マーカー
+    # 背景のスケール + セクション枠 + PIR位置マーカーは設定が変わるまで 1 回だけ描く
+    layers = get_layers(
+        FLOOR_IMAGE, CANVAS_WIDTH, draw_base, config=(SECTIONS, PIR_POS)
+    )
 
     # 現在の活動セット → セクション判定
-    A = active_set(time.time())
-    section = COMBO_TO_SECTION.get(A)
-
-    if section:
-        out = overlay_section(base_img, section)
-        st.image(out, use_column_width=False)
-        st.success(f"Active PIRs = {sorted(A)} → **Section: {section}**")
+    mask = active_mask(time.time())
+    A = resolver.pirs_of(mask)
+    section, exact = resolver.resolve_mask(mask)
+
+    if exact:
+        st.image(
+            layers.png(("section", section), paint_section(section)),
+            use_column_width=False,
+        )
+        st.success(f"Active PIRs = {A} → **Section: {section}**")
     else:
-        out = overlay_union(base_img, set(A))
-        st.image(out, use_column_width=False)
+        st.image(layers.png(("union", mask), paint_union(A)), use_column_width=False)
         if len(A) == 0:
             st.info("No PIR active in the recent window.")
         else:
-            st.warning(f"Ambiguous active set: {sorted(A)}")
+            st.warning(f"Ambiguous active set: {A} (best guess: {section})")
 
 with colR:
     st.markdown("### Last motion_raw (recent)")
-    with _lock:
-        for ts, dev, val in st.session_state.logs[-30:][::-1]:
-            st.write(f"**[{ts}] {dev} → motion={val}**")
+    for ts, dev, val in store.recent(30):
+        st.write(f"**[{ts}] {dev} → motion={val}**")
     st.markdown("---")
+    st.markdown("### motion_raw=1 / min (last 10 min)")
+    counts = store.counts_per_minute(PIRS, minutes=10)
+    st.bar_chart({pid: counts[i] for i, pid in enumerate(PIRS)})
     st.caption(
         f"Refresh: 1s · Active window: {ACTIVE_WINDOW_SEC}s · Broker: {BROKER}:{PORT}"
     )
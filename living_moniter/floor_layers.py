@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# floor_layers.py
+# 間取り図の描画キャッシュ（Streamlit の毎秒リランで同じ絵を描き直さない）
+#
+#   - 背景画像の読み込み・リサイズ・静的な装飾（セクション枠 / PIR マーカー）は設定ごとに 1 回だけ
+#   - セクションごと / PIR の組合せごとのオーバーレイを合成済みの RGBA と PNG バイト列で保持
+#   - 設定（画像パス・更新時刻・幅・SECTIONS・PIR_POS など）のハッシュが変われば作り直す
+#
+# 合成済みの画像はキャッシュ内で共有しているので、呼び出し側で書き換えないこと。
+
+import hashlib
+import io
+import os
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from PIL import Image, ImageDraw
+
+_lock = threading.Lock()
+_layers: Dict[str, tuple] = {}  # image_path -> (設定ハッシュ, FloorLayers)
+
+
+def config_hash(image_path: str, width: Optional[int], config) -> str:
+    """画像ファイル（パスと更新時刻）・表示幅・描画設定から作るキー。"""
+    mtime = os.path.getmtime(image_path)
+    return hashlib.sha1(repr((image_path, mtime, width, config)).encode()).hexdigest()
+
+
+class FloorLayers:
+    def __init__(
+        self,
+        image_path: str,
+        width: Optional[int] = None,
+        decorate: Optional[Callable[[Image.Image], Image.Image]] = None,
+    ):
+        img = Image.open(image_path).convert("RGBA")
+        if width:
+            w0, h0 = img.size
+            scale = width / float(w0)
+            img = img.resize((int(w0 * scale), int(h0 * scale)))
+        self.base = decorate(img) if decorate else img
+        self.size = self.base.size
+        self._frames: Dict[Hashable, Image.Image] = {}
+        self._png: Dict[Hashable, bytes] = {}
+        self._lock = threading.Lock()
+
+    def frame(
+        self,
+        key: Hashable,
+        paint: Optional[Callable[[ImageDraw.ImageDraw, tuple], None]],
+    ) -> Image.Image:
+        """base にオーバーレイ（paint(draw, size) が描く）を重ねた画像。key ごとに 1 回だけ描く。"""
+        img = self._frames.get(key)
+        if img is not None:
+            return img
+        if paint is None:
+            img = self.base
+        else:
+            over = Image.new("RGBA", self.size, (0, 0, 0, 0))
+            paint(ImageDraw.Draw(over, "RGBA"), self.size)
+            img = Image.alpha_composite(self.base, over)
+        with self._lock:
+            return self._frames.setdefault(key, img)
+
+    def png(
+        self,
+        key: Hashable,
+        paint: Optional[Callable[[ImageDraw.ImageDraw, tuple], None]],
+    ) -> bytes:
+        """frame() を PNG にしたもの（st.image に渡すと毎回のエンコードも省ける）。"""
+        data = self._png.get(key)
+        if data is not None:
+            return data
+        buf = io.BytesIO()
+        self.frame(key, paint).save(buf, format="PNG")
+        with self._lock:
+            return self._png.setdefault(key, buf.getvalue())
+
+
+def get_layers(
+    image_path: str,
+    width: Optional[int] = None,
+    decorate: Optional[Callable[[Image.Image], Image.Image]] = None,
+    config=(),
+) -> FloorLayers:
+    """設定ハッシュごとの FloorLayers（decorate が使う設定は config に入れておく）。"""
+    key = config_hash(image_path, width, config)
+    hit = _layers.get(image_path)
+    if hit is None or hit[0] != key:
+        with _lock:
+            hit = _layers.get(image_path)
+            if hit is None or hit[0] != key:
+                # 設定が変わったら古い描画は捨てる
+                hit = _layers[image_path] = (
+                    key,
+                    FloorLayers(image_path, width, decorate),
+                )
+    return hit[1]
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+# live_push.py
+# PIR の状態を Server-Sent Events でブラウザへ押し出すライブビュー
+#
+# Streamlit 版（app_live.py / app_sections.py）は閲覧者ごとに毎秒スクリプト全体を再実行していた。
+# ここでは MQTT の購読は 1 本だけ、変化（motion_raw の立ち上がり/立ち下がり・活動セクション）が
+# あったときだけ全クライアントに送る。クライアントは EventSource で受けて DOM を書き換えるだけ。
+#
+#   GET /         最小のクライアント（HTML + JS）
+#   GET /events   SSE ストリーム（最初に snapshot、以後 edge / section）
+#   GET /time     時計合わせ用（サーバ時刻 ms）
+#   POST /latency クライアントが測った「MQTT 受信 → 描画」遅延（ms のリスト）
+#   GET /stats    遅延の p50 / p90 / p99 とクライアント数
+#
+# Usage:
+#   python living_moniter/live_push.py --http-port 5002
+#   → タブレットで http://<PCのIPアドレス>:5002/
+
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from flask import Flask, Response, jsonify, request
+
+from config_sections import (
+    BROKER,
+    PORT,
+    CID,
+    PIRS,
+    ACTIVE_WINDOW_SEC,
+    SECTIONS,
+    PIR_POS,
+    COMBO_TO_SECTION,
+)
+from section_resolver import SectionResolver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from elwa_daemon import make_mqtt_client
+from timeseries_store import TimeSeriesStore
+
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+TICK_SEC = 0.1  # 時間窓が切れて活動セットが変わるのを検出する間隔
+HEARTBEAT_SEC = 15.0  # 無通信のプロキシ切断よけ
+CLIENT_QUEUE = 256  # 遅いクライアントはこれを超えたら古いイベントから捨てる
+
+
+def _now_ms() -> float:
+    return time.time() * 1000.0
+
+
+class LiveHub:
+    """MQTT スレッドから受けた PIR 値を保持し、変化だけを購読クライアントへ配る。"""
+
+    def __init__(self, pirs=PIRS, window_sec=ACTIVE_WINDOW_SEC):
+        self.pirs = list(pirs)
+        self.window_sec = window_sec
+        self.store = TimeSeriesStore(capacity=4096, devices=self.pirs)
+        self.resolver = SectionResolver(self.pirs, SECTIONS, PIR_POS, COMBO_TO_SECTION)
+        self.last_val = {p: 0 for p in self.pirs}
+        self.mask = 0  # 活動中の PIR のビットマスク
+        self.section = None  # 規則どおりに決まったときだけ
+        self.guess = None  # 曖昧なセットの推定セクション
+        self._lock = threading.Lock()  # クライアント一覧
+        # active / section は MQTT スレッドと ticker の両方が更新する
+        self._state_lock = threading.Lock()
+        self._clients = []
+        self.latency_ms = deque(maxlen=5000)
+
+    # ---------- 購読クライアント ----------
+    def subscribe(self) -> "queue.Queue":
+        q = queue.Queue(maxsize=CLIENT_QUEUE)
+        with self._lock:
+            self._clients.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._clients:
+                self._clients.remove(q)
+
+    def n_clients(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+    def _broadcast(self, event: dict):
+        data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        with self._lock:
+            clients = list(self._clients)
+        for q in clients:
+            try:
+                q.put_nowait(data)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    q.put_nowait(data)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "values": dict(self.last_val),
+            "active": self.resolver.pirs_of(self.mask),
+            "section": self.section,
+            "guess": self.guess,
+            "t_recv": _now_ms(),
+        }
+
+    # ---------- 状態更新 ----------
+    def _update_section(self, t_recv: float):
+        with self._state_lock:
+            mask = self.resolver.mask_from_last_true(
+                self.store.last_true_array(self.pirs), t_recv / 1000.0, self.window_sec
+            )
+            if mask == self.mask:
+                return
+            self.mask = mask
+            name, exact = self.resolver.resolve_mask(mask)
+            self.section = name if exact else None
+            self.guess = None if exact else name
+            # ロックを持ったまま配る（MQTT スレッドと ticker の section が前後しないように）。
+            # _broadcast は put_nowait だけなので待たない
+            self._broadcast(
+                {
+                    "type": "section",
+                    "active": self.resolver.pirs_of(mask),
+                    "section": self.section,
+                    "guess": self.guess,
+                    "t_recv": t_recv,
+                }
+            )
+
+    def on_pir(self, dev: str, val: int, t_recv: float):
+        self.store.append(dev, val, ts=t_recv / 1000.0)
+        if val != self.last_val.get(dev):
+            self.last_val[dev] = val
+            self._broadcast({"type": "edge", "dev": dev, "val": val, "t_recv": t_recv})
+        self._update_section(t_recv)
+
+    def tick(self):
+        # 新しいメッセージが無くても、時間窓が切れたら活動セットは変わる
+        self._update_section(_now_ms())
+
+    def run_ticker(self, stop: threading.Event):
+        while not stop.wait(TICK_SEC):
+            self.tick()
+
+    # ---------- 遅延 ----------
+    def add_latency(self, samples):
+        if not isinstance(samples, list):  # 数値 1 つや dict は受け付けない
+            return
+        for v in samples:
+            try:
+                self.latency_ms.append(float(v))
+            except (TypeError, ValueError):
+                pass
+
+    def latency_stats(self) -> dict:
+        a = np.asarray(self.latency_ms, dtype=float)
+        if a.size == 0:
+            return {"n": 0}
+        p50, p90, p99 = np.percentile(a, [50, 90, 99])
+        return {"n": int(a.size), "p50_ms": p50, "p90_ms": p90, "p99_ms": p99}
+
+
+# ====== MQTT ======
+def start_mqtt(hub: LiveHub, broker: str, port: int):
+    def on_connect(c, u, flags, rc):
+        if rc == 0:
+            for dev in hub.pirs:
+                c.subscribe(f"/server/{CID}/{dev}/properties/motion_raw", qos=0)
+        else:
+            print("MQTT connect error:", rc)
+
+    def on_message(c, u, msg):
+        t_recv = _now_ms()
+        try:
+            data = json.loads(msg.payload.decode("utf-8", errors="ignore"))
+            val = bool(data.get("motion_raw", False))
+        except Exception:
+            s = msg.payload.decode("utf-8", errors="ignore").strip().lower()
+            val = s in ("1", "true", "on")
+        parts = msg.topic.split("/")
+        dev = parts[3] if len(parts) > 3 else None
+        if dev in hub.last_val:
+            hub.on_pir(dev, 1 if val else 0, t_recv)
+
+    cli = make_mqtt_client("tcp")
+    cli.on_connect = on_connect
+    cli.on_message = on_message
+    cli.reconnect_delay_set(1, 10)
+    cli.connect_async(broker, port, keepalive=30)
+    cli.loop_start()
+    return cli
+
+
+# ====== HTTP ======
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Living PIR live</title>
+<style>
+  body { font-family: -apple-system, BlinkMacSystemFont, sans-serif; margin: 16px; background: #f2f2f7; }
+  #grid { display: grid; grid-template-columns: repeat(3, 1fr); gap: 6px; max-width: 720px; }
+  .cell { background: white; border-radius: 8px; height: 90px; display: flex; align-items: center;
+          justify-content: center; font-weight: bold; color: #555; transition: background 0.1s; }
+  .cell.on { background: #ff6b6b; color: white; }
+  .pir { display: inline-block; margin: 4px; padding: 6px 10px; border-radius: 6px; background: #ddd; }
+  .pir.on { background: #30a14e; color: white; }
+  #status { margin-top: 12px; color: #666; font-size: 0.9rem; }
+</style>
+</head>
+<body>
+<h2>Living presence (SSE)</h2>
+<div id="pirs"></div>
+<div id="section">section: -</div>
+<div id="grid"></div>
+<div id="status">connecting…</div>
+<script>
+const CELLS = __CELLS__;
+const grid = document.getElementById('grid');
+const cellEl = {};
+for (const name of CELLS) {
+  const d = document.createElement('div');
+  d.className = 'cell'; d.textContent = name || '';
+  grid.appendChild(d);
+  if (name) cellEl[name] = d;
+}
+const pirEl = {};
+for (const p of __PIRS__) {
+  const s = document.createElement('span');
+  s.className = 'pir'; s.textContent = p;
+  document.getElementById('pirs').appendChild(s);
+  pirEl[p] = s;
+}
+
+// サーバ時計とのずれ（往復の中点で推定）
+let offset = 0;
+async function syncClock() {
+  const t0 = Date.now();
+  const r = await fetch('/time'); const js = await r.json();
+  const t1 = Date.now();
+  offset = js.t - (t0 + t1) / 2;
+}
+
+const pending = [];
+const lat = [];
+function markPainted(tRecv) {
+  // 次の描画フレームで「受信 → 描画」を測る
+  requestAnimationFrame(() => requestAnimationFrame(() => {
+    const ms = Date.now() + offset - tRecv;
+    pending.push(ms); lat.push(ms); if (lat.length > 200) lat.shift();
+  }));
+}
+setInterval(() => {
+  if (pending.length) {
+    navigator.sendBeacon('/latency', JSON.stringify(pending.splice(0)));
+  }
+  const s = [...lat].sort((a, b) => a - b);
+  const q = p => s.length ? s[Math.min(s.length - 1, Math.floor(p * s.length))].toFixed(1) : '-';
+  document.getElementById('status').textContent =
+    `latency MQTT→paint p50 ${q(0.5)} ms / p99 ${q(0.99)} ms (n=${s.length})`;
+}, 2000);
+
+function setSection(active, section, guess) {
+  document.getElementById('section').textContent = 'section: ' + (section ||
+    (active.length ? `ambiguous ${active.join('+')} (guess: ${guess || '-'})` : '-'));
+  for (const [name, el] of Object.entries(cellEl)) {
+    const on = section ? name === section
+                       : name.split('&').every(p => active.includes(p)) && active.length > 0;
+    el.classList.toggle('on', on);
+  }
+}
+
+syncClock().finally(() => {
+  const es = new EventSource('/events');
+  es.addEventListener('snapshot', e => {
+    const m = JSON.parse(e.data);
+    for (const [p, v] of Object.entries(m.values)) pirEl[p]?.classList.toggle('on', v === 1);
+    setSection(m.active, m.section, m.guess);
+  });
+  es.addEventListener('edge', e => {
+    const m = JSON.parse(e.data);
+    pirEl[m.dev]?.classList.toggle('on', m.val === 1);
+    markPainted(m.t_recv);
+  });
+  es.addEventListener('section', e => {
+    const m = JSON.parse(e.data);
+    setSection(m.active, m.section, m.guess);
+    markPainted(m.t_recv);
+  });
+  es.onerror = () => { document.getElementById('status').textContent = 'reconnecting…'; };
+});
+</script>
+</body>
+</html>
+"""
+
+# 3x3 の格子（config_sections の SECTIONS と同じ並び、空きは中央）
+GRID = [
+    "PIR2",
+    "PIR2&PIR1",
+    "PIR1",
+    "PIR2&PIR4",
+    "",
+    "PIR1&PIR3",
+    "PIR4",
+    "PIR4&PIR3",
+    "PIR3",
+]
+
+
+def make_app(hub: LiveHub) -> Flask:
+    app = Flask(__name__)
+    page = PAGE.replace("__CELLS__", json.dumps(GRID)).replace(
+        "__PIRS__", json.dumps(hub.pirs)
+    )
+
+    @app.route("/")
+    def index():
+        return page
+
+    @app.route("/time")
+    def server_time():
+        return jsonify(t=_now_ms())
+
+    @app.route("/events")
+    def events():
+        q = hub.subscribe()
+
+        def stream():
+            try:
+                snap = hub.snapshot()
+                yield f"event: snapshot\ndata: {json.dumps(snap)}\n\n"
+                while True:
+                    try:
+                        yield q.get(timeout=HEARTBEAT_SEC)
+                    except queue.Empty:
+                        yield ": ping\n\n"
+            finally:
+                hub.unsubscribe(q)
+
+        return Response(
+            stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.route("/latency", methods=["POST"])
+    def latency():
+        try:
+            hub.add_latency(json.loads(request.get_data() or b"[]"))
+        except ValueError:
+            pass
+        return ("", 204)
+
+    @app.route("/stats")
+    def stats():
+        return jsonify(clients=hub.n_clients(), **hub.latency_stats())
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PIR live view over SSE")
+    ap.add_argument("--broker", default=BROKER)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--http-port", type=int, default=5002)
+    args = ap.parse_args()
+
+    hub = LiveHub()
+    stop = threading.Event()
+    threading.Thread(target=hub.run_ticker, args=(stop,), daemon=True).start()
+    start_mqtt(hub, args.broker, args.port)
+    print(f"[HTTP] http://0.0.0.0:{args.http_port}/  (MQTT {args.broker}:{args.port})")
+    make_app(hub).run(
+        host="0.0.0.0", port=args.http_port, threaded=True, use_reloader=False
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# section_resolver.py
+# 「反応中の PIR の組合せ → セクション」を全組合せぶん前計算した表で引く
+#
+#   - PIR i をビット i として、2^N 通りの活動セットそれぞれにセクション番号を入れた配列を作る
+#   - 各セクションの「署名」（どの PIR の共通域か）は名前 "PIR2&PIR1" から、
+#     名前が PIR の組合せでなければ PIR 位置とセクション中心の距離（radius 以内）から決める
+#   - 署名と完全に一致するセットは exact、それ以外は Jaccard 類似度が最大のセクションを推定値にする
+#     （同点なら活動 PIR の重心に中心が近いほう）
+#   - COMBO_TO_SECTION のような手書きの表があれば、その組合せはそちらを優先する
+#
+# 毎回のセット生成・ハッシュの代わりに、活動マスク（int）で配列を 1 回引くだけ。
+# 19 台でも表は 2^19 = 52 万要素（int16 + bool で 1.5 MB）。
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _popcount(a: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(a).astype(np.int32)
+    out = np.zeros(a.shape, dtype=np.int32)
+    a = a.copy()
+    while a.any():
+        out += (a & 1).astype(np.int32)
+        a >>= 1
+    return out
+
+
+def _subset_sums(values: np.ndarray) -> np.ndarray:
+    """mask ごとの values[ビットの立っている i] の合計（長さ 2^N）。"""
+    out = np.zeros(1 << len(values), dtype=np.float64)
+    for i, v in enumerate(values):
+        n = 1 << i
+        out[n : 2 * n] = out[:n] + v
+    return out
+
+
+class SectionResolver:
+    def __init__(
+        self,
+        pirs: List[str],
+        sections: Dict[str, tuple],
+        pir_pos: Optional[Dict[str, tuple]] = None,
+        combo_to_section: Optional[Dict[frozenset, str]] = None,
+        radius: float = 0.35,
+    ):
+        if len(pirs) > 24:
+            raise ValueError(f"PIR が多すぎます（{len(pirs)} 台、上限 24）")
+        self.pirs = list(pirs)
+        self.bit = {p: 1 << i for i, p in enumerate(self.pirs)}
+        self.sections = list(sections)
+        self._weights = np.array([1 << i for i in range(len(self.pirs))], np.int64)
+
+        centers = {
+            name: ((x0 + x1) / 2, (y0 + y1) / 2)
+            for name, (x0, y0, x1, y1) in sections.items()
+        }
+        sig = np.array(
+            [self._signature(n, centers[n], pir_pos, radius) for n in self.sections],
+            dtype=np.int64,
+        )
+        self.signature = dict(zip(self.sections, sig.tolist()))
+
+        masks = np.arange(1 << len(self.pirs), dtype=np.int64)
+        n_active = _popcount(masks)
+        best = np.full(masks.size, -1, dtype=np.int16)
+        best_score = np.zeros(masks.size, dtype=np.float64)
+        exact = np.zeros(masks.size, dtype=bool)
+
+        # 同点の決め手: 活動 PIR の重心とセクション中心の距離
+        if pir_pos:
+            xs = np.array([pir_pos.get(p, (0.5, 0.5))[0] for p in self.pirs])
+            ys = np.array([pir_pos.get(p, (0.5, 0.5))[1] for p in self.pirs])
+            cnt = np.maximum(n_active, 1)
+            cx, cy = _subset_sums(xs) / cnt, _subset_sums(ys) / cnt
+        for j, name in enumerate(self.sections):
+            s = sig[j]
+            if s == 0:
+                continue
+            inter = _popcount(masks & s)
+            union = _popcount(masks | s)
+            score = inter / np.maximum(union, 1)
+            if pir_pos:
+                dist = np.hypot(cx - centers[name][0], cy - centers[name][1])
+                score = score - 1e-3 * dist
+            better = (inter > 0) & ((best < 0) | (score > best_score))
+            best[better] = j
+            best_score[better] = score[better]
+            exact |= masks == s
+
+        # 手書きの表があればそれを優先（exact 扱い）
+        for combo, name in (combo_to_section or {}).items():
+            if name in self.sections and all(p in self.bit for p in combo):
+                m = self.mask_of(combo)
+                best[m] = self.sections.index(name)
+                exact[m] = True
+
+        self.table = best
+        self.exact = exact
+
+    def _signature(self, name, center, pir_pos, radius) -> int:
+        parts = name.split("&")
+        if all(p in self.bit for p in parts):
+            return sum(self.bit[p] for p in parts)
+        if not pir_pos:
+            return 0
+        m = 0
+        for p, (x, y) in pir_pos.items():
+            if p in self.bit and np.hypot(x - center[0], y - center[1]) <= radius:
+                m |= self.bit[p]
+        return m
+
+    # ---------- マスク ----------
+    def mask_of(self, active: Iterable[str]) -> int:
+        m = 0
+        for p in active:
+            m |= self.bit.get(p, 0)
+        return m
+
+    def mask_from_last_true(
+        self, last_true: np.ndarray, now: float, window_sec: float
+    ) -> int:
+        """PIR 順の「最後に反応した時刻」配列から活動マスクを作る（集合を作らない）。"""
+        on = (now - last_true) <= window_sec
+        return int(self._weights[on].sum())
+
+    def pirs_of(self, mask: int) -> List[str]:
+        return [p for p in self.pirs if mask & self.bit[p]]
+
+    # ---------- 解決 ----------
+    def resolve_mask(self, mask: int) -> Tuple[Optional[str], bool]:
+        """(セクション名 or None, 規則どおりの一致か)。曖昧なセットは推定値と False。"""
+        j = int(self.table[mask])
+        if j < 0:
+            return None, False
+        return self.sections[j], bool(self.exact[mask])
+
+    def resolve(self, active: Iterable[str]) -> Tuple[Optional[str], bool]:
+        return self.resolve_mask(self.mask_of(active))
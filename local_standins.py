@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ローカル動作確認用のスタンドイン
+  - MiniBroker     : MQTT 3.1.1 の最小ブローカ（CONNECT/SUBSCRIBE/PUBLISH/PING、配信は QoS0）
+  - FakeElwaServer : ELWA HTTP API（/elapi/v1/devices/{id}/properties/{prop}）の偽サーバ
+  - FakeElasticsearch : Elasticsearch の _bulk / _count だけを受ける偽サーバ
+
+本番ブローカ（150.65.179.132:7883）や ELWA に触らずに、集約デーモンや
+ポーラを手元で動かすためのものです。
+
+Usage:
+  python local_standins.py --mqtt-port 1883 --http-port 7000 \\
+      --device 1921682116000702 --toggle-sec 5
+  python elwa_daemon.py --profile ELWA_washitu --broker 127.0.0.1 --port 1883 \\
+      --http-base http://127.0.0.1:7000
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+# ============================
+# MQTT
+# ============================
+def topic_matches(flt: str, topic: str) -> bool:
+    """MQTT のワイルドカード（+ / #）でのマッチ"""
+    f = flt.split("/")
+    t = topic.split("/")
+    for i, part in enumerate(f):
+        if part == "#":
+            return True
+        if i >= len(t):
+            return False
+        if part != "+" and part != t[i]:
+            return False
+    return len(f) == len(t)
+
+
+def _encode_len(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n % 128
+        n //= 128
+        if n:
+            b |= 0x80
+        out.append(b)
+        if not n:
+            return bytes(out)
+
+
+def _utf8(s: str) -> bytes:
+    b = s.encode()
+    return len(b).to_bytes(2, "big") + b
+
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    body = _utf8(topic) + payload
+    return b"\x30" + _encode_len(len(body)) + body
+
+
+class MiniBroker:
+    """
+    1 プロセス内で動く最小の MQTT ブローカ。
+    retain / will / QoS2 は扱わない（QoS1 の PUBLISH には PUBACK だけ返し、配信は QoS0）。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._subs: Dict[asyncio.StreamWriter, List[str]] = {}
+        self._tasks: set = set()
+        self.published = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        for t in list(self._tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def publish(self, topic: str, payload) -> int:
+        """購読中のクライアントへ配信（ループスレッドから呼ぶ）。配信先の数を返す。"""
+        if not isinstance(payload, (bytes, bytearray)):
+            if not isinstance(payload, str):
+                payload = json.dumps(payload)
+            payload = payload.encode()
+        pkt = publish_packet(topic, bytes(payload))
+        n = 0
+        for w, filters in list(self._subs.items()):
+            if any(topic_matches(f, topic) for f in filters):
+                w.write(pkt)
+                n += 1
+        self.published += 1
+        return n
+
+    async def _read_packet(self, r: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+        b0 = (await r.readexactly(1))[0]
+        mult, n = 1, 0
+        while True:
+            b = (await r.readexactly(1))[0]
+            n += (b & 0x7F) * mult
+            if not b & 0x80:
+                break
+            mult *= 128
+        return b0 >> 4, b0 & 0x0F, await r.readexactly(n)
+
+    async def _client(self, r: asyncio.StreamReader, w: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        self._subs[w] = []
+        try:
+            while True:
+                ptype, flags, body = await self._read_packet(r)
+                if ptype == 1:  # CONNECT
+                    w.write(b"\x20\x02\x00\x00")
+                elif ptype == 3:  # PUBLISH
+                    tl = int.from_bytes(body[:2], "big")
+                    topic = body[2 : 2 + tl].decode()
+                    pos = 2 + tl
+                    qos = (flags >> 1) & 0x03
+                    if qos:
+                        pid = body[pos : pos + 2]
+                        pos += 2
+                        w.write(b"\x40\x02" + pid)
+                    self.publish(topic, body[pos:])
+                elif ptype == 8:  # SUBSCRIBE
+                    pid, pos, granted = body[:2], 2, bytearray()
+                    while pos < len(body):
+                        tl = int.from_bytes(body[pos : pos + 2], "big")
+                        self._subs[w].append(body[pos + 2 : pos + 2 + tl].decode())
+                        pos += 2 + tl + 1
+                        granted.append(0)
+                    w.write(b"\x90" + _encode_len(2 + len(granted)) + pid + granted)
+                elif ptype == 10:  # UNSUBSCRIBE
+                    w.write(b"\xb0\x02" + body[:2])
+                elif ptype == 12:  # PINGREQ
+                    w.write(b"\xd0\x00")
+                elif ptype == 14:  # DISCONNECT
+                    break
+                await w.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subs.pop(w, None)
+            self._tasks.discard(task)
+            w.close()
+
+
+# ============================
+# ELWA HTTP
+# ============================
+class FakeElwaServer:
+    """
+    GET /elapi/v1/devices/{id}/properties/{prop} → {"prop": value}
+    GET /elapi/v1/devices/{id}/properties        → {全プロパティ}（bulk=False なら 404）
+    値は set() で差し替える。別スレッドの ThreadingHTTPServer で動く。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        self.values: Dict[str, Dict[str, object]] = {}
+        self.delay = delay
+        self.requests = 0
+        self.not_modified = 0
+        self.etag = True  # False なら ETag を返さない（ETag 非対応サーバの再現）
+        self.bulk = True  # False なら /properties（まとめ読み）に 404 を返す
+        self.fail: set = set()  # ここに入っている deviceId は 500 を返す
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def url(self, device: str, prop: str = "detection") -> str:
+        return f"{self.base_url}/elapi/v1/devices/{device}/properties/{prop}"
+
+    def set(self, device: str, prop: str, value):
+        with self._lock:
+            self.values.setdefault(device, {})[prop] = value
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _lookup(self, path: str):
+        parts = path.strip("/").split("/")
+        # elapi v1 devices {id} properties [prop]
+        if len(parts) < 5 or parts[:3] != ["elapi", "v1", "devices"]:
+            return 404, None
+        dev = parts[3]
+        if dev in self.fail:
+            return 500, None
+        with self._lock:
+            props = dict(self.values.get(dev, {}))
+        if len(parts) == 5:
+            return (200, props) if self.bulk else (404, None)
+        prop = parts[5]
+        if prop not in props:
+            return 404, None
+        return 200, {prop: props[prop]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.delay:
+                    threading.Event().wait(server.delay)
+                code, body = server._lookup(self.path.split("?", 1)[0])
+                data = json.dumps(body if body is not None else {}).encode()
+                tag = (
+                    f'"{zlib.crc32(data):08x}"' if server.etag and code == 200 else None
+                )
+                if tag and self.headers.get("If-None-Match") == tag:
+                    with server._lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", tag)
+                    self.end_headers()
+                    return
+                self.send_response(code)
+                if tag:
+                    self.send_header("ETag", tag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return Handler
+
+
+# ============================
+# Elasticsearch（_bulk だけ）
+# ============================
+class FakeElasticsearch:
+    """
+    POST /_bulk（NDJSON の index アクションのみ）を受けて文書をメモリに溜める。
+      - fail_requests  : 残り回数だけ、リクエスト全体に 429 を返す
+      - fail_every     : k 件目ごとの item を 429 にする（部分失敗の再現、0 で無効）
+      - reject_field   : このキーを持つ文書は 400（マッピングエラー相当）
+      - delay          : 応答を遅らせる秒数（ES が遅いときの再現）
+    PUT /_index_template/{name} → templates に保存
+    GET /{index}/_count → {"count": n}
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        self.docs: Dict[str, list] = {}
+        self.delay = delay
+        self.fail_requests = 0
+        self.fail_every = 0
+        self.reject_field: Optional[str] = None
+        self.templates: Dict[str, dict] = {}
+        self.bulk_requests = 0
+        self._seen = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def count(self, index: Optional[str] = None) -> int:
+        with self._lock:
+            if index is not None:
+                return len(self.docs.get(index, []))
+            return sum(len(v) for v in self.docs.values())
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _bulk(self, body: bytes):
+        lines = [ln for ln in body.split(b"\n") if ln.strip()]
+        items, errors = [], False
+        with self._lock:
+            self.bulk_requests += 1
+            if self.fail_requests > 0:
+                self.fail_requests -= 1
+                return 429, {"error": "es_rejected_execution_exception", "status": 429}
+            for action, src in zip(lines[0::2], lines[1::2]):
+                index = json.loads(action)["index"]["_index"]
+                doc = json.loads(src)
+                self._seen += 1
+                if self.fail_every and self._seen % self.fail_every == 0:
+                    st = 429
+                elif self.reject_field and self.reject_field in doc:
+                    st = 400
+                else:
+                    st = 201
+                    self.docs.setdefault(index, []).append(doc)
+                errors |= st >= 300
+                items.append({"index": {"_index": index, "status": st}})
+        return 200, {"took": 1, "errors": errors, "items": items}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code, body):
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(n)
+                if server.delay:
+                    threading.Event().wait(server.delay)
+                if self.path.split("?", 1)[0] != "/_bulk":
+                    return self._reply(404, {})
+                self._reply(*server._bulk(body))
+
+            def do_PUT(self):
+                n = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(n) or b"{}")
+                parts = self.path.split("?", 1)[0].strip("/").split("/")
+                if len(parts) == 2 and parts[0] == "_index_template":
+                    with server._lock:
+                        server.templates[parts[1]] = body
+                    return self._reply(200, {"acknowledged": True})
+                self._reply(404, {})
+
+            def do_GET(self):
+                parts = self.path.split("?", 1)[0].strip("/").split("/")
+                if len(parts) == 2 and parts[1] == "_count":
+                    return self._reply(200, {"count": server.count(parts[0])})
+                self._reply(404, {})
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return Handler
+
+
+async def _serve(args):
+    broker = await MiniBroker(args.host, args.mqtt_port).start()
+    elwa = FakeElwaServer(args.host, args.http_port).start()
+    for d in args.device:
+        elwa.set(d, "detection", False)
+    print(f"MQTT  : {args.host}:{broker.port}")
+    print(f"ELWA  : {elwa.base_url}")
+    state = False
+    try:
+        while True:
+            await asyncio.sleep(args.toggle_sec)
+            state = not state
+            for d in args.device:
+                elwa.set(d, "detection", state)
+            print(f"detection -> {state}")
+    finally:
+        elwa.stop()
+        await broker.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="local MQTT broker / ELWA HTTP stand-ins")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--mqtt-port", type=int, default=1883)
+    ap.add_argument("--http-port", type=int, default=7000)
+    ap.add_argument(
+        "--device", action="append", default=[], help="detection を返す deviceId"
+    )
+    ap.add_argument(
+        "--toggle-sec", type=float, default=5.0, help="detection の切替周期"
+    )
+    args = ap.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
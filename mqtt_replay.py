@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+/server/# の MQTT トラフィックを記録し、あとで同じ順序・間隔で再生する
+
+ログ形式（追記専用のバイナリ、途中で落ちても書き終えた分は読める）:
+  先頭    : b"MQTTLOG1"
+  T レコード: b"T" + <H topic_id> <H len> + topic(utf-8)   … 初出のトピックを登録
+  M レコード: b"M" + <q 受信時刻 ns> <H topic_id> <I len> + payload
+
+Usage:
+  # 家のブローカから記録
+  python mqtt_replay.py record --out house_0125.mqttlog
+  # 内容の確認
+  python mqtt_replay.py info house_0125.mqttlog
+  # ローカルブローカへ 10 倍速で再生（local_standins.py のブローカなど）
+  python mqtt_replay.py replay house_0125.mqttlog --broker 127.0.0.1 --port 1883 --speed 10
+  # アグリゲータの on_message を直接呼んで最大速度で再生（スループット測定）
+  python mqtt_replay.py replay house_0125.mqttlog --handler agregate_data1212
+  python mqtt_replay.py replay house_0125.mqttlog --profile Living_Kitchen0916
+"""
+
+import argparse
+import importlib
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Iterator, Optional, Tuple
+
+MAGIC = b"MQTTLOG1"
+_TOPIC = struct.Struct("<HH")
+_MSG = struct.Struct("<qHI")
+
+
+# ============================
+# 読み込み
+# ============================
+def _records(data: bytes, path: str = "") -> Iterator[tuple]:
+    """("T", tid, topic, end) / ("M", t_ns, tid, payload, end)。書きかけの末尾で止まる。"""
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path}: MQTT ログではありません")
+    pos, n = len(MAGIC), len(data)
+    while pos < n:
+        kind = data[pos : pos + 1]
+        p = pos + 1
+        if kind == b"T":
+            if p + _TOPIC.size > n:
+                return
+            tid, ln = _TOPIC.unpack_from(data, p)
+            p += _TOPIC.size
+            if p + ln > n:
+                return
+            yield "T", tid, data[p : p + ln].decode(), p + ln
+        elif kind == b"M":
+            if p + _MSG.size > n:
+                return
+            t_ns, tid, ln = _MSG.unpack_from(data, p)
+            p += _MSG.size
+            if p + ln > n:
+                return
+            yield "M", t_ns, tid, data[p : p + ln], p + ln
+        else:
+            raise ValueError(f"{path}: 壊れたレコード (offset {pos})")
+        pos = p + ln
+
+
+def read_log(path: str) -> Iterator[Tuple[int, str, bytes]]:
+    """(受信時刻 ns, topic, payload) を記録順に返す。末尾の書きかけレコードは無視。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    names = {}
+    for rec in _records(data, path):
+        if rec[0] == "T":
+            names[rec[1]] = rec[2]
+        else:
+            yield rec[1], names[rec[2]], rec[3]
+
+
+# ============================
+# 書き込み
+# ============================
+class LogWriter:
+    def __init__(self, path: str, flush_every_sec: float = 1.0):
+        self._topics = {}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # 追記時は既存のトピック表を引き継ぎ、書きかけの末尾は切り詰める
+            with open(path, "rb") as f:
+                data = f.read()
+            end = len(MAGIC)
+            for rec in _records(data, path):
+                if rec[0] == "T":
+                    self._topics[rec[2]] = rec[1]
+                end = rec[-1]
+            self._f = open(path, "r+b")
+            self._f.truncate(end)
+            self._f.seek(end)
+        else:
+            self._f = open(path, "wb")
+            self._f.write(MAGIC)
+        self._lock = threading.Lock()
+        self._flush_every = flush_every_sec
+        self._last_flush = time.monotonic()
+        self.count = 0
+
+    def write(self, topic: str, payload: bytes, t_ns: Optional[int] = None):
+        t_ns = time.time_ns() if t_ns is None else t_ns
+        with self._lock:
+            tid = self._topics.get(topic)
+            if tid is None:
+                tid = self._topics[topic] = len(self._topics)
+                tb = topic.encode()
+                self._f.write(b"T" + _TOPIC.pack(tid, len(tb)) + tb)
+            self._f.write(b"M" + _MSG.pack(t_ns, tid, len(payload)) + payload)
+            self.count += 1
+            now = time.monotonic()
+            if now - self._last_flush >= self._flush_every:
+                self._f.flush()
+                self._last_flush = now
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+
+@dataclass
+class ReplayMessage:
+    """paho の MQTTMessage の代わり（on_message が使う属性だけ）"""
+
+    topic: str
+    payload: bytes
+    qos: int = 0
+    retain: bool = False
+    timestamp: float = 0.0
+
+
+def _paced(path: str, speed: float):
+    """speed 倍速で記録時の間隔を再現（speed <= 0 なら待たない）。"""
+    t0_log = None
+    t0 = time.monotonic()
+    for t_ns, topic, payload in read_log(path):
+        if speed > 0:
+            if t0_log is None:
+                t0_log = t_ns
+            due = t0 + (t_ns - t0_log) / 1e9 / speed
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        yield t_ns, topic, payload
+
+
+# ============================
+# 再生
+# ============================
+def replay_to_handler(
+    path: str, on_message: Callable, speed: float = 0.0, userdata=None
+) -> Tuple[int, float]:
+    """on_message(client, userdata, msg) を直接呼ぶ。戻り値は (件数, 秒)。"""
+    n = 0
+    t = time.perf_counter()
+    for t_ns, topic, payload in _paced(path, speed):
+        on_message(None, userdata, ReplayMessage(topic, payload, timestamp=t_ns / 1e9))
+        n += 1
+    return n, time.perf_counter() - t
+
+
+def replay_to_broker(
+    path: str, host: str, port: int, speed: float = 1.0, qos: int = 0
+) -> Tuple[int, float]:
+    """ブローカへ publish し直す（受け側は本番と同じく MQTT 経由で受信する）。"""
+    from elwa_daemon import make_mqtt_client
+
+    client = make_mqtt_client("tcp")
+    client.connect(host, port, 60)
+    client.loop_start()
+    n = 0
+    t = time.perf_counter()
+    try:
+        for _, topic, payload in _paced(path, speed):
+            client.publish(topic, payload, qos=qos)
+            n += 1
+    finally:
+        client.loop_stop()
+        client.disconnect()
+    return n, time.perf_counter() - t
+
+
+def load_handler(module_name: str) -> Callable:
+    """アグリゲータのモジュールから on_message を取り出す。"""
+    return importlib.import_module(module_name).on_message
+
+
+def load_profile_handler(profile_names) -> Callable:
+    """elwa_daemon のプロファイルを（書き出し無しで）組み立て、その on_message を返す。"""
+    from elwa_daemon import IngestionDaemon, load_profile
+
+    profiles = [replace(load_profile(n), verbose=False) for n in profile_names]
+    daemon = IngestionDaemon(profiles, sinks={p.name: [] for p in profiles})
+    return daemon._on_message
+
+
+# ============================
+# 記録
+# ============================
+def record(host: str, port: int, topic: str, out: str, duration: float = 0.0):
+    from elwa_daemon import make_mqtt_client
+
+    w = LogWriter(out)
+    client = make_mqtt_client("tcp")
+    client.on_connect = lambda c, u, f, rc, p=None: c.subscribe(topic)
+    client.on_message = lambda c, u, msg: w.write(msg.topic, msg.payload)
+    client.connect(host, port, 60)
+    client.loop_start()
+    print(f"● 記録中: {topic} -> {os.path.abspath(out)}（Ctrl+C で終了）")
+    t0 = time.monotonic()
+    try:
+        while not duration or time.monotonic() - t0 < duration:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        w.close()
+        print(f"■ {w.count} 件を記録しました")
+
+
+def info(path: str):
+    n, size, topics, first, last = 0, 0, set(), None, None
+    for t_ns, topic, payload in read_log(path):
+        n += 1
+        size += len(payload)
+        topics.add(topic)
+        first = t_ns if first is None else min(first, t_ns)
+        last = t_ns if last is None else max(last, t_ns)
+    span = (last - first) / 1e9 if n else 0.0
+    print(f"messages : {n}")
+    print(f"topics   : {len(topics)}")
+    print(f"span     : {span:.1f} s ({n / span if span else 0:.1f} msg/s)")
+    print(f"payload  : {size} bytes / file {os.path.getsize(path)} bytes")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="MQTT traffic recorder / replayer")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("record")
+    p.add_argument("--broker", default="150.65.179.132")
+    p.add_argument("--port", type=int, default=7883)
+    p.add_argument("--topic", default="/server/#")
+    p.add_argument("--out", required=True)
+    p.add_argument(
+        "--duration", type=float, default=0.0, help="秒（0 なら Ctrl+C まで）"
+    )
+
+    p = sub.add_parser("info")
+    p.add_argument("log")
+
+    p = sub.add_parser("replay")
+    p.add_argument("log")
+    p.add_argument("--speed", type=float, default=0.0, help="倍速（0 なら最大速度）")
+    p.add_argument("--broker", default=None, help="指定するとこのブローカへ publish")
+    p.add_argument("--port", type=int, default=1883)
+    p.add_argument("--handler", default=None, help="on_message を持つモジュール名")
+    p.add_argument(
+        "--profile", action="append", default=None, help="elwa_daemon のプロファイル"
+    )
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        record(args.broker, args.port, args.topic, args.out, args.duration)
+    elif args.cmd == "info":
+        info(args.log)
+    else:
+        if args.broker:
+            n, sec = replay_to_broker(args.log, args.broker, args.port, args.speed)
+        elif args.handler or args.profile:
+            handler = (
+                load_handler(args.handler)
+                if args.handler
+                else load_profile_handler(args.profile)
+            )
+            n, sec = replay_to_handler(args.log, handler, args.speed)
+        else:
+            ap.error("--broker / --handler / --profile のどれかを指定してください")
+        print(
+            f"replayed {n} messages in {sec:.3f} s ({n / sec if sec else 0:.0f} msg/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,44 +5,8 @@
 import argparse, json, joblib, numpy as np, pandas as pd
 from pathlib import Path
 
-
-def _to_bool(x):
-    if pd.isna(x):
-        return None
-    if isinstance(x, (bool, np.bool_)):
-        return bool(x)
-    if isinstance(x, (int, float, np.integer, np.floating)):
-        return bool(int(x != 0))
-    if isinstance(x, str):
-        s = x.strip().lower()
-        if s in ("true", "t", "yes", "y", "on", "1"):
-            return True
-        if s in ("false", "f", "no", "n", "off", "0"):
-            return False
-        if s in ("open",):
-            return False
-        if s in ("closed",):
-            return True
-    return None
-
-
-def _object_to_numeric(series: pd.Series) -> pd.Series:
-    if series.dtype == object:
-        s = series.copy()
-        mapping = {"OPEN": 0, "open": 0, "CLOSED": 1, "closed": 1}
-        s = s.map(mapping).where(~s.isna(), s)
-        s = s.map(
-            lambda v: (
-                1 if _to_bool(v) is True else (0 if _to_bool(v) is False else np.nan)
-            )
-        )
-        try:
-            return s.astype(float)
-        except Exception:
-            return pd.to_numeric(series, errors="coerce")
-    elif series.dtype == bool:
-        return series.astype(float)
-    return series
+from bool_coerce import coerce_frame
+from snapshot_loader import load_snapshot_csv
 
 
 def add_derived_features(df_num: pd.DataFrame, windows=(5, 15)) -> pd.DataFrame:
@@ -62,9 +26,7 @@ def make_features(df: pd.DataFrame, ts_col: str, feature_cols: list) -> pd.DataF
         df[ts_col] = pd.to_datetime(df[ts_col], errors="coerce")
         df = df.dropna(subset=[ts_col]).sort_values(ts_col).reset_index(drop=True)
 
-    X_base = df.drop(columns=[ts_col], errors="ignore")
-    for c in X_base.columns:
-        X_base[c] = _object_to_numeric(X_base[c])
+    X_base = coerce_frame(df.drop(columns=[ts_col], errors="ignore"))
     X_base = X_base.select_dtypes(include=[np.number])
     X_all = add_derived_features(X_base, windows=(5, 15))
     # 学習時に存在した列だけに合わせる（無い列は追加）
@@ -89,7 +51,7 @@ def main():
     le = bundle["label_encoder"]
     feat_cols = bundle["feature_cols"]
 
-    df = pd.read_csv(args.csv, low_memory=False)
+    df = load_snapshot_csv(args.csv, ts_col=args.ts_col)
     X = make_features(df, args.ts_col, feat_cols)
     proba = pipe.predict_proba(X)
     pred = le.inverse_transform(np.argmax(proba, axis=1))
@@ -6,8 +6,17 @@ import numpy as np
 import pandas as pd
 import joblib
 
+from snapshot_loader import load_snapshot_csv
+
 
 def ensure_datetime(df, ts_col):
+    ts = df[ts_col]
+    if (
+        pd.api.types.is_datetime64_any_dtype(ts)
+        and not ts.isna().any()
+        and ts.is_monotonic_increasing
+    ):
+        return df.reset_index(drop=True)
     df = df.copy()
     df[ts_col] = pd.to_datetime(df[ts_col], errors="coerce")
     df = df.dropna(subset=[ts_col]).sort_values(ts_col).reset_index(drop=True)
@@ -28,7 +37,7 @@ def main():
     meta = bundle["meta"]
     ts_col = meta["ts_col"]
 
-    df = pd.read_csv(args.csv, low_memory=False)
+    df = load_snapshot_csv(args.csv, ts_col=ts_col)
     df = ensure_datetime(df, ts_col)
 
     # 同じ前処理で特徴量列を合わせる（存在しない列はNaNで補完）
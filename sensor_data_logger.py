@@ -1,29 +1,18 @@
-import requests
-import json
 import csv
 import datetime
 import os
-import time # timeモジュールをインポート
 
-# データ取得先のURL
-URL = "http://150.65.179.132:7000/elapi/v1/devices/192168215305FD01/properties/operationStatus"
+from elwa_client import ElwaClient, DEFAULT_BASE
+
+# データ取得先（取得は elwa_client がまとめて行う）
+ELWA_BASE = DEFAULT_BASE
+DEVICE_ID = "192168215305FD01"
+PROPERTY = "operationStatus"
+INTERVAL_SECONDS = 1.0
 
 # 保存するCSVファイル名
 CSV_FILE = "door_sensor_log_continuous.csv"
 
-def get_sensor_data():
-    """
-    センサーのデータをURLから取得してJSONとして返す
-    """
-    try:
-        response = requests.get(URL)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        # ネットワークエラーなどはコンソールに表示するが、プログラムは止めない
-        print(f"エラー: データ取得に失敗 - {e}")
-        return None
-
 def append_to_csv(data):
     """
     取得したデータをCSVファイルに追記する
@@ -53,18 +42,22 @@ def append_to_csv(data):
         print("エラー: JSONデータの形式が不正です。")
 
 
+def register(client):
+    """
+    クライアントに購読を登録する（他スクリプトと同じクライアントを共有できる）
+    """
+    client.subscribe(DEVICE_ID, [PROPERTY], append_to_csv, every=INTERVAL_SECONDS)
+
+
 def main():
     """
-    メインの処理。無限ループで1秒ごとにデータを取得・記録する。
+    メインの処理。1秒ごとにデータを取得・記録する。
     """
     print("データ記録を開始します。停止するには Ctrl+C を押してください。")
-    while True:
-        sensor_data = get_sensor_data()
-        if sensor_data:
-            append_to_csv(sensor_data)
-        
-        # ★変更点: 1秒待機する
-        time.sleep(1)
+    # ネットワークエラーなどはクライアントがコンソールに表示し、プログラムは止めない
+    client = ElwaClient(ELWA_BASE)
+    register(client)
+    client.run_forever()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+Elasticsearch の _bulk API にまとめて書き込むインデクサ
+
+MQTT の on_message からは submit(doc) するだけ（キューに積んで即 return）。
+バックグラウンドのスレッドが件数 / バイト数 / 経過時間のどれかでまとめて _bulk に送る。
+
+  - キューは上限あり。満杯なら新しい文書を捨てて dropped を数える（MQTT ループは止めない）
+  - 429 / 5xx / 接続エラーはバッチごと指数バックオフで再送
+  - _bulk の応答で item 単位に 429 / 5xx が返ったものだけ再送、4xx（マッピングエラー等）は failed
+    （items が足りない・形が崩れている文書も failed）
+  - 想定外の例外でもワーカーは止めず、そのバッチを failed に数えて次へ進む
+  - stats() で submitted / indexed / dropped / retried / failed を返す
+
+Usage:
+  indexer = BulkIndexer("http://localhost:9200", "smarthome_logs")
+  indexer.submit({"@timestamp": ..., "device_id": ...})
+  ...
+  indexer.close()
+"""
+
+import json
+import queue
+import random
+import threading
+import time
+from typing import List, Optional
+
+import requests
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+def _item_status(item) -> Optional[int]:
+    """_bulk 応答の items[i]（{"index": {"status": 201, ...}}）の status。形が崩れていれば None。"""
+    try:
+        st = next(iter(item.values())).get("status", 500)
+        return int(st)
+    except (AttributeError, StopIteration, TypeError, ValueError):
+        return None
+
+
+class BulkIndexer:
+    def __init__(
+        self,
+        es_host: str,
+        index: str,
+        max_docs: int = 500,
+        max_bytes: int = 5 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        queue_size: int = 20000,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 10.0,
+        session: Optional[requests.Session] = None,
+    ):
+        self.url = es_host.rstrip("/") + "/_bulk"
+        self.index = index
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self._action = (json.dumps({"index": {"_index": index}}) + "\n").encode()
+        self._q: "queue.Queue[bytes]" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.indexed = 0
+        self.dropped = 0  # キュー満杯で捨てた件数
+        self.retried = 0  # 再送した文書数（延べ）
+        self.failed = 0  # 再送しても入らなかった / 4xx で拒否された件数
+        self.batches = 0
+        self._worker = threading.Thread(target=self._run, name="es-bulk", daemon=True)
+        self._worker.start()
+
+    # ---------- producer 側 ----------
+    def submit(self, doc: dict) -> bool:
+        """文書をキューに積む（ブロックしない）。満杯なら False。"""
+        line = (json.dumps(doc, ensure_ascii=False, default=str) + "\n").encode()
+        try:
+            self._q.put_nowait(line)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    # ---------- worker ----------
+    def _collect(self) -> List[bytes]:
+        """最初の 1 件を待ち、そこから flush_interval 以内に max_docs / max_bytes まで集める。"""
+        try:
+            first = self._q.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch, size = [first], len(first)
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_docs and size < self.max_bytes:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                # 停止時は待たずに、今あるだけ詰める
+                try:
+                    line = self._q.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                try:
+                    line = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            batch.append(line)
+            size += len(line)
+        return batch
+
+    def _post(self, docs: List[bytes]) -> requests.Response:
+        body = b"".join(self._action + d for d in docs)
+        return self.session.post(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"},
+            timeout=self.timeout,
+        )
+
+    def _send(self, docs: List[bytes]):
+        attempt = 0
+        while docs:
+            retry: List[bytes] = []
+            try:
+                r = self._post(docs)
+                if r.status_code in RETRY_STATUSES:
+                    retry = docs
+                else:
+                    r.raise_for_status()
+                    res = r.json()
+                    ok, failed = len(docs), 0
+                    if res.get("errors"):
+                        ok = 0
+                        items = res.get("items") or []
+                        for i, d in enumerate(docs):
+                            # items が足りない分・形が崩れた item は failed
+                            st = _item_status(items[i]) if i < len(items) else None
+                            if st is None:
+                                failed += 1
+                            elif st < 300:
+                                ok += 1
+                            elif st in RETRY_STATUSES:
+                                retry.append(d)
+                            else:
+                                failed += 1
+                    # 数えるのは応答を読み終えてから（途中の例外で二重に数えない）
+                    with self._lock:
+                        self.indexed += ok
+                        self.failed += failed
+                        self.batches += 1
+            except requests.RequestException as e:
+                print(f"[ES] bulk 送信エラー: {e}")
+                retry = docs
+            except Exception as e:  # 応答が JSON でない・形が想定外など
+                print(f"[ES] bulk 応答を処理できません: {e!r}（{len(docs)} 件を破棄）")
+                with self._lock:
+                    self.failed += len(docs)
+                return
+
+            if not retry:
+                return
+            attempt += 1
+            if attempt > self.max_retries:
+                print(f"[ES] 再送上限に達しました。{len(retry)} 件を破棄")
+                with self._lock:
+                    self.failed += len(retry)
+                return
+            with self._lock:
+                self.retried += len(retry)
+            wait = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+            time.sleep(wait * random.uniform(0.8, 1.2))
+            docs = retry
+
+    def _run(self):
+        while not (self._stop.is_set() and self._q.empty()):
+            batch = self._collect()
+            if not batch:
+                continue
+            # ワーカーが死ぬと以降の submit がすべて dropped になるので、何が起きても続ける
+            try:
+                self._send(batch)
+            except Exception as e:
+                print(f"[ES] bulk ワーカーで例外: {e!r}（{len(batch)} 件を破棄）")
+                with self._lock:
+                    self.failed += len(batch)
+
+    # ---------- 終了 / 統計 ----------
+    def close(self, timeout: float = 30.0):
+        """キューに残っている分を送ってから止める。"""
+        self._stop.set()
+        self._worker.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "indexed": self.indexed,
+                "dropped": self.dropped,
+                "retried": self.retried,
+                "failed": self.failed,
+                "batches": self.batches,
+                "queued": self._q.qsize(),
+            }
@@ -0,0 +1,266 @@
+"""
+smarthome_logs 用の固定スキーマとドキュメント生成
+
+以前は dict の payload を doc.update(value) でトップレベルに展開していたため、
+customF1 などの中身がそのままフィールドになりマッピングが際限なく増えていた。
+ここでは既知の ECHONET / センサーのプロパティだけを型付きのフィールドに入れる。
+
+  m.<名前>  : 数値（float）      例: m.roomTemperature, m.co2Concentration, m.scd40_co2
+  b.<名前>  : 真偽値              例: b.motion, b.detection, b.humanDetected
+  s.<名前>  : キーワード          例: s.operationStatus, s.operationMode, s.door
+  value_num / value_bool / value_str : dict でない payload の値
+  extra     : 未知のキー（flattened 型 1 フィールドなのでマッピングは増えない）
+  raw_json  : 元の JSON（raw_sample_rate の割合だけ、index しない）
+
+Usage:
+  builder = DocBuilder(raw_sample_rate=0.01)
+  doc = builder.build(msg.topic, msg.payload)
+  install_template("http://localhost:9200")   # 新しく作られる smarthome_logs* に適用
+"""
+
+import json
+import random
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+import requests
+
+TEMPLATE_NAME = "smarthome_logs"
+INDEX_PATTERNS = ["smarthome_logs*"]
+
+# 数値で持つプロパティ（ECHONET Lite / M5Stack / 各種センサー）
+NUMERIC_PROPS = (
+    # 空気清浄機
+    "temperature",
+    "humidity",
+    "pm25",
+    "gasContaminationValue",
+    "illuminanceValue",
+    "dustValue",
+    "odorStainEvaluationLevel",
+    "overallDirtinessLevel",
+    # エアコン
+    "setTemperature",
+    "targetTemperature",
+    "roomTemperature",
+    "outsideTemperature",
+    "outdoorTemperature",
+    "blowingOutAirTemperature",
+    "co2Concentration",
+    "sunshineSensorData",
+    # 共通
+    "instantaneousElectricPowerConsumption",
+    "consumedCumulativeElectricEnergy",
+    # multi-sensors / Living_Space*_SCD
+    "co2",
+    "lux",
+    # M5Stack (SCD40 / SEN55)
+    "scd40_co2",
+    "scd40_temp",
+    "scd40_hum",
+    "sen55_pm1",
+    "sen55_pm2_5",
+    "sen55_pm4",
+    "sen55_pm10",
+    "sen55_temp",
+    "sen55_hum",
+    "sen55_voc",
+    "sen55_nox",
+    # door-amp / pir-amp
+    "sound_amp",
+)
+
+BOOL_PROPS = (
+    "motion",
+    "motion_raw",
+    "detection",
+    "humanDetected",
+    "pir2",
+    "mic_occupied",
+    "sound_trig",
+    "lepton_occupied",
+)
+
+KEYWORD_PROPS = (
+    "operationStatus",
+    "operationMode",
+    "airFlowLevel",
+    "door",
+)
+
+_KIND = {
+    **{k: "m" for k in NUMERIC_PROPS},
+    **{k: "b" for k in BOOL_PROPS},
+    **{k: "s" for k in KEYWORD_PROPS},
+}
+
+
+def index_template(refresh_interval: str = "5s", replicas: int = 0) -> dict:
+    """PUT _index_template/smarthome_logs の本文"""
+    props = {
+        "@timestamp": {"type": "date"},
+        "device_id": {"type": "keyword"},
+        "device_type": {"type": "keyword"},
+        "property_name": {"type": "keyword"},
+        "topic": {"type": "keyword"},
+        "value_num": {"type": "float"},
+        "value_bool": {"type": "boolean"},
+        "value_str": {"type": "keyword", "ignore_above": 256},
+        "m": {"properties": {k: {"type": "float"} for k in NUMERIC_PROPS}},
+        "b": {"properties": {k: {"type": "boolean"} for k in BOOL_PROPS}},
+        "s": {
+            "properties": {
+                k: {"type": "keyword", "ignore_above": 64} for k in KEYWORD_PROPS
+            }
+        },
+        "extra": {"type": "flattened"},
+        "raw_json": {"type": "text", "index": False},
+    }
+    return {
+        "index_patterns": INDEX_PATTERNS,
+        "priority": 200,
+        "template": {
+            "settings": {
+                "number_of_replicas": replicas,
+                "refresh_interval": refresh_interval,
+            },
+            # 想定外のフィールドはマッピングに追加しない（_source には残る）
+            "mappings": {"dynamic": False, "properties": props},
+        },
+    }
+
+
+def install_template(es_host: str, session: Optional[requests.Session] = None):
+    s = session or requests
+    r = s.put(
+        f"{es_host.rstrip('/')}/_index_template/{TEMPLATE_NAME}",
+        json=index_template(),
+        timeout=10,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+def device_type(device_id: str) -> str:
+    # ログ表示と同じ判定（エアコン 0130, 空気清浄機 0135）
+    if "013001" in device_id:
+        return "aircon"
+    if "013501" in device_id:
+        return "air_purifier"
+    if "PIR" in device_id:
+        return "pir"
+    if "M5" in device_id:
+        return "m5stack"
+    return "other"
+
+
+def _to_float(v) -> Optional[float]:
+    if isinstance(v, bool):
+        return float(v)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None  # "unmeasurable" など
+
+
+def _to_bool(v) -> Optional[bool]:
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        return bool(v)
+    if isinstance(v, str):
+        s = v.strip().lower()
+        if s in ("true", "1", "on", "yes"):
+            return True
+        if s in ("false", "0", "off", "no"):
+            return False
+    return None
+
+
+def _parse_scalar(payload_str: str):
+    # JSONでない場合（単純な数値や文字列）
+    if payload_str.replace(".", "", 1).isdigit():
+        return float(payload_str)
+    if payload_str.lower() == "true":
+        return True
+    if payload_str.lower() == "false":
+        return False
+    return payload_str
+
+
+class DocBuilder:
+    def __init__(self, raw_sample_rate: float = 0.0):
+        self.raw_sample_rate = raw_sample_rate
+        self.unknown_keys = Counter()  # スキーマに載せる候補を見つける用
+
+    def _put(self, doc: dict, key: str, v):
+        kind = _KIND.get(key)
+        if kind == "m":
+            f = _to_float(v)
+            if f is not None:
+                doc["m"][key] = f
+        elif kind == "b":
+            b = _to_bool(v)
+            if b is not None:
+                doc["b"][key] = b
+        elif kind == "s":
+            if v is not None:
+                doc["s"][key] = str(v).lower() if isinstance(v, bool) else str(v)
+        else:
+            self.unknown_keys[key] += 1
+            if not isinstance(v, (str, int, float, bool)):
+                v = json.dumps(v, ensure_ascii=False)
+            doc["extra"][key] = v
+
+    def build(self, topic: str, payload: bytes, now: datetime = None) -> Optional[dict]:
+        # トピック解析: /server/CID/DeviceID/properties/PropName
+        parts = topic.split("/")
+        if len(parts) < 6:
+            return None
+        device_id = parts[3]
+        prop_name = parts[5]
+        payload_str = (
+            payload.decode("utf-8")
+            if isinstance(payload, (bytes, bytearray))
+            else payload
+        )
+
+        doc = {
+            "@timestamp": (now or datetime.now()).isoformat(),
+            "device_id": device_id,
+            "device_type": device_type(device_id),
+            "property_name": prop_name,
+            "topic": topic,
+            "m": {},
+            "b": {},
+            "s": {},
+            "extra": {},
+        }
+
+        try:
+            value = json.loads(payload_str)
+        except json.JSONDecodeError:
+            value = _parse_scalar(payload_str)
+
+        if isinstance(value, dict):
+            # customF1 / customF6 などの中身は既知のキーだけ型付きで入れる
+            for k, v in value.items():
+                self._put(doc, k, v)
+            if self.raw_sample_rate and random.random() < self.raw_sample_rate:
+                doc["raw_json"] = payload_str
+        else:
+            if isinstance(value, bool):
+                doc["value_bool"] = value
+            elif isinstance(value, (int, float)):
+                doc["value_num"] = float(value)
+            elif value is not None:
+                doc["value_str"] = str(value)
+            # 個別プロパティのトピックはプロパティ名でも型付きフィールドに入れる
+            if prop_name in _KIND:
+                self._put(doc, prop_name, value)
+
+        for k in ("m", "b", "s", "extra"):
+            if not doc[k]:
+                del doc[k]
+        return doc
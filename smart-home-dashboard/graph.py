@@ -1,15 +1,19 @@
-import pandas as pd
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from snapshot_loader import load_snapshot_csv  # noqa: E402
+
 # ==========================================
 # 1. データの準備
 # ==========================================
 # マージ済みのデータを読み込みます
-df = pd.read_csv("smart_home_merged_all.csv")
-df["timestamp"] = pd.to_datetime(df["timestamp"])
+df = load_snapshot_csv("smart_home_merged_all.csv")
 df = df.sort_values("timestamp")
 
 # 欠損値処理と移動平均（スムージング）
@@ -1,11 +1,16 @@
 import paho.mqtt.client as mqtt
 import json
 import os
-import csv
+import sys
 import time
 import threading
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from device_registry import AIRCON_KEYS, DeviceRegistry
+from snapshot_state import SnapshotState
+from snapshot_writer import make_writer
+
 # ========= 設定 =========
 MQTT_BROKER = "150.65.179.132"
 MQTT_PORT = 7883
@@ -13,6 +18,9 @@ MQTT_TOPIC = "/server/#"  # 全部拾う
 
 CSV_FILE = "smart_home_snapshot.csv"
 FLUSH_INTERVAL_SEC = 10  # 何秒ごとに1行書き込むか
+# 保存形式: "csv" | "parquet"（日付パーティション）| "both"
+STORAGE_BACKEND = "csv"
+PARQUET_DIR = "smart_home_snapshot_parquet"
 
 
 # ========= デバイス一覧 =========
@@ -110,107 +118,28 @@ def build_columns():
 
 
 COLUMNS = build_columns()
+REGISTRY = DeviceRegistry(
+    COLUMNS,
+    PIR_DEVICES,
+    M5_DEVICES,
+    AIR_PURIFIERS,
+    AIRCONS,
+    # この CSV は人検知列を humanDetected と呼ぶ
+    aircon_keys={**AIRCON_KEYS, "humanDetected": "humanDetected"},
+)
 
-# 状態を保持する辞書（列名 -> 値）
-state = {col: None for col in COLUMNS if col != "timestamp"}
-state_lock = threading.Lock()
-
-
-# ========= CSV ヘッダー作成 =========
-def init_csv():
-    if not os.path.exists(CSV_FILE):
-        with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(COLUMNS)
-        print(f"[CSV] 新規作成: {CSV_FILE}")
-    else:
-        print(f"[CSV] 既存ファイルに追記: {CSV_FILE}")
+# 状態は COLUMNS と同じ並びの事前確保配列（ロック無しで書き、フラッシュ時に一括コピー）
+state = SnapshotState(COLUMNS)
 
 
 # ========= 定期フラッシュ =========
-def flush_state_periodically():
+def flush_state_periodically(writer):
     while True:
         time.sleep(FLUSH_INTERVAL_SEC)
-        with state_lock:
-            row = [datetime.now().isoformat()]
-            for col in COLUMNS[1:]:
-                row.append(state.get(col))
-        with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
-        print(f"[CSV] snapshot written at {row[0]}")
-
-
-# ========= MQTT メッセージ処理 =========
-
-
-def update_pir(device_id, property_name, payload):
-    # motion / motion_raw のどちらかを bool として保存
-    if property_name in ("motion", "motion_raw"):
-        val = payload.get(property_name)
-        col = f"{device_id}_motion"
-        with state_lock:
-            state[col] = bool(val) if val is not None else None
-
-
-def update_m5(device_id, property_name, payload):
-    # payload は {propertyName: value} の形式が多いので全部見る
-    items = payload.items()
-    with state_lock:
-        for key, val in items:
-            k = key.lower()
-            if "co2" in k:
-                state[f"{device_id}_co2"] = val
-            if "temp" in k and "scd40" in k or "sen55" in k:
-                # センサ温度
-                state[f"{device_id}_temp"] = val
-            if "hum" in k:
-                state[f"{device_id}_hum"] = val
-            if "pm2_5" in k or "pm2.5" in k:
-                state[f"{device_id}_pm2_5"] = val
-            if "voc" in k:
-                state[f"{device_id}_voc"] = val
-
-
-def update_air_purifier(device_id, property_name, payload):
-    # customF1 に {temperature, humidity, pm25, gasContaminationValue}
-    items = payload.items()
-    with state_lock:
-        for key, val in items:
-            if key == "temperature":
-                state[f"{device_id}_temp"] = val
-            elif key == "humidity":
-                state[f"{device_id}_hum"] = val
-            elif key == "pm25":
-                state[f"{device_id}_pm25"] = val
-            elif key == "gasContaminationValue":
-                state[f"{device_id}_gas"] = val
-
-
-def update_aircon(device_id, property_name, payload):
-    # customF6: outsideTemperature, humanDetected, sunshineSensorData, blowingOutAirTemperature
-    # customFA: co2Concentration
-    # その他: roomTemperature, targetTemperature, operationStatus, instantaneousElectricPowerConsumption
-    with state_lock:
-        for key, val in payload.items():
-            if key == "outsideTemperature":
-                state[f"{device_id}_outsideTemp"] = val
-            elif key == "roomTemperature":
-                state[f"{device_id}_roomTemp"] = val
-            elif key in ("targetTemperature", "setTemperature"):
-                state[f"{device_id}_setTemp"] = val
-            elif key == "humanDetected":
-                state[f"{device_id}_humanDetected"] = bool(val)
-            elif key == "sunshineSensorData":
-                state[f"{device_id}_sunshine"] = val
-            elif key == "blowingOutAirTemperature":
-                state[f"{device_id}_blowTemp"] = val
-            elif key == "co2Concentration":
-                state[f"{device_id}_co2"] = val
-            elif key == "operationStatus":
-                state[f"{device_id}_opStatus"] = bool(val)
-            elif key == "instantaneousElectricPowerConsumption":
-                state[f"{device_id}_power"] = val
+        row = state.snapshot().tolist()
+        row[0] = datetime.now()
+        writer.write(row)
+        print(f"[CSV] snapshot written at {row[0].isoformat()}")
 
 
 # ========= MQTT コールバック =========
@@ -231,44 +160,18 @@ def on_message(client, userdata, msg):
         print("[MQTT] parse error:", e)
         return
 
-    parts = topic.split("/")
-    # /server/{CID}/{deviceId}/properties/{property}
-    if len(parts) < 6 or parts[1] != "server":
-        return
-
-    device_id = parts[3]
-    property_name = parts[5]
-
-    # PIR
-    if device_id in PIR_DEVICES:
-        update_pir(device_id, property_name, payload)
-
-    # M5Stack
-    elif device_id in M5_DEVICES:
-        update_m5(device_id, property_name, payload)
-
-    # 空気清浄機
-    elif device_id in AIR_PURIFIERS:
-        # customF1 のとき payload 全体に温度等が入っている
-        # それ以外でも念のため payload 全体を見る
-        update_air_purifier(device_id, property_name, payload)
-
-    # エアコン
-    elif device_id in AIRCONS:
-        update_aircon(device_id, property_name, payload)
-
-    # それ以外は無視（必要なら拡張）
-    # print(f"[MQTT] recv {device_id} {property_name} {payload}")
+    # /server/{CID}/{deviceId}/properties/{property} → REGISTRY のディスパッチ表で反映
+    REGISTRY.apply(topic, payload, state.values)
 
 
 # ========= メイン =========
 
 
 def main():
-    init_csv()
+    writer = make_writer(STORAGE_BACKEND, CSV_FILE, PARQUET_DIR, COLUMNS)
 
-    # CSV 書き込みスレッド起動
-    t = threading.Thread(target=flush_state_periodically, daemon=True)
+    # 書き込みスレッド起動
+    t = threading.Thread(target=flush_state_periodically, args=(writer,), daemon=True)
     t.start()
 
     # MQTT クライアント
@@ -277,8 +180,11 @@ def main():
     client.on_message = on_message
 
     client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    print("[MAIN] logging to", CSV_FILE)
-    client.loop_forever()
+    print("[MAIN] logging to", CSV_FILE if STORAGE_BACKEND == "csv" else PARQUET_DIR)
+    try:
+        client.loop_forever()
+    finally:
+        writer.close()
 
 
 if __name__ == "__main__":
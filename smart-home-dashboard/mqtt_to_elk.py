@@ -1,11 +1,14 @@
 import paho.mqtt.client as mqtt
-import json
 import sys
+import time
 from datetime import datetime
 from elasticsearch import Elasticsearch
 import warnings
 from elasticsearch.exceptions import ElasticsearchWarning
 
+from es_bulk_indexer import BulkIndexer
+from es_schema import DocBuilder, install_template
+
 # セキュリティ警告を無視 (ローカル環境用)
 warnings.simplefilter("ignore", ElasticsearchWarning)
 
@@ -15,8 +18,18 @@ MQTT_PORT = 7883
 ES_HOST = "http://localhost:9200"
 INDEX_NAME = "smarthome_logs"
 
-# Elasticsearch接続
+# _bulk 送信（件数 / バイト数 / 秒のどれかで送る）
+BULK_MAX_DOCS = 500
+BULK_MAX_BYTES = 5 * 1024 * 1024
+BULK_FLUSH_SEC = 1.0
+QUEUE_SIZE = 20000  # 満杯なら新しい文書を捨てる（MQTT ループは止めない）
+STATS_EVERY_SEC = 60
+RAW_SAMPLE_RATE = 0.01  # 元の JSON を raw_json に残す割合（デバッグ用、0 で無効）
+
+# Elasticsearch接続（インデックス作成用。書き込みは indexer が _bulk で行う）
 es = Elasticsearch(hosts=[ES_HOST])
+indexer = None
+builder = DocBuilder(raw_sample_rate=RAW_SAMPLE_RATE)
 
 
 # --- 接続時 ---
@@ -30,54 +43,16 @@ def on_connect(client, userdata, flags, reason_code, properties):
 # --- メッセージ受信時 ---
 def on_message(client, userdata, msg):
     try:
-        # トピック解析: /server/CID/DeviceID/properties/PropName
-        topic_parts = msg.topic.split("/")
-        if len(topic_parts) < 6:
+        # --- 保存するデータの作成（既知のプロパティだけ型付きフィールドへ） ---
+        doc = builder.build(msg.topic, msg.payload)
+        if doc is None:
             return
-
-        device_id = topic_parts[3]
-        prop_name = topic_parts[5]
-
-        payload_str = msg.payload.decode("utf-8")
-
-        # --- 保存するデータの作成 ---
-        doc = {
-            "@timestamp": datetime.now().isoformat(),
-            "device_id": device_id,
-            "property_name": prop_name,
-            "topic": msg.topic,
-        }
-
-        # --- 値の解析と展開 ---
-        try:
-            # JSONとして読み込みを試みる
-            value = json.loads(payload_str)
-
-            if isinstance(value, dict):
-                # ★★★ 重要: 辞書型なら中身を展開してトップレベルに保存 ★★★
-                # これにより Kibana で "temperature" や "pm25" を直接グラフ化できます
-                doc.update(value)
-
-                # 念のため元のJSONも文字列として残しておく（デバッグ用）
-                doc["raw_json"] = payload_str
-            else:
-                # 単純な値なら "value" フィールドに入れる
-                doc["value"] = value
-
-        except json.JSONDecodeError:
-            # JSONでない場合（単純な数値や文字列）
-            if payload_str.replace(".", "", 1).isdigit():
-                doc["value"] = float(payload_str)
-            elif payload_str.lower() == "true":
-                doc["value"] = True
-            elif payload_str.lower() == "false":
-                doc["value"] = False
-            else:
-                doc["value"] = payload_str
+        device_id = doc["device_id"]
+        prop_name = doc["property_name"]
 
         # --- データベース(Elasticsearch)に保存 ---
-        # 注: ライブラリのバージョンに合わせて body 引数を使用
-        res = es.index(index=INDEX_NAME, body=doc)
+        # キューに積むだけ（送信はバックグラウンドで _bulk）
+        indexer.submit(doc)
 
         # --- ターミナルへのログ表示 ---
         time_str = datetime.now().strftime("%H:%M:%S")
@@ -101,20 +76,48 @@ def on_message(client, userdata, msg):
 
 # --- メイン処理 ---
 if __name__ == "__main__":
+    # 型付きのインデックステンプレート（作成済みのインデックスには効かない）
+    try:
+        install_template(ES_HOST)
+        print("[システム] インデックステンプレートを登録しました。")
+    except Exception as e:
+        print(f"[システム] テンプレート登録に失敗: {e}")
+
     # インデックス作成（なければ）
     try:
         if not es.indices.exists(index=INDEX_NAME):
             es.indices.create(index=INDEX_NAME)
             print(f"[システム] 新しいインデックス '{INDEX_NAME}' を作成しました。")
+        else:
+            print(
+                f"[システム] '{INDEX_NAME}' は作成済みのため旧マッピングのままです"
+                "（新スキーマにするには削除するか reindex してください）"
+            )
     except Exception:
         pass
 
+    indexer = BulkIndexer(
+        ES_HOST,
+        INDEX_NAME,
+        max_docs=BULK_MAX_DOCS,
+        max_bytes=BULK_MAX_BYTES,
+        flush_interval=BULK_FLUSH_SEC,
+        queue_size=QUEUE_SIZE,
+    )
+
     client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
     client.on_connect = on_connect
     client.on_message = on_message
 
     try:
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        client.loop_forever()
+        client.loop_start()
+        while True:
+            time.sleep(STATS_EVERY_SEC)
+            print(f"[ES] {indexer.stats()}")
     except KeyboardInterrupt:
         print("\n終了します")
+    finally:
+        client.loop_stop()
+        indexer.close()
+        print(f"[ES] {indexer.stats()}")
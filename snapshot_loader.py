@@ -0,0 +1,382 @@
+# snapshot_loader.py
+# 統合 1Hz スナップショット CSV（build_columns() 形式 / combined.py の room__col 形式）の共通ローダ
+#
+#   - 列名から型を決め（snapshot_writer.column_kind + 統合 CSV の命名）、チャンクごとに変換する
+#       timestamp : datetime64[ns]
+#       bool      : float32 の 1 / 0 / NaN（true/false/on/off/open/closed/数値 != 0）
+#       category  : pandas.Categorical（Label_*_Action, target_room など）
+#       float     : float32（"unmeasurable" などの文字列は NaN、True/False は 1/0）
+#   - 変換結果を CSV の隣 <csv>.npcache/ に .npy で保存し、次回からは mmap で開く
+#     （CSV のサイズと更新時刻が変わったら作り直す）
+#
+# 使い方:
+#   from snapshot_loader import load_snapshot_csv
+#   df = load_snapshot_csv("combined_ml_ready.csv")
+#
+#   python snapshot_loader.py build combined_ml_ready.csv   # キャッシュだけ作る
+#   python snapshot_loader.py info  combined_ml_ready.csv
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from bool_coerce import VOCAB, bool_array
+from snapshot_writer import column_kind
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".npcache"
+
+
+# 統合 CSV（room__col）の bool 列: 最後の "__" 以降がこれで始まるもの
+BOOLISH_PREFIXES = (
+    "pir",
+    "motion",
+    "mic_occupied",
+    "sound_trig",
+    "lepton_occupied",
+    "door",
+    "detection",
+    "thermal",
+    "occ_",
+)
+# category 列: 列名そのもの、または最後の "__" 以降がこれと一致するもの（sleeping_room__Place,
+# living__label, __label など）
+CATEGORY_COLUMNS = ("target_room", "Place", "Activity", "label")
+# combined.py / add_derived_features の派生列（元の列が bool でも値は float）
+_DERIVED = re.compile(r"__(mean|std|diff)\d+s$|__r\d+[ms]$|__diff1$")
+
+
+# --------------------------
+# 列名 → 型
+# --------------------------
+def loader_kind(col: str, ts_col: str = "timestamp") -> str:
+    """timestamp / bool / category / float"""
+    if col == ts_col or col == "timestamp":
+        return "timestamp"
+    if col.rsplit("__", 1)[-1] in CATEGORY_COLUMNS:
+        return "category"
+    if _DERIVED.search(col):
+        return "float"
+    kind = column_kind(col)
+    if kind in ("bool", "category"):
+        return kind
+    if kind == "int":
+        return "float"  # Label_*_Count（欠損を持てるように）
+    base = col.rsplit("__", 1)[-1].lower()
+    if base.startswith(BOOLISH_PREFIXES):
+        return "bool"
+    return "float"
+
+
+def schema(columns: List[str], ts_col: str = "timestamp") -> Dict[str, str]:
+    return {c: loader_kind(c, ts_col) for c in columns}
+
+
+# --------------------------
+# 値の変換（チャンク単位）
+# --------------------------
+def _float_of_label(s: str) -> float:
+    """文字列 1 つ → float（数値ならその値、bool 語彙なら 1/0、それ以外 NaN）"""
+    t = s.strip().lower()
+    if t in VOCAB:
+        return VOCAB[t]
+    try:
+        return float(t)
+    except ValueError:
+        return np.nan
+
+
+def _via_uniques(col: pd.Series, conv) -> np.ndarray:
+    """値の種類ごとに 1 回だけ conv を呼び、codes で引いて float32 にする。"""
+    codes, uniques = pd.factorize(col, use_na_sentinel=True)
+    table = np.array(
+        [conv(str(u)) for u in uniques] + [np.nan], dtype=np.float32
+    )  # 末尾は欠損（code -1）
+    return table[codes]
+
+
+def _to_bool01(col: pd.Series) -> np.ndarray:
+    # bool 列は文字列で読むので、"1" / "0.0" などの数値文字列も数値として判定する
+    return bool_array(col, numeric_strings=True).astype(np.float32)
+
+
+def _to_float32(col: pd.Series) -> np.ndarray:
+    if pd.api.types.is_bool_dtype(col) or pd.api.types.is_numeric_dtype(col):
+        return col.to_numpy(dtype=np.float32, na_value=np.nan)
+    return _via_uniques(col, _float_of_label)
+
+
+def _to_ts_ns(col: pd.Series) -> np.ndarray:
+    dt = pd.to_datetime(col, errors="coerce", format="ISO8601")
+    return dt.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _is_text_only(col: pd.Series) -> bool:
+    """数値にも bool 語彙にもならない文字列だけの列か（ラベル列などの判定）"""
+    if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+        return False
+    vals = col.dropna()
+    if vals.empty:
+        return False
+    return bool(np.isnan(_via_uniques(vals, _float_of_label)).all())
+
+
+def _settle_pending(
+    path: str, pending: List[str], kinds: Dict[str, str], chunksize: int, encoding: str
+):
+    """pending の列だけを読み、最初に値が入ったチャンクで文字列だけなら category にする。"""
+    pending = list(pending)
+    reader = pd.read_csv(
+        path,
+        chunksize=chunksize,
+        usecols=pending,
+        dtype="object",
+        encoding=encoding,
+        low_memory=False,
+    )
+    for chunk in reader:
+        for c in list(pending):
+            vals = chunk[c].dropna()
+            if vals.empty:
+                continue
+            if _is_text_only(vals):
+                kinds[c] = "category"
+            pending.remove(c)
+        if not pending:
+            break
+    reader.close()
+
+
+def _count_rows(path: str) -> int:
+    """改行数からの行数の上限（クォート内改行があれば実際はこれより少ない）"""
+    n = 0
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(1 << 24)
+            if not buf:
+                break
+            n += buf.count(b"\n")
+    return n + 1
+
+
+# --------------------------
+# キャッシュ
+# --------------------------
+def cache_dir(path: str) -> str:
+    return path + CACHE_SUFFIX
+
+
+def _source_id(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _read_meta(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(cache_dir(path), "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION or meta.get("source") != _source_id(path):
+        return None
+    return meta
+
+
+def _alloc(out_dir: Optional[str], name: str, shape, dtype):
+    if out_dir is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(
+        os.path.join(out_dir, name), mode="w+", dtype=dtype, shape=shape
+    )
+
+
+def _parse(
+    path: str, ts_col: str, chunksize: int, out_dir: Optional[str], encoding: str
+):
+    """CSV をチャンクで読み、列の型ごとの配列（out_dir があれば .npy の memmap）に書く。"""
+    with open(path, newline="", encoding=encoding) as f:
+        columns = next(csv.reader(f))
+    kinds = schema(columns, ts_col)
+    n_alloc = _count_rows(path)
+
+    # 文字列で読む列（bool / category / timestamp）は dtype を固定して推論させない
+    dtype = {c: "object" for c, k in kinds.items() if k != "float"}
+    reader = pd.read_csv(
+        path, chunksize=chunksize, dtype=dtype, encoding=encoding, low_memory=False
+    )
+    floats = cats = ts = None
+    cat_values: Dict[str, dict] = {}
+    pos = 0
+    for chunk in reader:
+        if floats is None:
+            # float 扱いの列のうち文字列しか無いものは category に回す。最初のチャンクで
+            # 値が無かった列（後から始まる部屋の列など）は、値が出るまで先を読んで決める
+            pending = []
+            for c in columns:
+                if kinds[c] != "float" or _DERIVED.search(c):
+                    continue
+                if chunk[c].notna().any():
+                    if _is_text_only(chunk[c]):
+                        kinds[c] = "category"
+                else:
+                    pending.append(c)
+            if pending:
+                _settle_pending(path, pending, kinds, chunksize, encoding)
+            float_cols = [c for c in columns if kinds[c] in ("float", "bool")]
+            cat_cols = [c for c in columns if kinds[c] == "category"]
+            ts_cols = [c for c in columns if kinds[c] == "timestamp"]
+            floats = _alloc(out_dir, "floats.npy", (len(float_cols), n_alloc), "f4")
+            cats = _alloc(out_dir, "cats.npy", (len(cat_cols), n_alloc), "i4")
+            ts = _alloc(out_dir, "ts.npy", (len(ts_cols), n_alloc), "i8")
+            cat_values = {c: {} for c in cat_cols}
+        n = len(chunk)
+        sl = slice(pos, pos + n)
+        for i, c in enumerate(float_cols):
+            conv = _to_bool01 if kinds[c] == "bool" else _to_float32
+            floats[i, sl] = conv(chunk[c])
+        for i, c in enumerate(ts_cols):
+            ts[i, sl] = _to_ts_ns(chunk[c])
+        for i, c in enumerate(cat_cols):
+            # チャンクをまたいで通し番号のカテゴリコードにする
+            codes, uniques = pd.factorize(chunk[c].astype(object), use_na_sentinel=True)
+            seen = cat_values[c]
+            remap = np.array(
+                [seen.setdefault(str(u), len(seen)) for u in uniques] + [-1],
+                dtype=np.int32,
+            )
+            cats[i, sl] = remap[codes]
+        pos += n
+
+    if floats is None:  # ヘッダーだけの CSV
+        float_cols = [c for c in columns if kinds[c] in ("float", "bool")]
+        cat_cols = [c for c in columns if kinds[c] == "category"]
+        ts_cols = [c for c in columns if kinds[c] == "timestamp"]
+        floats = _alloc(out_dir, "floats.npy", (len(float_cols), 0), "f4")
+        cats = _alloc(out_dir, "cats.npy", (len(cat_cols), 0), "i4")
+        ts = _alloc(out_dir, "ts.npy", (len(ts_cols), 0), "i8")
+
+    meta = {
+        "version": CACHE_VERSION,
+        "source": _source_id(path),
+        "n_rows": pos,
+        "columns": columns,
+        "kinds": kinds,
+        "float_cols": float_cols,
+        "cat_cols": cat_cols,
+        "ts_cols": ts_cols,
+        "categories": {c: list(v) for c, v in cat_values.items()},
+    }
+    return meta, floats, cats, ts
+
+
+def _frame(meta: dict, floats, cats, ts) -> pd.DataFrame:
+    """列方向に連続した配列から、コピーせずに DataFrame を組み立てる。"""
+    n = meta["n_rows"]
+    df = pd.DataFrame(floats[:, :n].T, columns=meta["float_cols"], copy=False)
+    others = {}
+    for i, c in enumerate(meta["ts_cols"]):
+        others[c] = pd.DatetimeIndex(ts[i, :n].view("datetime64[ns]"))
+    for i, c in enumerate(meta["cat_cols"]):
+        others[c] = pd.Categorical.from_codes(
+            cats[i, :n], categories=meta["categories"][c]
+        )
+    for pos, c in enumerate(meta["columns"]):
+        if c in others:
+            df.insert(pos, c, others[c])
+    return df
+
+
+def build_cache(
+    path: str,
+    ts_col: str = "timestamp",
+    chunksize: int = 50_000,
+    encoding: str = "utf-8",
+) -> dict:
+    """<csv>.npcache/ を作り直す（一時ディレクトリに書いてから置き換える）。"""
+    final = cache_dir(path)
+    tmp = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        meta, floats, cats, ts = _parse(path, ts_col, chunksize, tmp, encoding)
+        for a in (floats, cats, ts):
+            a.flush()
+        del floats, cats, ts
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return meta
+
+
+def load_snapshot_csv(
+    path: str,
+    ts_col: str = "timestamp",
+    usecols: Optional[List[str]] = None,
+    cache: bool = True,
+    chunksize: int = 50_000,
+    encoding: str = "utf-8",
+) -> pd.DataFrame:
+    """
+    統合 CSV を型付きで読む。cache=True ならキャッシュ（mmap, 書き込みは copy-on-write）を使う。
+    キャッシュを書けない場所（読み取り専用など）ではその場でパースして返す。
+    """
+    meta = _read_meta(path) if cache else None
+    if meta is None and cache:
+        try:
+            meta = build_cache(path, ts_col, chunksize, encoding)
+        except OSError as e:
+            print(f"[loader] キャッシュを作れません（{e}）。CSV から直接読みます")
+    if meta is not None:
+        d = cache_dir(path)
+        arrays = [
+            np.load(os.path.join(d, name), mmap_mode="c")
+            for name in ("floats.npy", "cats.npy", "ts.npy")
+        ]
+        df = _frame(meta, *arrays)
+    else:
+        df = _frame(*_parse(path, ts_col, chunksize, None, encoding))
+    if usecols is not None:
+        df = df[[c for c in usecols if c in df.columns]]
+    return df
+
+
+def main():
+    ap = argparse.ArgumentParser(description="統合 CSV の型付きキャッシュ")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("build", "info"):
+        p = sub.add_parser(name)
+        p.add_argument("csv")
+        p.add_argument("--ts-col", default="timestamp")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        t = time.perf_counter()
+        meta = build_cache(args.csv, args.ts_col)
+        print(
+            f"✓ {cache_dir(args.csv)}  rows={meta['n_rows']} "
+            f"cols={len(meta['columns'])}  {time.perf_counter() - t:.2f}s"
+        )
+    else:
+        meta = _read_meta(args.csv)
+        if meta is None:
+            print("キャッシュなし（または CSV が更新されています）")
+            return
+        kinds = pd.Series(meta["kinds"]).value_counts()
+        print(f"rows={meta['n_rows']} cols={len(meta['columns'])}")
+        print(kinds.to_string())
+
+
+if __name__ == "__main__":
+    main()
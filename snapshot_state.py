@@ -0,0 +1,41 @@
+# snapshot_state.py
+# アグリゲータの「最新値」ストア（COLUMNS と同じ並びの事前確保配列）
+#
+#   - MQTT スレッドは state.values[slot] = v と書くだけ（ロック不要）
+#   - 定期フラッシュは state.snapshot() で live 配列を予備バッファへ一括コピーして読む
+#
+# values は object 型の ndarray。1 要素の代入も np.copyto も GIL を持ったまま実行されるので、
+# コピー中に書き込みが割り込むことはなく、スナップショットはある一時点の値になる。
+# （1 メッセージに複数キーがある場合、その途中の時点を切り取ることはある）
+
+from typing import List
+
+import numpy as np
+
+
+class SnapshotState:
+    def __init__(self, columns: List[str]):
+        self.columns = list(columns)
+        self.slot = {c: i for i, c in enumerate(self.columns)}
+        n = len(self.columns)
+        self.values = np.full(n, None, dtype=object)
+        # スナップショット用の予備バッファを 2 面持ち、交互に使う
+        # （直前に返した配列は次の次の snapshot() まで書き換わらない）
+        self._spare = [np.full(n, None, dtype=object) for _ in range(2)]
+        self._turn = 0
+
+    def __getitem__(self, col: str):
+        return self.values[self.slot[col]]
+
+    def __setitem__(self, col: str, v):
+        self.values[self.slot[col]] = v
+
+    def snapshot(self) -> np.ndarray:
+        """live 配列の一括コピーを返す（ロック不要）。"""
+        buf = self._spare[self._turn]
+        self._turn ^= 1
+        np.copyto(buf, self.values)
+        return buf
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.columns, self.snapshot().tolist()))
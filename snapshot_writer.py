@@ -0,0 +1,304 @@
+# snapshot_writer.py
+# アグリゲータのスナップショット行（build_columns() の並び）を保存する書き込み先
+#
+#   - CsvSnapshotWriter     : 従来どおり 1 行ずつ CSV に追記
+#   - ParquetSnapshotWriter : メモリに溜めて、日付パーティションの Parquet に row group 単位で書く
+#
+# 使い方（アグリゲータ側）:
+#   writer = make_writer(STORAGE_BACKEND, CSV_FILE, PARQUET_DIR, COLUMNS)
+#   writer.write([datetime.now(), v1, v2, ...])   # COLUMNS の順
+#   writer.close()
+#
+# 変換 / 読み込み:
+#   python snapshot_writer.py to-csv     snapshots_parquet/ out.csv
+#   python snapshot_writer.py to-parquet smart_home_snapshot.csv snapshots_parquet/
+#   df = read_snapshots("snapshots_parquet/", columns=["timestamp", "PIR1_motion"])
+
+import argparse
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+BOOL_SUFFIXES = ("_motion", "_opStatus", "_human", "_humanDetected")
+CATEGORY_SUFFIXES = ("_Action", "_mode")
+
+
+# --------------------------
+# 列名 → 型
+# --------------------------
+def column_kind(col: str) -> str:
+    """build_columns() の命名から列の型を決める: timestamp / bool / int / category / float"""
+    if col == "timestamp":
+        return "timestamp"
+    if col.endswith(BOOL_SUFFIXES):
+        return "bool"
+    if col.startswith("Label_"):
+        if col.endswith("_Action"):
+            return "category"
+        return "int"  # Label_Total_People / Label_*_Count
+    if col.endswith(CATEGORY_SUFFIXES):
+        return "category"
+    return "float"
+
+
+def _to_float(v):
+    if v is None or isinstance(v, bool):
+        return None if v is None else float(v)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        # "unmeasurable" などの文字列は欠損扱い
+        return None
+
+
+def _to_int(v):
+    f = _to_float(v)
+    return None if f is None else int(f)
+
+
+def _to_bool(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, str):
+        s = v.strip().lower()
+        if s in ("true", "1", "on", "yes"):
+            return True
+        if s in ("false", "0", "off", "no"):
+            return False
+        return None
+    return bool(v)
+
+
+def _to_str(v):
+    if v is None or v == "":
+        return None
+    return str(v)
+
+
+def _to_ts(v):
+    if isinstance(v, datetime):
+        return v
+    return datetime.fromisoformat(str(v))
+
+
+_CONVERTERS = {
+    "timestamp": _to_ts,
+    "bool": _to_bool,
+    "int": _to_int,
+    "category": _to_str,
+    "float": _to_float,
+}
+
+
+def arrow_schema(columns: List[str]):
+    import pyarrow as pa
+
+    types = {
+        "timestamp": pa.timestamp("ms"),
+        "bool": pa.bool_(),
+        "int": pa.int16(),
+        "category": pa.dictionary(pa.int16(), pa.string()),
+        "float": pa.float32(),
+    }
+    return pa.schema([(c, types[column_kind(c)]) for c in columns])
+
+
+# --------------------------
+# 書き込み先
+# --------------------------
+class CsvSnapshotWriter:
+    """従来の CSV 追記（ファイルが無ければヘッダー行を書く）。"""
+
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.columns = list(columns)
+        if not os.path.exists(path):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(self.columns)
+            print(f"[CSV] 新規作成: {path}")
+        else:
+            print(f"[CSV] 既存ファイルに追記: {path}")
+
+    def write(self, row: list):
+        if isinstance(row[0], datetime):
+            row = [row[0].isoformat()] + list(row[1:])
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(row)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ParquetSnapshotWriter:
+    """
+    行をメモリに溜め、row_group_rows 行たまるか max_buffer_sec 経過で
+    root/date=YYYY-MM-DD/part-HHMMSS-xxxxxx.parquet に書き出す。
+    1 回の書き出し = 1 ファイルなので、途中で落ちても書き終えた分は読める。
+    """
+
+    def __init__(
+        self,
+        root: str,
+        columns: List[str],
+        row_group_rows: int = 360,
+        max_buffer_sec: float = 600.0,
+        compression: str = "zstd",
+    ):
+        import pyarrow  # noqa: F401  (無ければここで ImportError)
+
+        self.root = root
+        self.columns = list(columns)
+        self.schema = arrow_schema(self.columns)
+        self.row_group_rows = row_group_rows
+        self.max_buffer_sec = max_buffer_sec
+        self.compression = compression
+        self._conv = [_CONVERTERS[column_kind(c)] for c in self.columns]
+        self._buf = [[] for _ in self.columns]
+        self._buf_date = None
+        self._buf_since = None
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        print(f"[Parquet] 出力先: {root}")
+
+    def write(self, row: list):
+        vals = [conv(v) for conv, v in zip(self._conv, row)]
+        date = vals[0].date()
+        with self._lock:
+            # 日付が変わったら前日分を先に書き出す（1 ファイル 1 日付）
+            if self._buf_date is not None and date != self._buf_date:
+                self._flush_locked()
+            if self._buf_since is None:
+                self._buf_since = time.monotonic()
+            self._buf_date = date
+            for col_buf, v in zip(self._buf, vals):
+                col_buf.append(v)
+            if (
+                len(self._buf[0]) >= self.row_group_rows
+                or time.monotonic() - self._buf_since >= self.max_buffer_sec
+            ):
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buf[0]:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_arrays(
+            [
+                pa.array(vals, type=field.type)
+                for vals, field in zip(self._buf, self.schema)
+            ],
+            schema=self.schema,
+        )
+        first = self._buf[0][0]
+        part_dir = os.path.join(self.root, f"date={self._buf_date.isoformat()}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{first:%H%M%S-%f}.parquet")
+        pq.write_table(table, path, compression=self.compression)
+        print(f"[Parquet] {len(self._buf[0])} 行を書き出し: {path}")
+        self._buf = [[] for _ in self.columns]
+        self._buf_since = None
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+
+
+def make_writer(
+    backend: str, csv_path: str, parquet_dir: Optional[str], columns: List[str]
+):
+    """backend: "csv" | "parquet" | "both" """
+    if backend == "csv":
+        return CsvSnapshotWriter(csv_path, columns)
+    if backend == "parquet":
+        return ParquetSnapshotWriter(parquet_dir, columns)
+    if backend == "both":
+        return _TeeWriter(
+            [
+                CsvSnapshotWriter(csv_path, columns),
+                ParquetSnapshotWriter(parquet_dir, columns),
+            ]
+        )
+    raise ValueError(f"unknown storage backend: {backend}")
+
+
+class _TeeWriter:
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write(self, row: list):
+        for w in self.writers:
+            w.write(row)
+
+    def flush(self):
+        for w in self.writers:
+            w.flush()
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+
+
+# --------------------------
+# 読み込み / 変換
+# --------------------------
+def read_snapshots(path: str, columns: Optional[List[str]] = None):
+    """Parquet ディレクトリ（列を絞って読む）でも従来 CSV でも DataFrame で返す。"""
+    import pandas as pd
+
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=columns)
+        if "date" in df.columns and (columns is None or "date" not in columns):
+            df = df.drop(columns=["date"])  # パーティション列
+        if "timestamp" in df.columns:
+            df = df.sort_values("timestamp").reset_index(drop=True)
+        return df
+    return pd.read_csv(path, usecols=columns, low_memory=False)
+
+
+def parquet_to_csv(root: str, out_csv: str):
+    df = read_snapshots(root)
+    df["timestamp"] = df["timestamp"].map(lambda t: t.isoformat())
+    df.to_csv(out_csv, index=False)
+    print(f"✓ wrote CSV: {out_csv}  shape={df.shape}")
+
+
+def csv_to_parquet(csv_path: str, root: str, row_group_rows: int = 8640):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        w = ParquetSnapshotWriter(root, columns, row_group_rows, float("inf"))
+        for row in reader:
+            w.write([v if v != "" else None for v in row])
+    w.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="snapshot CSV <-> Parquet 変換")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("to-csv", help="Parquet ディレクトリ → CSV")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p = sub.add_parser("to-parquet", help="CSV → 日付パーティション Parquet")
+    p.add_argument("src")
+    p.add_argument("dst")
+    args = ap.parse_args()
+
+    if args.cmd == "to-csv":
+        parquet_to_csv(args.src, args.dst)
+    else:
+        csv_to_parquet(args.src, args.dst)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+train_room_model のラベル生成パラメータ × 学習パラメータをまとめて試すスイープ。
+
+Usage (example):
+  python sweep_room_model.py \
+    --csv combined_ml_ready.csv \
+    --label-config label_config.json \
+    --outdir sweep_out \
+    --grid pir_window_sec=5,10,30 sticky_after_sec=10,30 n_est=100,300 min_leaf=1,3
+
+  # グリッドはファイルにも書ける（1 行 1 項目）: --grid @grid.txt
+
+流れ:
+  1. CSV は 1 回だけ読み、ラベルパラメータの組ごとにラベルを作る（親プロセス）
+     - 特徴量は FeatureCache に置き、同じ行・同じ列になる組どうしで共有する
+       （スイープで使うキーは pin して、全トライアルが終わるまで掃除しない）
+     - train 側に 2 クラス未満しかない / test にしか無いクラスがある組は学習しない
+  2. 学習パラメータの組ごとに 1 トライアルとしてプロセスプールで学習する
+     - 特徴量はキャッシュから mmap で読む（ワーカー間でページを共有）。
+       保存できなかったなどでエントリが無ければ、そのワーカーで作り直す
+     - 並列数 workers × RandomForest の n_jobs が CPU 数を超えないように割り振る
+     - まず --probe-trees 本だけ木を作って macro-F1 を見て、それまでの最良から
+       --early-stop-margin 以上低ければ打ち切る（warm_start で残りの木を足すので、
+       打ち切らなかった場合の結果は一括で学習したときと同じ）
+  3. トライアルごとに outdir/trials/<id>/metrics.txt（train_room_model と同じ形式）、
+     全体の順位表を outdir/leaderboard.csv に書く
+"""
+
+import argparse, itertools, json, os, sys, time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import (
+    accuracy_score,
+    classification_report,
+    confusion_matrix,
+    f1_score,
+)
+from sklearn.preprocessing import LabelEncoder
+
+from feature_cache import FeatureCache
+from snapshot_loader import load_snapshot_csv
+from train_room_model import (
+    LABEL_PARAMS,
+    _ensure_datetime,
+    apply_label_params,
+    build_labels,
+    cached_feature_table,
+    feature_cache_key,
+    split_index,
+    write_metrics,
+)
+
+# 学習パラメータ（グリッド名 -> 型）
+MODEL_PARAMS = {"n_est": int, "min_leaf": int}
+
+
+def parse_grid(items: list) -> dict:
+    """["pir_window_sec=5,10", "n_est=100"] -> {"pir_window_sec": [5, 10], "n_est": [100]}"""
+    types = {**LABEL_PARAMS, **MODEL_PARAMS}
+    grid = {}
+    for item in items:
+        name, sep, values = item.partition("=")
+        name = name.strip().replace("-", "_")
+        if not sep or name not in types:
+            raise ValueError(
+                f"grid の指定が不正です: {item!r}（使える名前: {', '.join(types)}）"
+            )
+        grid[name] = [types[name](v) for v in values.split(",") if v.strip()]
+    return grid
+
+
+def expand(grid: dict, names) -> list:
+    """grid のうち names の項目の直積（項目が無ければ [{}]）。"""
+    keys = [k for k in names if k in grid]
+    return [
+        dict(zip(keys, combo)) for combo in itertools.product(*(grid[k] for k in keys))
+    ]
+
+
+def plan_cores(n_trials: int, workers: int = None, cpus: int = None) -> (int, int):
+    """
+    (プロセス数, 1 トライアルの RandomForest n_jobs)。
+    n_jobs=-1 のままプロセスを並べると CPU 数の 2 乗のスレッドが立つので、
+    プロセス数 × n_jobs <= CPU 数 になるように割る（workers を CPU 数より多く
+    指定したときは n_jobs=1）。
+    """
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, n_trials))
+    return workers, max(1, cpus // workers)
+
+
+# --------------------------
+# 親プロセス: ラベル・特徴量の準備
+# --------------------------
+def prepare_labels(df, cfg, label_params, args, cache, label_dir, label_id) -> dict:
+    """ラベルパラメータ 1 組ぶんのラベルを作り、特徴量をキャッシュに置く。"""
+    y, used_cols = build_labels(df, apply_label_params(cfg, label_params), args.ts_col)
+    labeled = y.notna().to_numpy()
+    y = y[labeled].astype(str).to_numpy()
+    info = {"label_id": label_id, "n_rows": int(len(y))}
+
+    split_idx = split_index(len(y), args.test_ratio) if len(y) else 0
+    train_classes = set(y[:split_idx])
+    if len(train_classes) < 2:
+        info["skip"] = "train に 2 クラス未満"
+        return info
+    unseen = set(y[split_idx:]) - train_classes
+    if unseen:
+        info["skip"] = f"test にしか無いクラス {sorted(unseen)}"
+        return info
+
+    info["key"] = feature_cache_key(cache, args.csv, args.ts_col, used_cols, labeled)
+    cache.pin(info["key"])  # 後のラベル組の put で掃除されないように
+    df_l = df[labeled].reset_index(drop=True)
+    cached_feature_table(cache, args.csv, df_l, args.ts_col, used_cols, labeled)
+    info["y_path"] = os.path.join(label_dir, f"{label_id}.npy")
+    np.save(info["y_path"], y.astype("U"))
+    return info
+
+
+# --------------------------
+# ワーカー: 1 トライアルの学習
+# --------------------------
+_BEST = None  # 全ワーカー共有の最良 macro-F1（mp.Value）
+
+
+def _init_worker(best):
+    global _BEST
+    _BEST = best
+
+
+def _best_score() -> float:
+    return _BEST.value if _BEST is not None else -np.inf
+
+
+def _update_best(score: float):
+    if _BEST is None:
+        return
+    with _BEST.get_lock():
+        if score > _BEST.value:
+            _BEST.value = score
+
+
+def _load_features(task: dict) -> pd.DataFrame:
+    """キャッシュから特徴量を読む。エントリが無ければ CSV から作り直す。"""
+    cache = FeatureCache(task["cache_root"])
+    cache.pinned.update(task["pinned"])
+    hit = cache.get(task["key"])
+    if hit is not None:
+        return hit[0]
+
+    print(f"[feature-cache] {task['key']} が無いので作り直します ({task['trial']})")
+    df = load_snapshot_csv(task["csv"], ts_col=task["ts_col"], cache=task["npcache"])
+    df = _ensure_datetime(df, task["ts_col"])
+    with open(task["label_config"], "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg = apply_label_params(cfg, task["label_params"])
+    y, used_cols = build_labels(df, cfg, task["ts_col"])
+    labeled = y.notna().to_numpy()
+    df_l = df[labeled].reset_index(drop=True)
+    X, _ = cached_feature_table(
+        cache, task["csv"], df_l, task["ts_col"], used_cols, labeled
+    )
+    return X
+
+
+def run_trial(task: dict) -> dict:
+    t0 = time.time()
+    result = {"trial": task["trial"], **task["params"]}
+    try:
+        X_all = _load_features(task)
+        y = np.load(task["y_path"])
+        if len(X_all) != len(y):
+            raise RuntimeError(
+                f"特徴量 {len(X_all)} 行とラベル {len(y)} 行が一致しません"
+            )
+
+        split_idx = split_index(len(X_all), task["test_ratio"])
+        X_train, X_test = X_all.iloc[:split_idx], X_all.iloc[split_idx:]
+        y_train, y_test = y[:split_idx], y[split_idx:]
+        le = LabelEncoder()
+        y_train_enc = le.fit_transform(y_train)
+        y_test_enc = le.transform(y_test)
+
+        # Pipeline([imputer, rf]).fit と同じ手順を分けて実行（木を段階的に足すため）
+        imputer = SimpleImputer(strategy="median")
+        X_train = imputer.fit_transform(X_train)
+        X_test = imputer.transform(X_test)
+
+        n_est = task["params"]["n_est"]
+        probe = task["probe_trees"]
+        rf = RandomForestClassifier(
+            n_estimators=min(probe, n_est) if probe else n_est,
+            min_samples_leaf=task["params"]["min_leaf"],
+            class_weight="balanced_subsample",
+            random_state=42,
+            n_jobs=task["n_jobs"],
+            warm_start=True,
+        )
+        rf.fit(X_train, y_train_enc)
+        if rf.n_estimators < n_est:
+            probe_f1 = f1_score(y_test_enc, rf.predict(X_test), average="macro")
+            result["probe_f1"] = probe_f1
+            margin = task["early_stop_margin"]
+            if margin is not None and probe_f1 < _best_score() - margin:
+                result.update(status="early_stopped", seconds=time.time() - t0)
+                return result
+            rf.set_params(n_estimators=n_est)
+            rf.fit(X_train, y_train_enc)
+
+        y_pred = rf.predict(X_test)
+        rep = classification_report(y_test_enc, y_pred, target_names=list(le.classes_))
+        cm = confusion_matrix(y_test_enc, y_pred)
+        trial_dir = os.path.join(task["outdir"], "trials", task["trial"])
+        os.makedirs(trial_dir, exist_ok=True)
+        write_metrics(os.path.join(trial_dir, "metrics.txt"), rep, cm, le.classes_)
+        with open(os.path.join(trial_dir, "params.json"), "w", encoding="utf-8") as f:
+            json.dump(task["params"], f, ensure_ascii=False, indent=2)
+
+        macro_f1 = f1_score(y_test_enc, y_pred, average="macro")
+        _update_best(macro_f1)
+        result.update(
+            status="ok",
+            macro_f1=macro_f1,
+            accuracy=accuracy_score(y_test_enc, y_pred),
+            n_train=len(y_train),
+            n_test=len(y_test),
+        )
+    except Exception as e:  # 1 トライアルの失敗でスイープ全体は止めない
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = time.time() - t0
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(fromfile_prefix_chars="@")
+    ap.add_argument("--csv", required=True, help="Integrated 1Hz snapshot CSV path")
+    ap.add_argument("--label-config", required=True, help="JSON with label rules")
+    ap.add_argument("--outdir", required=True, help="トライアル結果と leaderboard.csv")
+    ap.add_argument("--ts-col", default="timestamp")
+    ap.add_argument("--test-ratio", type=float, default=0.3)
+    ap.add_argument(
+        "--grid",
+        nargs="+",
+        default=[],
+        help="name=v1,v2,... （"
+        + ", ".join(list(LABEL_PARAMS) + list(MODEL_PARAMS))
+        + "）",
+    )
+    ap.add_argument("--n-est", type=int, default=300, help="grid に無いときの値")
+    ap.add_argument("--min-leaf", type=int, default=3, help="grid に無いときの値")
+    ap.add_argument(
+        "--workers", type=int, default=None, help="並列プロセス数（既定: CPU 数）"
+    )
+    ap.add_argument(
+        "--probe-trees",
+        type=int,
+        default=25,
+        help="打ち切り判定に使う最初の木の本数（0 で判定しない）",
+    )
+    ap.add_argument(
+        "--early-stop-margin",
+        type=float,
+        default=0.1,
+        help="probe の macro-F1 がそれまでの最良よりこれ以上低ければ打ち切る",
+    )
+    ap.add_argument("--no-early-stop", action="store_true")
+    ap.add_argument("--feature-cache", default=None, help="特徴量キャッシュの場所")
+    ap.add_argument("--no-cache", action="store_true", help="<csv>.npcache/ を使わない")
+    args = ap.parse_args()
+
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as e:
+        ap.error(str(e))
+    grid.setdefault("n_est", [args.n_est])
+    grid.setdefault("min_leaf", [args.min_leaf])
+    label_grid = expand(grid, LABEL_PARAMS)
+    model_grid = expand(grid, MODEL_PARAMS)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    label_dir = os.path.join(args.outdir, "labels")
+    os.makedirs(label_dir, exist_ok=True)
+    cache = FeatureCache(
+        args.feature_cache
+        or os.path.join(os.path.dirname(os.path.abspath(args.csv)), ".feature_cache")
+    )
+
+    # 1. ラベル・特徴量（CSV は 1 回だけ読む）
+    df = load_snapshot_csv(args.csv, ts_col=args.ts_col, cache=not args.no_cache)
+    df = _ensure_datetime(df, args.ts_col)
+    with open(args.label_config, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    results, tasks = [], []
+    for i, label_params in enumerate(label_grid):
+        info = prepare_labels(
+            df, cfg, label_params, args, cache, label_dir, f"l{i:03d}"
+        )
+        print(f"[labels {info['label_id']}] {label_params}  rows={info['n_rows']}")
+        for j, model_params in enumerate(model_grid):
+            params = {**label_params, **model_params}
+            trial = f"{info['label_id']}_m{j:03d}"
+            if "skip" in info:
+                results.append(
+                    {
+                        "trial": trial,
+                        **params,
+                        "status": "skipped",
+                        "error": info["skip"],
+                    }
+                )
+                continue
+            tasks.append(
+                {
+                    "trial": trial,
+                    "params": params,
+                    "cache_root": cache.root,
+                    "key": info["key"],
+                    "csv": args.csv,
+                    "ts_col": args.ts_col,
+                    "label_config": args.label_config,
+                    "label_params": label_params,
+                    "npcache": not args.no_cache,
+                    "y_path": info["y_path"],
+                    "test_ratio": args.test_ratio,
+                    "probe_trees": args.probe_trees,
+                    "early_stop_margin": (
+                        None if args.no_early_stop else args.early_stop_margin
+                    ),
+                    "outdir": args.outdir,
+                }
+            )
+    del df
+
+    # 2. トライアル（プロセスプール）
+    workers, n_jobs = plan_cores(len(tasks), args.workers) if tasks else (1, 1)
+    for t in tasks:
+        t["n_jobs"] = n_jobs
+        t["pinned"] = sorted(cache.pinned)
+    print(
+        f"▶ {len(tasks)} trials  (workers={workers}, n_jobs per trial={n_jobs}, "
+        f"skipped={len(results)})"
+    )
+    best = mp.Value("d", -np.inf)
+    if workers == 1:
+        _init_worker(best)
+        done = map(run_trial, tasks)
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(best,))
+        done = (
+            f.result() for f in as_completed(pool.submit(run_trial, t) for t in tasks)
+        )
+    for r in done:
+        results.append(r)
+        score = f"{r['macro_f1']:.4f}" if "macro_f1" in r else "-"
+        print(
+            f"  {r['trial']}  {r['status']:<13} macro-F1={score}  ({r['seconds']:.1f}s)"
+        )
+    if workers > 1:
+        pool.shutdown()
+    # 全トライアルが終わってから、上限を超えたぶんを掃除する
+    cache.unpin_all()
+    cache.evict()
+
+    # 3. 順位表
+    board = pd.DataFrame(results)
+    for c in ("macro_f1", "accuracy", "probe_f1", "error"):
+        if c not in board.columns:
+            board[c] = np.nan
+    param_cols = [c for c in list(LABEL_PARAMS) + list(MODEL_PARAMS) if c in board]
+    board = board.sort_values(["macro_f1", "trial"], ascending=[False, True])
+    front = ["trial", "status", "macro_f1", "accuracy", "probe_f1"] + param_cols
+    board = board[front + [c for c in board.columns if c not in front]]
+    out = os.path.join(args.outdir, "leaderboard.csv")
+    board.to_csv(out, index=False)
+    print(f"\n✅ leaderboard: {out}")
+    print(board.head(10).to_string(index=False))
+    if not (board["status"] == "ok").any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
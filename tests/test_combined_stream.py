@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import combined
+
+
+def _write(path, start, n, cols):
+    ts = pd.date_range(start, periods=n, freq="1s")
+    df = pd.DataFrame({"timestamp": ts.strftime("%Y-%m-%d %H:%M:%S"), **cols})
+    df.to_csv(path, index=False)
+
+
+def _sources(tmp_path):
+    rng = np.random.default_rng(0)
+    living = tmp_path / "living.csv"
+    _write(
+        living,
+        "2025-09-19 00:00:00",
+        300,
+        {
+            "co2": rng.integers(400, 900, 300),
+            "pir_living": rng.integers(0, 2, 300),
+        },
+    )
+    # 寝室は living より 200 秒遅れて始まる（最初のチャンクには値が無い）
+    sleeping = tmp_path / "sleeping.csv"
+    _write(
+        sleeping,
+        "2025-09-19 00:03:20",
+        100,
+        {
+            "temperature": rng.normal(25.0, 0.5, 100).round(3),
+            "Place": rng.choice(["Living", "Bed"], 100),
+            "Activity": rng.choice(["sleeping", "reading"], 100),
+        },
+    )
+    return [str(living), str(sleeping)]
+
+
+def test_stream_matches_full_with_staggered_sources(tmp_path):
+    inputs = _sources(tmp_path)
+    full_csv, full_json = tmp_path / "full.csv", tmp_path / "full.json"
+    st_csv, st_json = tmp_path / "st.csv", tmp_path / "st.json"
+
+    combined.run(inputs, str(full_csv), str(full_json), "1s", False)
+    combined.run_stream(inputs, str(st_csv), str(st_json), "1s", False, chunksize=50)
+
+    full_cols = json.loads(full_json.read_text(encoding="utf-8"))
+    assert json.loads(st_json.read_text(encoding="utf-8")) == full_cols
+    assert "sleeping_room__Place" in full_cols
+    assert "sleeping_room__Place__mean5s" not in full_cols
+
+    full = pd.read_csv(full_csv, low_memory=False)
+    st = pd.read_csv(st_csv, low_memory=False)
+    assert st["sleeping_room__Place"].notna().sum() > 0
+    # 窓の std は累積和の丸め誤差がチャンク境界で変わるので許容差付きで比べる
+    pd.testing.assert_frame_equal(full, st, check_exact=False, rtol=1e-6, atol=1e-4)
@@ -0,0 +1,57 @@
+import elwa_client
+from elwa_client import ElwaClient
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def _client(monkeypatch, clock):
+    monkeypatch.setattr(elwa_client.time, "monotonic", clock)
+    client = ElwaClient()
+    fetches = []
+
+    def get_many(device, props, max_age=None):
+        fetches.append(clock.t)
+        return {p: 1 for p in props or ["co2"]}
+
+    monkeypatch.setattr(client, "get_many", get_many)
+    return client, fetches
+
+
+def _run(client, clock, seconds, tick=0.1):
+    end = clock.t + seconds
+    while clock.t < end:
+        client.poll_once()
+        clock.t = round(clock.t + tick, 6)
+
+
+def test_callback_once_per_period(monkeypatch):
+    clock = _Clock()
+    client, fetches = _client(monkeypatch, clock)
+    calls = []
+    client.subscribe("dev", ["co2"], lambda d: calls.append(clock.t), every=5.0)
+
+    _run(client, clock, 15.0)
+
+    # 0 s, 5 s, 10 s の 3 回（起動直後に 2 回続けて呼ばない）
+    assert len(calls) == 3
+    assert len(fetches) == 3
+    assert [round(b - a, 6) for a, b in zip(calls, calls[1:])] == [5.0, 5.0]
+
+
+def test_no_burst_after_stall(monkeypatch):
+    clock = _Clock()
+    client, _ = _client(monkeypatch, clock)
+    calls = []
+    client.subscribe("dev", ["co2"], lambda d: calls.append(clock.t), every=5.0)
+
+    client.poll_once()
+    clock.t += 23.0  # 取得が詰まって数周期ぶん遅れた
+    _run(client, clock, 4.9)
+
+    assert len(calls) == 2
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from snapshot_loader import load_snapshot_csv
+
+
+def _write(path):
+    n = 20
+    late = [None] * 12 + ["sleep", "read"] * 4  # 最初の 12 行は空（後から始まる部屋）
+    pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2025-09-19", periods=n, freq="1s"),
+            "living__co2": range(400, 400 + n),
+            "sleeping_room__Place": [None] * 12 + ["Bed"] * 8,
+            "sleeping_room__Mode": late,
+            "sleeping_room__temperature": [None] * 12 + ["25.5"] * 8,
+        }
+    ).to_csv(path, index=False)
+
+
+def test_late_text_columns_load_as_category(tmp_path):
+    path = str(tmp_path / "combined.csv")
+    _write(path)
+
+    whole = load_snapshot_csv(path, cache=False)
+    chunked = load_snapshot_csv(path, cache=False, chunksize=5)
+
+    for df in (whole, chunked):
+        assert isinstance(df["sleeping_room__Place"].dtype, pd.CategoricalDtype)
+        assert isinstance(df["sleeping_room__Mode"].dtype, pd.CategoricalDtype)
+        assert df["sleeping_room__temperature"].dtype == "float32"
+    pd.testing.assert_frame_equal(whole, chunked)
+    assert chunked["sleeping_room__Mode"].iloc[12:].tolist() == ["sleep", "read"] * 4
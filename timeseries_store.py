@@ -0,0 +1,138 @@
+# timeseries_store.py
+# ライブモニタ用の直近履歴ストア（デバイスごとの固定長リングバッファ）
+#
+#   - 時刻（float64, epoch 秒）と値（float32）の事前確保配列を持ち、append は O(1)
+#   - 「直近 N 秒に反応があったか」「PIR ごとの 1 分あたり反応回数」などは配列演算で求める
+#   - 書き込みは MQTT スレッド 1 本だけを想定（ロック無し）。値を書いてから件数を進めるので、
+#     読み手は件数を 1 回読んで、その時点までの要素だけを見る
+#
+# segments() / window() が返すのはリングの view（折り返していなければコピー無し）。
+# capacity 件以上 append されると上書きされるので、その前に使い終えること。
+
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class _Ring:
+    def __init__(self, capacity: int):
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.val = np.zeros(capacity, dtype=np.float32)
+        self.n = 0  # これまでの append 件数（位置は n % capacity）
+        self.last_true = 0.0  # 値 > 0 を最後に受けた時刻
+
+    def append(self, ts: float, v: float):
+        i = self.n % len(self.ts)
+        self.ts[i] = ts
+        self.val[i] = v
+        if v > 0:
+            self.last_true = ts
+        self.n += 1
+
+    def segments(self, since: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """since 以降の (ts, val) を古い順に 1〜2 個の view で返す。"""
+        n, cap = self.n, len(self.ts)
+        if n <= cap:
+            parts = [(0, n)]
+        else:
+            head = n % cap
+            parts = [(head, cap), (0, head)]
+        out = []
+        for a, b in parts:
+            ts = self.ts[a:b]
+            # 各区間の中は時刻順なので二分探索で切る
+            k = a + int(np.searchsorted(ts, since, side="left"))
+            if k < b:
+                out.append((self.ts[k:b], self.val[k:b]))
+        return out
+
+
+class TimeSeriesStore:
+    def __init__(self, capacity: int = 4096, devices: Iterable[str] = ()):
+        self.capacity = capacity
+        self._rings: Dict[str, _Ring] = {}
+        for d in devices:
+            self._rings[d] = _Ring(capacity)
+
+    # ---------- 書き込み ----------
+    def append(self, device: str, value, ts: Optional[float] = None):
+        ring = self._rings.get(device)
+        if ring is None:
+            ring = self._rings.setdefault(device, _Ring(self.capacity))
+        ring.append(time.time() if ts is None else ts, float(value))
+
+    # ---------- 読み出し ----------
+    def devices(self) -> List[str]:
+        return list(self._rings)
+
+    def last(self, device: str) -> Optional[Tuple[float, float]]:
+        ring = self._rings.get(device)
+        if ring is None or ring.n == 0:
+            return None
+        i = (ring.n - 1) % self.capacity
+        return float(ring.ts[i]), float(ring.val[i])
+
+    def last_true(self, device: str) -> float:
+        ring = self._rings.get(device)
+        return ring.last_true if ring is not None else 0.0
+
+    def last_true_array(self, devices: List[str]) -> np.ndarray:
+        """devices の順で last_true を並べた配列（活動マスクの計算用）。"""
+        return np.fromiter(
+            (self.last_true(d) for d in devices), dtype=np.float64, count=len(devices)
+        )
+
+    def segments(self, device: str, since: float):
+        ring = self._rings.get(device)
+        return ring.segments(since) if ring is not None else []
+
+    def window(self, device: str, since: float) -> Tuple[np.ndarray, np.ndarray]:
+        """since 以降の (ts, val)。折り返しをまたぐときだけ連結（コピー）する。"""
+        segs = self.segments(device, since)
+        if not segs:
+            return np.empty(0, np.float64), np.empty(0, np.float32)
+        if len(segs) == 1:
+            return segs[0]
+        return np.concatenate([s[0] for s in segs]), np.concatenate(
+            [s[1] for s in segs]
+        )
+
+    def active(
+        self, devices: Iterable[str], window_sec: float, now: Optional[float] = None
+    ) -> frozenset:
+        """直近 window_sec 秒に値 > 0 があったデバイスの集合。"""
+        now = time.time() if now is None else now
+        since = now - window_sec
+        return frozenset(
+            d for d in devices if any((v > 0).any() for _, v in self.segments(d, since))
+        )
+
+    def counts_per_minute(
+        self, devices: List[str], minutes: int = 10, now: Optional[float] = None
+    ) -> np.ndarray:
+        """(len(devices), minutes) の反応回数（値 > 0 の件数）。列は古い分から新しい分へ。"""
+        now = time.time() if now is None else now
+        out = np.zeros((len(devices), minutes), dtype=np.int64)
+        for row, d in enumerate(devices):
+            for ts, v in self.segments(d, now - minutes * 60):
+                age = ((now - ts[v > 0]) // 60).astype(np.int64)
+                age = age[(age >= 0) & (age < minutes)]
+                out[row] += np.bincount(age, minlength=minutes)[::-1]
+        return out
+
+    def recent(self, n: int = 30) -> List[Tuple[str, str, int]]:
+        """全デバイスの直近 n 件を新しい順に (HH:MM:SS, device, 値)。ログ表示用。"""
+        rows = []
+        for d, ring in list(self._rings.items()):
+            total = ring.n
+            k = min(n, total, self.capacity)
+            for j in range(total - k, total):
+                i = j % self.capacity
+                rows.append((float(ring.ts[i]), d, int(ring.val[i])))
+        rows.sort(key=lambda r: r[0], reverse=True)
+        return [
+            (datetime.fromtimestamp(t).strftime("%H:%M:%S"), d, v)
+            for t, d, v in rows[:n]
+        ]
@@ -67,103 +67,114 @@ from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
 import joblib
 
+from bool_coerce import coerce_frame, to_flag
+from feature_cache import FeatureCache, feature_hash, file_digest
+from snapshot_loader import load_snapshot_csv
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 
 # ----------------------- utils -----------------------
-def _to_bool(x):
-    """Return None/True/False from various representations."""
-    if pd.isna(x):
-        return None
-    if isinstance(x, (bool, np.bool_)):
-        return bool(x)
-    if isinstance(x, (int, float, np.integer, np.floating)):
-        # treat 0 as False, otherwise True
-        return bool(int(x != 0))
-    if isinstance(x, str):
-        s = x.strip().lower()
-        if s in ("true", "t", "yes", "y", "on", "1"):
-            return True
-        if s in ("false", "f", "no", "n", "off", "0"):
-            return False
-        if s in ("open",):  # door open -> False(=無人)扱い
-            return False
-        if s in ("closed",):  # door closed -> True(=在)扱い
-            return True
-    return None
-
-
-def _object_to_numeric(series: pd.Series) -> pd.Series:
-    """Map common object/string sensor states to numeric."""
-    if series.dtype == object:
-        s = series.copy()
-        # door states
-        mapping = {"OPEN": 0, "open": 0, "CLOSED": 1, "closed": 1}
-        s = s.map(mapping).where(~s.isna(), s)
-        # booleans
-        s = s.map(
-            lambda v: (
-                1 if _to_bool(v) is True else (0 if _to_bool(v) is False else np.nan)
-            )
-        )
-        try:
-            return s.astype(float)
-        except:
-            return pd.to_numeric(series, errors="coerce")
-    if series.dtype == bool:
-        return series.astype(float)
-    return series
-
-
 def _ensure_datetime(df: pd.DataFrame, ts_col: str) -> pd.DataFrame:
     if ts_col not in df.columns:
         raise ValueError(
             f"Timestamp column '{ts_col}' not found in CSV. Available: {list(df.columns)[:10]}..."
         )
+    ts = df[ts_col]
+    if (
+        pd.api.types.is_datetime64_any_dtype(ts)
+        and not ts.isna().any()
+        and ts.is_monotonic_increasing
+    ):
+        # snapshot_loader で読んだ整列済みの CSV はコピーせずそのまま使う
+        return df.reset_index(drop=True)
     df = df.copy()
     df[ts_col] = pd.to_datetime(df[ts_col], errors="coerce")
     df = df.dropna(subset=[ts_col]).sort_values(ts_col).reset_index(drop=True)
     return df
 
 
-def _sticky_from_bool(flag: pd.Series, sticky_after_sec: int) -> pd.Series:
-    """Trueが出た後、sticky_after_sec 秒 True を保持（1Hz前提）。"""
-    base = flag.fillna(False).astype(bool).values
-    out = np.zeros(len(base), dtype=bool)
-    cnt = 0
-    for i, v in enumerate(base):
-        if v:
-            cnt = sticky_after_sec
-            out[i] = True
-        else:
-            if cnt > 0:
-                out[i] = True
-                cnt -= 1
-            else:
-                out[i] = False
-    return pd.Series(out, index=flag.index)
+def _sticky_from_bool(flag: pd.Series, sticky_after_sec: int, ts=None) -> pd.Series:
+    """
+    Trueが出た後、sticky_after_sec 秒 True を保持。
+    ts（時刻配列）を渡すと実時間で保持し、省略時は 1 行 = 1 秒とみなす。
+    """
+    base = flag.fillna(False).astype(bool).to_numpy()
+    n = len(base)
+    if n == 0:
+        return pd.Series(base, index=flag.index)
+    # 各行について「直前（自身含む）の True の行番号」を前方埋めで求める
+    pos = np.arange(n)
+    last = np.maximum.accumulate(np.where(base, pos, -1))
+    seen = last >= 0
+    if ts is None:
+        elapsed = pos - last
+    else:
+        sec = _ts_seconds(ts)
+        elapsed = sec - sec[np.where(seen, last, 0)]
+    out = seen & (elapsed <= sticky_after_sec)
+    return pd.Series(out | base, index=flag.index)
+
+
+def _ts_seconds(ts) -> np.ndarray:
+    """datetime / 数値（秒）の配列を float 秒に揃える。"""
+    arr = np.asarray(ts)
+    if np.issubdtype(arr.dtype, np.datetime64) or arr.dtype == object:
+        ns = np.asarray(pd.to_datetime(ts), dtype="datetime64[ns]")
+        out = ns.astype(np.int64) / 1e9
+        out[np.isnat(ns)] = np.nan
+        return out
+    return arr.astype(float)
 
 
 # -------------------- label helpers -------------------
+class _PirWindows:
+    """
+    ラベル規則が参照する PIR 列を 1 回だけ 0/1 化して (行, 列) の uint8 行列にし、
+    累積和から「直近 window_sec 行の反応数」を全列まとめて求める。
+    部屋ごとの any_true / score はこの反応数から引くだけ（部屋間で共有する列も 1 回）。
+    """
+
+    def __init__(self, df: pd.DataFrame, cols: list, window_sec: int):
+        present = [c for c in dict.fromkeys(cols) if c in df.columns]
+        self.col_index = {c: i for i, c in enumerate(present)}
+        n = len(df)
+        mat = np.empty((n, len(present)), dtype=np.uint8)
+        for i, c in enumerate(present):
+            mat[:, i] = to_flag(df[c])
+        csum = np.zeros((n + 1, len(present)), dtype=np.int32)
+        np.cumsum(mat, axis=0, out=csum[1:])
+        # rolling(window_sec, min_periods=1) の sum と、その窓に入る行数
+        w = max(min(window_sec, n), 1)
+        self.counts = csum[1:].copy()
+        self.counts[w:] -= csum[1 : n + 1 - w]
+        self.sizes = np.minimum(np.arange(1, n + 1), w)
+        self.index = df.index
+
+    def _cols(self, cols: list) -> list:
+        return [self.col_index[c] for c in dict.fromkeys(cols) if c in self.col_index]
+
+    def any_true(self, cols: list) -> np.ndarray:
+        """窓内に 1 列でも反応があれば True（rolling max の OR と同じ）。"""
+        idx = self._cols(cols)
+        if not idx:
+            return np.zeros(len(self.index), dtype=bool)
+        return (self.counts[:, idx] > 0).any(axis=1)
+
+    def score(self, cols: list) -> np.ndarray:
+        """列ごとの窓内平均反応（0..1）の最大値。列が無ければ 0。"""
+        idx = self._cols(cols)
+        if not idx:
+            return np.zeros(len(self.index), dtype=float)
+        return self.counts[:, idx].max(axis=1) / self.sizes
+
+
 def _pir_any_true(
-    df: pd.DataFrame, cols: list, window_sec: int, sticky_after_sec: int
+    df: pd.DataFrame, cols: list, window_sec: int, sticky_after_sec: int, ts=None
 ) -> pd.Series:
     """PIR群の直近 window_sec 秒に 1 つでも反応があれば True、さらに sticky を適用。"""
-    if not cols:
-        return pd.Series(False, index=df.index)
-    mats = []
-    for c in cols:
-        if c in df.columns:
-            s = df[c]
-            if s.dtype == object:
-                s = s.map(lambda v: 1.0 if _to_bool(v) is True else 0.0)
-            else:
-                s = (s.fillna(0) != 0).astype(float)
-            mats.append(s.rolling(window=window_sec, min_periods=1).max())
-        else:
-            mats.append(pd.Series(0.0, index=df.index))
-    any_true = pd.concat(mats, axis=1).max(axis=1) > 0.0
-    return _sticky_from_bool(any_true, sticky_after_sec)
+    flag = _PirWindows(df, cols, window_sec).any_true(cols)
+    return _sticky_from_bool(pd.Series(flag, index=df.index), sticky_after_sec, ts=ts)
 
 
 def _pir_score(df: pd.DataFrame, cols: list, window_sec: int) -> pd.Series:
@@ -171,20 +182,7 @@ def _pir_score(df: pd.DataFrame, cols: list, window_sec: int) -> pd.Series:
     複数 PIR 列の「直近 window_sec 秒の平均反応（0..1）」を部屋のスコアとして返す。
     列が無い場合は 0。
     """
-    if not cols:
-        return pd.Series(0.0, index=df.index)
-    series_list = []
-    for c in cols:
-        if c in df.columns:
-            s = df[c]
-            if s.dtype == object:
-                s = s.map(lambda v: 1.0 if _to_bool(v) is True else 0.0)
-            else:
-                s = (s.fillna(0) != 0).astype(float)
-            series_list.append(s.rolling(window=window_sec, min_periods=1).mean())
-        else:
-            series_list.append(pd.Series(0.0, index=df.index))
-    return pd.concat(series_list, axis=1).max(axis=1).fillna(0.0)
+    return pd.Series(_PirWindows(df, cols, window_sec).score(cols), index=df.index)
 
 
 def _co2_support(
@@ -212,10 +210,77 @@ def _co2_support(
     shifted = smooth.shift(window_sec)
     rise = smooth - shifted
     flag = (rise >= rise_needed).fillna(False)
-    return _sticky_from_bool(flag, sticky_sec)
+    ts = df[ts_col] if ts_col in df.columns else None
+    return _sticky_from_bool(flag, sticky_sec, ts=ts)
 
 
 # ------------------- label building -------------------
+def _resolve_labels(
+    room_flags: dict,
+    room_scores: dict,
+    priority: list,
+    resolve_multi: str,
+    none_label,
+    n_rows: int,
+) -> np.ndarray:
+    """
+    部屋フラグ/スコアを (行, 部屋) の行列に積み、全行のラベルを一括で決める。
+    結果は従来の行ループ版と同一（object 配列、"drop" の多重ヒット行は None）。
+    """
+    rooms_order = list(room_flags.keys())
+    n_rooms = len(rooms_order)
+    # 末尾 2 要素は「該当なし」「drop」用のラベル
+    names = np.array(rooms_order + [none_label, None], dtype=object)
+    if n_rooms == 0:
+        return names[np.full(n_rows, n_rooms, dtype=np.intp)]
+
+    flags = np.column_stack([room_flags[r].to_numpy(dtype=bool) for r in rooms_order])
+    n_true = flags.sum(axis=1)
+
+    if resolve_multi == "priority":
+        # priority 上の順位（リスト外の部屋は定義順で最後尾）
+        rank_of = {}
+        for pos, r in enumerate(priority):
+            rank_of.setdefault(r, pos)
+        ranks = np.array(
+            [rank_of.get(r, len(priority) + j) for j, r in enumerate(rooms_order)],
+            dtype=np.int64,
+        )
+        pick = np.where(flags, ranks, np.iinfo(np.int64).max).argmin(axis=1)
+    elif resolve_multi == "score":
+        # True の部屋の中でスコア最大（同点は定義順で先のもの）
+        scores = np.column_stack(
+            [room_scores[r].to_numpy(dtype=float) for r in rooms_order]
+        )
+        pick = np.where(flags, scores, -np.inf).argmax(axis=1)
+    else:  # "first" / "drop"
+        pick = flags.argmax(axis=1)
+
+    code = np.where(n_true == 0, n_rooms, pick)
+    if resolve_multi == "drop":
+        code = np.where(n_true > 1, n_rooms + 1, code)
+    return names[code]
+
+
+# ラベル生成パラメータ（CLI / スイープで config を上書きできる項目）と型
+LABEL_PARAMS = {
+    "pir_window_sec": int,
+    "sticky_after_sec": int,
+    "co2_window_sec": int,
+    "co2_rise_ppm_per_min": float,
+    "co2_sticky_sec": int,
+}
+
+
+def apply_label_params(cfg: dict, params: dict) -> dict:
+    """params のうち None でないラベル生成パラメータで cfg を上書きした新しい dict を返す。"""
+    cfg = dict(cfg)
+    for name, typ in LABEL_PARAMS.items():
+        if params.get(name) is not None:
+            cfg[name] = typ(params[name])
+    return cfg
+
+
 def build_labels(df: pd.DataFrame, cfg: dict, ts_col_cli: str) -> (pd.Series, set):
     """
     ラベル Series と、ラベル生成に使った列セット（リーケージ防止用）を返す。
@@ -243,16 +308,26 @@ def build_labels(df: pd.DataFrame, cfg: dict, ts_col_cli: str) -> (pd.Series, se
     used_cols = set()
     room_flags = {}
     room_scores = {}
+    # sticky は実時間で保持（スナップショット欠損があっても秒数がずれない）
+    ts = df[ts_col] if ts_col in df.columns else None
+    # 全部屋の PIR 列をまとめて 1 回だけ集計しておく
+    pir = _PirWindows(
+        df,
+        [c for rule in rooms_cfg.values() for c in rule.get("any_true", [])],
+        pir_window_sec,
+    )
 
     for room, rule in rooms_cfg.items():
         pir_cols = list(rule.get("any_true", []))
         used_cols.update(pir_cols)
 
         # PIR any_true + sticky (二値フラグ)
-        flag = _pir_any_true(df, pir_cols, pir_window_sec, sticky_after_sec)
+        flag = _sticky_from_bool(
+            pd.Series(pir.any_true(pir_cols), index=df.index), sticky_after_sec, ts=ts
+        )
 
         # PIR score（タイブレーク用）
-        score = _pir_score(df, pir_cols, pir_window_sec)
+        score = pd.Series(pir.score(pir_cols), index=df.index)
 
         # CO2 補助（任意）
         co2_cols_room = cfg.get("co2_columns", {}).get(room, [])
@@ -266,32 +341,15 @@ def build_labels(df: pd.DataFrame, cfg: dict, ts_col_cli: str) -> (pd.Series, se
         room_flags[room] = flag.fillna(False).astype(bool)
         room_scores[room] = score.fillna(0.0).astype(float)
 
-    # 行ごとにラベル決定
-    labels = []
+    # 全行まとめてラベル決定（部屋×行の行列で一括解決）
     rooms_order = list(room_flags.keys())
     priority = cfg.get("priority", rooms_order)
+    labels = _resolve_labels(
+        room_flags, room_scores, priority, resolve_multi, none_label, len(df)
+    )
 
-    for i in df.index:
-        true_rooms = [r for r in rooms_order if bool(room_flags[r].loc[i])]
-        if len(true_rooms) == 1:
-            labels.append(true_rooms[0])
-        elif len(true_rooms) == 0:
-            labels.append(none_label)
-        else:
-            if resolve_multi == "drop":
-                labels.append(None)
-            elif resolve_multi == "priority":
-                # priority リスト上位を選ぶ
-                ordered = [r for r in priority if r in true_rooms]
-                labels.append(ordered[0] if ordered else true_rooms[0])
-            elif resolve_multi == "score":
-                # PIRスコア最大を選ぶ
-                best = max(true_rooms, key=lambda r: room_scores[r].loc[i])
-                labels.append(best)
-            else:  # "first"
-                labels.append(true_rooms[0])
-
-    y = pd.Series(labels, index=df.index, name="__label")
+    # list 経由で渡して、従来の行ループ版と同じ dtype 推論にする
+    y = pd.Series(labels.tolist(), index=df.index, name="__label")
     return y, used_cols
 
 
@@ -327,10 +385,7 @@ def make_feature_table(
     - 数値列のみ採用
     - 必要なら最小限の派生特徴を追加
     """
-    df_num = df.drop(columns=[ts_col], errors="ignore").copy()
-
-    for c in df_num.columns:
-        df_num[c] = _object_to_numeric(df_num[c])
+    df_num = coerce_frame(df.drop(columns=[ts_col], errors="ignore"))
 
     # remove columns fully NaN
     df_num = df_num.dropna(axis=1, how="all")
@@ -351,6 +406,69 @@ def make_feature_table(
     return X, list(X.columns)
 
 
+def feature_cache_key(
+    cache: FeatureCache,
+    csv_path: str,
+    ts_col: str,
+    label_used_cols: set,
+    labeled: np.ndarray,
+    add_extra=False,
+) -> str:
+    """CSV の中身のハッシュ + ts_col + ラベルに使った列 + 採用した行 + 派生特徴の有無。"""
+    return cache.key(
+        kind="train_room_model",
+        csv=file_digest(csv_path, cache.root),
+        ts_col=ts_col,
+        label_used_cols=sorted(label_used_cols),
+        rows=hashlib.sha256(np.packbits(labeled).tobytes()).hexdigest(),
+        n_rows=int(len(labeled)),
+        add_extra=bool(add_extra),
+        windows=[5, 15] if add_extra else [],
+    )
+
+
+def cached_feature_table(
+    cache: FeatureCache,
+    csv_path: str,
+    df: pd.DataFrame,
+    ts_col: str,
+    label_used_cols: set,
+    labeled: np.ndarray,
+    add_extra=False,
+) -> (pd.DataFrame, list):
+    """
+    make_feature_table の結果をキャッシュ経由で返す（キーは feature_cache_key）。
+    --n-est / --min-leaf だけ変えた再学習ではキャッシュから mmap で読む。
+    列の構成もキー（CSV の中身・ラベル列・行）で決まるので、ヒットした表をそのまま使う。
+    """
+    key = feature_cache_key(
+        cache, csv_path, ts_col, label_used_cols, labeled, add_extra=add_extra
+    )
+    hit = cache.get(key)
+    if hit is not None:
+        X = hit[0]
+        print(f"[feature-cache] hit {key} ({X.shape[0]} rows x {X.shape[1]} cols)")
+        return X, list(X.columns)
+
+    X, feat_cols = make_feature_table(df, ts_col, label_used_cols, add_extra=add_extra)
+    cache.put(key, X.reset_index(drop=True))
+    return X, feat_cols
+
+
+def split_index(n: int, test_ratio: float) -> int:
+    """時系列順の train/test 分割位置（末尾 test_ratio を test に）。"""
+    split_idx = int(n * (1 - test_ratio))
+    if split_idx <= 0 or split_idx >= n:
+        split_idx = max(1, n - max(1, int(0.3 * n)))
+    return split_idx
+
+
+def write_metrics(path: str, rep: str, cm: np.ndarray, class_names: list):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(rep + "\n\nConfusion matrix (rows=true, cols=pred):\n")
+        f.write(pd.DataFrame(cm, index=class_names, columns=class_names).to_string())
+
+
 # ---------------------- main train ---------------------
 @dataclass
 class Meta:
@@ -394,27 +512,33 @@ def main():
     ap.add_argument(
         "--label-report-only", action="store_true", help="ラベル分布のみ出力して終了"
     )
+    ap.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="<csv>.npcache/ を使わず毎回 CSV をパースする",
+    )
+    ap.add_argument(
+        "--feature-cache",
+        default=None,
+        help="特徴量キャッシュの場所（既定: CSV と同じフォルダの .feature_cache/）",
+    )
+    ap.add_argument(
+        "--no-feature-cache",
+        action="store_true",
+        help="特徴量キャッシュを使わず毎回特徴量を作る",
+    )
 
     args = ap.parse_args()
 
     # load
-    df = pd.read_csv(args.csv, low_memory=False)
+    df = load_snapshot_csv(args.csv, ts_col=args.ts_col, cache=not args.no_cache)
     df = _ensure_datetime(df, args.ts_col)
 
     with open(args.label_config, "r", encoding="utf-8") as f:
         cfg = json.load(f)
 
     # CLI で上書き（指定がある項目のみ）
-    if args.pir_window_sec is not None:
-        cfg["pir_window_sec"] = int(args.pir_window_sec)
-    if args.sticky_after_sec is not None:
-        cfg["sticky_after_sec"] = int(args.sticky_after_sec)
-    if args.co2_window_sec is not None:
-        cfg["co2_window_sec"] = int(args.co2_window_sec)
-    if args.co2_rise_ppm_per_min is not None:
-        cfg["co2_rise_ppm_per_min"] = float(args.co2_rise_ppm_per_min)
-    if args.co2_sticky_sec is not None:
-        cfg["co2_sticky_sec"] = int(args.co2_sticky_sec)
+    cfg = apply_label_params(cfg, vars(args))
 
     # build labels
     y, used_cols = build_labels(df, cfg, args.ts_col)
@@ -444,7 +568,8 @@ def main():
     os.makedirs(args.outdir, exist_ok=True)
 
     # drop rows with None labels
-    df = df[~df["__label"].isna()].reset_index(drop=True)
+    labeled = df["__label"].notna().to_numpy()
+    df = df[labeled].reset_index(drop=True)
     if df.empty:
         print(
             "ERROR: No labeled rows after filtering. Adjust label rules / parameters.",
@@ -455,13 +580,28 @@ def main():
     y = df["__label"].astype(str)
 
     # features
-    X_all, feat_cols = make_feature_table(
-        df.drop(columns=["__label"]),
-        args.ts_col,
-        used_cols,
-        add_extra=(not args.no_extra_derived)
-        and False,  # 既定は追加生成しない（CSVに十分ある想定）
-    )
+    # 既定は追加生成しない（CSVに十分ある想定）
+    add_extra = (not args.no_extra_derived) and False
+    if args.no_feature_cache:
+        X_all, feat_cols = make_feature_table(
+            df.drop(columns=["__label"]), args.ts_col, used_cols, add_extra=add_extra
+        )
+    else:
+        cache = FeatureCache(
+            args.feature_cache
+            or os.path.join(
+                os.path.dirname(os.path.abspath(args.csv)), ".feature_cache"
+            )
+        )
+        X_all, feat_cols = cached_feature_table(
+            cache,
+            args.csv,
+            df.drop(columns=["__label"]),
+            args.ts_col,
+            used_cols,
+            labeled,
+            add_extra=add_extra,
+        )
 
     # align
     X_all, y = X_all.loc[y.index], y.values
@@ -477,9 +617,7 @@ def main():
 
     # time-ordered split
     n = len(X_all)
-    split_idx = int(n * (1 - args.test_ratio))
-    if split_idx <= 0 or split_idx >= n:
-        split_idx = max(1, n - max(1, int(0.3 * n)))
+    split_idx = split_index(n, args.test_ratio)
     X_train, X_test = X_all.iloc[:split_idx], X_all.iloc[split_idx:]
     y_train, y_test = y[:split_idx], y[split_idx:]
 
@@ -510,9 +648,7 @@ def main():
     cm = confusion_matrix(y_test_enc, y_pred)
 
     # save metrics
-    with open(os.path.join(args.outdir, "metrics.txt"), "w", encoding="utf-8") as f:
-        f.write(rep + "\n\nConfusion matrix (rows=true, cols=pred):\n")
-        f.write(pd.DataFrame(cm, index=le.classes_, columns=le.classes_).to_string())
+    write_metrics(os.path.join(args.outdir, "metrics.txt"), rep, cm, le.classes_)
 
     # feature importances
     imp = pipe.named_steps["clf"].feature_importances_
@@ -529,7 +665,7 @@ def main():
         label_columns_used=sorted(list(used_cols)),
         class_names=list(le.classes_),
         args=vars(args),
-        feature_hash=hashlib.sha256((",".join(feat_cols)).encode("utf-8")).hexdigest(),
+        feature_hash=feature_hash(feat_cols),
     )
 
     joblib.dump(